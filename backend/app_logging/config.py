@@ -41,6 +41,8 @@ class JSONFormatter(logging.Formatter):
             log_data["error_type"] = record.error_type
         if hasattr(record, "error_message"):
             log_data["error_message"] = record.error_message
+        if hasattr(record, "summary"):
+            log_data["summary"] = record.summary
         
         # Add exception info if present
         if record.exc_info:
@@ -0,0 +1,196 @@
+"""
+Request Log Sampling
+Adaptive sampling of successful request logs with periodic per-route summaries
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+
+
+class RouteStats:
+    """
+    Aggregated statistics for a single route within one summary window
+    """
+
+    def __init__(self, reservoir_size: int):
+        self.reservoir_size = reservoir_size
+        self.count = 0
+        self.logged = 0
+        self.errors = 0
+        self.bytes = 0
+        self.durations = []
+
+    def add(self, duration_ms: float, status_code: int, response_bytes: int, logged: bool):
+        self.count += 1
+        self.bytes += response_bytes
+        if logged:
+            self.logged += 1
+        if status_code >= 400:
+            self.errors += 1
+
+        # Reservoir sampling keeps percentile memory bounded on hot routes
+        if len(self.durations) < self.reservoir_size:
+            self.durations.append(duration_ms)
+        else:
+            slot = random.randrange(self.count)
+            if slot < self.reservoir_size:
+                self.durations[slot] = duration_ms
+
+    def summary(self) -> dict:
+        ordered = sorted(self.durations)
+        return {
+            "count": self.count,
+            "logged": self.logged,
+            "dropped": self.count - self.logged,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "p50_ms": _percentile(ordered, 50),
+            "p95_ms": _percentile(ordered, 95),
+            "p99_ms": _percentile(ordered, 99),
+        }
+
+
+def _percentile(ordered: list, pct: int) -> float:
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return round(ordered[rank], 2)
+
+
+class RequestLogSampler:
+    """
+    Decides which successful requests get full log lines and aggregates the rest.
+
+    - 4xx/5xx responses and security events are always kept
+    - Successful requests are sampled at a rate that shrinks once traffic
+      exceeds `target_per_second`, never dropping below `min_rate`
+    - Every `summary_interval` seconds one summary record per route
+      (count, p50/p95/p99, bytes) is written to the request logger, by the
+      next request or by the background task from `start()`, whichever
+      comes first, so a window is flushed even when traffic stops
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 1.0,
+        min_rate: float = 0.01,
+        target_per_second: float = 50.0,
+        summary_interval: float = 60.0,
+        reservoir_size: int = 1024,
+        logger: logging.Logger | None = None,
+    ):
+        self.max_rate = max(0.0, min(1.0, sample_rate))
+        self.min_rate = max(0.0, min(self.max_rate, min_rate))
+        self.target_per_second = target_per_second
+        self.summary_interval = summary_interval
+        self.reservoir_size = reservoir_size
+        self.logger = logger or logging.getLogger("app.requests")
+
+        self.current_rate = self.max_rate
+        self._lock = threading.Lock()
+        self._routes: dict[str, RouteStats] = {}
+        self._window_started = time.monotonic()
+        self._rate_window_started = self._window_started
+        self._rate_window_hits = 0
+        self._task = None
+
+    # ---------------- Lifecycle ----------------
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """
+        Stop the timer and emit whatever the current window holds
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.flush()
+
+    async def _run(self):
+        while True:
+            with self._lock:
+                remaining = self.summary_interval - (time.monotonic() - self._window_started)
+                routes = self._swap_window() if remaining <= 0 else None
+            if routes is None:
+                await asyncio.sleep(remaining)
+            else:
+                self._emit(routes)
+
+    def should_log(self, status_code: int, security_event: bool = False) -> bool:
+        """
+        Return True if the full request/response lines should be written
+        """
+        if status_code >= 400 or security_event:
+            return True
+
+        with self._lock:
+            self._rate_window_hits += 1
+            now = time.monotonic()
+            elapsed = now - self._rate_window_started
+            if elapsed >= 1.0:
+                self._adjust_rate(self._rate_window_hits / elapsed)
+                self._rate_window_started = now
+                self._rate_window_hits = 0
+            rate = self.current_rate
+
+        return rate >= 1.0 or random.random() < rate
+
+    def _adjust_rate(self, observed_per_second: float):
+        if observed_per_second <= self.target_per_second:
+            self.current_rate = self.max_rate
+        else:
+            rate = self.target_per_second / observed_per_second
+            self.current_rate = max(self.min_rate, min(self.max_rate, rate))
+
+    def record(self, route: str, status_code: int, duration_ms: float, response_bytes: int, logged: bool):
+        """
+        Add a finished request to the current summary window, flushing if it has elapsed
+        """
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = RouteStats(self.reservoir_size)
+            stats.add(duration_ms, status_code, response_bytes, logged)
+
+            if time.monotonic() - self._window_started < self.summary_interval:
+                return
+            routes = self._swap_window()
+
+        self._emit(routes)
+
+    def flush(self):
+        """
+        Emit summaries for the current window immediately (e.g. on shutdown)
+        """
+        with self._lock:
+            routes = self._swap_window()
+        self._emit(routes)
+
+    def _swap_window(self) -> dict:
+        routes = self._routes
+        self._routes = {}
+        self._window_started = time.monotonic()
+        return routes
+
+    def _emit(self, routes: dict):
+        for route, stats in routes.items():
+            summary = stats.summary()
+            self.logger.info(
+                f"Summary: {route} - {summary['count']} requests "
+                f"(p50 {summary['p50_ms']}ms, p95 {summary['p95_ms']}ms, p99 {summary['p99_ms']}ms)",
+                extra={
+                    "path": route,
+                    "summary": {**summary, "sample_rate": round(self.current_rate, 4)},
+                },
+            )
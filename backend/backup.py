@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Database Backup
+Full bases plus incremental restore points in a deduplicating chunk store
+(see utils/backup_store.py). Replaces the hourly full mongodump.
+
+Usage:
+    python backup.py run                 # full base if the last one is old enough, else incremental; then prune
+    python backup.py full
+    python backup.py incremental
+    python backup.py list
+    python backup.py verify [ID]         # re-read every chunk a restore point needs
+    python backup.py prune [--dry-run]
+
+Incrementals find changed documents from the oplog when the server has one
+(replica set) and it still covers the previous restore point. Otherwise
+collections in BACKUP_TIMESTAMPED_COLLECTIONS are searched by updated_at /
+created_at / ts, and every other collection is re-read and hashed in full
+(mode "scan"), since writes such as $inc counters or admin flags do not
+touch a timestamp. Only changed documents are stored either way. Inserts and
+deletes are always found by comparing _id lists.
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+
+from config import (
+    MONGO_URI,
+    DATABASE_NAME,
+    BACKUP_DIR,
+    BACKUP_EXCLUDE_COLLECTIONS,
+    BACKUP_FULL_EVERY_HOURS,
+    BACKUP_TIMESTAMPED_COLLECTIONS,
+    BACKUP_PARALLEL,
+    BACKUP_KEEP_HOURLY,
+    BACKUP_KEEP_DAILY,
+    BACKUP_KEEP_WEEKLY,
+)
+from utils.backup_store import (
+    BackupIntegrityError,
+    BackupStore,
+    ChunkWriter,
+    collection_checksum,
+    doc_hash,
+    id_key,
+    index_record,
+    latest_full_age,
+    new_manifest_id,
+)
+
+RAW = CodecOptions(document_class=RawBSONDocument)
+CHANGE_FIELDS = ("updated_at", "created_at", "ts")
+# Writes that land while the previous backup was reading are picked up again
+FIELD_MODE_OVERLAP = timedelta(minutes=5)
+FETCH_BATCH = 1000
+
+
+# ============================================================
+# Reading the database
+# ============================================================
+def backup_collections(database) -> list:
+    names = [c["name"] for c in database.list_collections(filter={"type": "collection"})]
+    return sorted(n for n in names if not n.startswith("system.") and n not in BACKUP_EXCLUDE_COLLECTIONS)
+
+
+def index_specs(collection) -> list:
+    return [
+        {"name": name, **spec}
+        for name, spec in collection.index_information().items()
+        if name != "_id_"
+    ]
+
+
+def oplog_position(client):
+    """
+    Newest oplog timestamp, or None without a replica set oplog
+    """
+    try:
+        entry = client.local["oplog.rs"].find_one({}, {"ts": 1}, sort=[("$natural", -1)])
+    except OperationFailure:
+        return None
+    return entry["ts"] if entry else None
+
+
+def oplog_changes(client, names: list, since) -> dict | None:
+    """
+    Keys of documents inserted or updated per collection since `since`, or None
+    if the oplog no longer reaches back that far
+    """
+    oplog = client.local["oplog.rs"]
+    oldest = oplog.find_one({}, {"ts": 1}, sort=[("$natural", 1)])
+    if oldest is None or oldest["ts"] > since:
+        return None
+    changed = {name: set() for name in names}
+    namespaces = {f"{DATABASE_NAME}.{name}": name for name in names}
+    cursor = oplog.find(
+        {"ts": {"$gt": since}, "ns": {"$in": list(namespaces)}, "op": {"$in": ["i", "u"]}},
+        {"ns": 1, "op": 1, "o._id": 1, "o2._id": 1},
+    )
+    for entry in cursor:
+        doc_id = entry["o"]["_id"] if entry["op"] == "i" else entry["o2"]["_id"]
+        changed[namespaces[entry["ns"]]].add(id_key(doc_id))
+    return changed
+
+
+# ============================================================
+# Writing restore points
+# ============================================================
+def full_collection(store: BackupStore, collection) -> dict:
+    docs, index = ChunkWriter(store), ChunkWriter(store)
+    hashes = []
+    # Sorted by _id so unchanged ranges produce identical chunks in every full
+    for raw in collection.find({}, sort=[("_id", 1)], batch_size=FETCH_BATCH):
+        key = id_key(raw["_id"])
+        h = doc_hash(raw.raw)
+        docs.add(key, raw.raw)
+        index.add(key, index_record(key, h))
+        hashes.append(h)
+    return {
+        "count": len(hashes),
+        "checksum": collection_checksum(hashes),
+        "docs": docs.close(),
+        "index": index.close(),
+        "indexes": index_specs(collection),
+    }
+
+
+def scanned_collection(store: BackupStore, collection, previous: dict) -> dict:
+    """
+    Incremental by re-reading every document and comparing hashes with the parent's index
+    """
+    upserts, index = ChunkWriter(store), ChunkWriter(store)
+    hashes, seen = [], set()
+    for raw in collection.find({}, sort=[("_id", 1)], batch_size=FETCH_BATCH):
+        key = id_key(raw["_id"])
+        h = doc_hash(raw.raw)
+        if previous.get(key) != h:
+            upserts.add(key, raw.raw)
+        index.add(key, index_record(key, h))
+        hashes.append(h)
+        seen.add(key)
+
+    deletes = ChunkWriter(store)
+    for key in previous:
+        if key not in seen:
+            deletes.add(key, key)
+
+    return {
+        "count": len(hashes),
+        "checksum": collection_checksum(hashes),
+        "docs": upserts.close(),
+        "deletes": deletes.close(),
+        "index": index.close(),
+        "indexes": index_specs(collection),
+    }
+
+
+def incremental_collection(store: BackupStore, collection, parent: dict | None, since: datetime,
+                           oplog_keys: set | None) -> dict:
+    previous = store.load_index(parent["index"]) if parent else {}
+    if oplog_keys is None and collection.name not in BACKUP_TIMESTAMPED_COLLECTIONS:
+        return scanned_collection(store, collection, previous)
+
+    current = [id_key(doc["_id"]) for doc in collection.find({}, {"_id": 1}, sort=[("_id", 1)], batch_size=10_000)]
+    current_set = set(current)
+
+    # Candidates: what the oplog (or the timestamps) say changed, plus every new _id
+    fetched = {}
+    if oplog_keys is None:
+        query = {"$or": [{field: {"$gte": since}} for field in CHANGE_FIELDS]}
+        for raw in collection.find(query, batch_size=FETCH_BATCH):
+            fetched[id_key(raw["_id"])] = raw.raw
+        wanted = [key for key in current if key not in previous and key not in fetched]
+    else:
+        wanted = [key for key in current if key not in previous or key in oplog_keys]
+    for i in range(0, len(wanted), FETCH_BATCH):
+        ids = [RawBSONDocument(key)["_id"] for key in wanted[i:i + FETCH_BATCH]]
+        for raw in collection.find({"_id": {"$in": ids}}):
+            fetched[id_key(raw["_id"])] = raw.raw
+
+    # Walk in _id order so the chunks line up with the full's; documents
+    # inserted after the _id scan are left for the next run
+    upserts, index = ChunkWriter(store), ChunkWriter(store)
+    hashes = []
+    for key in current:
+        if key in fetched:
+            h = doc_hash(fetched[key])
+            if previous.get(key) != h:
+                upserts.add(key, fetched[key])
+        elif key in previous:
+            h = previous[key]
+        else:
+            continue  # deleted between the _id scan and the fetch
+        index.add(key, index_record(key, h))
+        hashes.append(h)
+
+    deletes = ChunkWriter(store)
+    for key in previous:
+        if key not in current_set:
+            deletes.add(key, key)
+
+    return {
+        "count": len(hashes),
+        "checksum": collection_checksum(hashes),
+        "docs": upserts.close(),
+        "deletes": deletes.close(),
+        "index": index.close(),
+        "indexes": index_specs(collection),
+    }
+
+
+def take_backup(store: BackupStore, client, kind: str, parallel: int) -> dict:
+    database = client.get_database(DATABASE_NAME, codec_options=RAW)
+    names = backup_collections(database)
+    started_at = datetime.utcnow()
+    oplog_ts = oplog_position(client)
+
+    parent = None
+    mode = "full"
+    changes = None
+    if kind == "incremental":
+        manifests = store.manifests()
+        if not manifests:
+            print("ℹ️  No restore point to build on - taking a full base")
+            kind = "full"
+        else:
+            parent = manifests[-1]
+            if oplog_ts is not None and parent.get("oplog_ts") is not None:
+                changes = oplog_changes(client, names, parent["oplog_ts"])
+            if changes is not None:
+                mode = "oplog"
+            elif all(name in BACKUP_TIMESTAMPED_COLLECTIONS for name in names):
+                mode = "fields"
+            else:
+                mode = "scan"
+
+    def one(name):
+        collection = database[name]
+        if kind == "full":
+            return name, full_collection(store, collection)
+        parent_entry = parent["collections"].get(name)
+        since = parent["started_at"] - FIELD_MODE_OVERLAP
+        return name, incremental_collection(
+            store, collection, parent_entry, since, changes.get(name, set()) if changes is not None else None
+        )
+
+    with ThreadPoolExecutor(parallel) as pool:
+        collections = dict(pool.map(one, names))
+
+    manifest = {
+        "id": new_manifest_id(kind, started_at),
+        "type": kind,
+        "mode": mode,
+        "parent": parent["id"] if parent else None,
+        "database": DATABASE_NAME,
+        "started_at": started_at,
+        "created_at": datetime.utcnow(),
+        "oplog_ts": oplog_ts,
+        # Collections re-read in full for want of an oplog or maintained timestamps
+        "scanned": sorted(n for n in names if n not in BACKUP_TIMESTAMPED_COLLECTIONS) if mode == "scan" else [],
+        "collections": collections,
+    }
+    store.save_manifest(manifest)
+    return manifest
+
+
+def verify_restore_point(store: BackupStore, manifest_id: str) -> int:
+    """
+    Read back every chunk a restore point depends on; returns the number checked
+    """
+    checked = set()
+    for manifest in store.chain(manifest_id):
+        for entry in manifest["collections"].values():
+            for part in ("docs", "index", "deletes"):
+                for ref in entry.get(part, []):
+                    if ref["sha256"] not in checked:
+                        store.get(ref["sha256"])
+                        checked.add(ref["sha256"])
+    return len(checked)
+
+
+# ============================================================
+# CLI
+# ============================================================
+def print_summary(manifest: dict, store: BackupStore, elapsed: float):
+    docs = sum(e["count"] for e in manifest["collections"].values())
+    print(f"✅ {manifest['type']} restore point {manifest['id']} ({manifest['mode']}) in {elapsed:.1f}s")
+    print(f"   📊 {len(manifest['collections'])} collections, {docs} documents")
+    print(f"   💾 {store.written_chunks} new chunks ({store.written_bytes / 1024 / 1024:.2f} MB), {store.reused_chunks} reused")
+    if manifest.get("scanned"):
+        print(f"   ⚠️  No usable oplog: re-read {len(manifest['scanned'])} collections in full "
+              f"({', '.join(manifest['scanned'])}). Run MongoDB as a replica set, or list collections "
+              f"whose every write sets updated_at in BACKUP_TIMESTAMPED_COLLECTIONS")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental, deduplicated database backups")
+    parser.add_argument("--dir", default=BACKUP_DIR, help="backup store directory")
+    parser.add_argument("--parallel", type=int, default=BACKUP_PARALLEL, help="collections dumped at once")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("run", help="full or incremental as due, then prune")
+    sub.add_parser("full")
+    sub.add_parser("incremental")
+    sub.add_parser("list")
+    verify = sub.add_parser("verify")
+    verify.add_argument("id", nargs="?", help="restore point (default: latest)")
+    prune = sub.add_parser("prune")
+    prune.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    store = BackupStore(args.dir)
+
+    if args.command == "list":
+        for m in store.manifests():
+            docs = sum(e["count"] for e in m["collections"].values())
+            print(f"{m['id']:<36} {m['type']:<12} {m['mode']:<7} {docs:>10} docs  parent={m['parent'] or '-'}")
+        return
+
+    if args.command == "verify":
+        manifests = store.manifests()
+        manifest_id = args.id or (manifests[-1]["id"] if manifests else None)
+        if manifest_id is None:
+            print("❌ No restore points")
+            sys.exit(1)
+        try:
+            checked = verify_restore_point(store, manifest_id)
+        except BackupIntegrityError as e:
+            print(f"❌ {manifest_id}: {e}")
+            sys.exit(1)
+        print(f"✅ {manifest_id}: {checked} chunks verified")
+        return
+
+    with store.lock():
+        if args.command in ("run", "full", "incremental"):
+            kind = args.command
+            if kind == "run":
+                age = latest_full_age(store.manifests(), datetime.utcnow())
+                kind = "full" if age is None or age >= timedelta(hours=BACKUP_FULL_EVERY_HOURS) else "incremental"
+            client = MongoClient(MONGO_URI)
+            started = time.perf_counter()
+            try:
+                manifest = take_backup(store, client, kind, args.parallel)
+            except Exception as e:
+                print(f"❌ Backup failed: {e}")
+                sys.exit(1)
+            finally:
+                client.close()
+            print_summary(manifest, store, time.perf_counter() - started)
+
+        if args.command in ("run", "prune"):
+            result = store.prune(BACKUP_KEEP_HOURLY, BACKUP_KEEP_DAILY, BACKUP_KEEP_WEEKLY,
+                                 dry_run=getattr(args, "dry_run", False))
+            verb = "Would remove" if getattr(args, "dry_run", False) else "Removed"
+            print(f"🧹 {verb} {len(result['removed'])} restore points and {result['chunks_removed']} chunks; "
+                  f"{len(result['kept'])} restore points kept")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Rate Limiter Benchmark
+Measures per-hit overhead and memory per tracked key of ShardedMemoryStore
+
+Usage:
+    cd backend && python benchmarks/bench_rate_limiter.py [--keys 100000] [--threads 8]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.rate_limiter import RateLimitPolicy, ShardedMemoryStore  # noqa: E402
+
+
+def bench_hit_overhead(algorithm: str, iterations: int) -> float:
+    """
+    Return mean nanoseconds per hit on a warm set of 1000 keys
+    """
+    store = ShardedMemoryStore()
+    policy = RateLimitPolicy("bench", limit=1_000_000, period=60, algorithm=algorithm)
+    keys = [f"bench:10.0.{i // 256}.{i % 256}" for i in range(1000)]
+    now = time.time()
+    for key in keys:
+        store.hit(key, policy, now)
+
+    start = time.perf_counter_ns()
+    for i in range(iterations):
+        store.hit(keys[i % 1000], policy, now + i * 1e-6)
+    return (time.perf_counter_ns() - start) / iterations
+
+
+def bench_memory_per_key(algorithm: str, keys: int) -> float:
+    """
+    Return bytes allocated per tracked key (store state only, key strings excluded)
+    """
+    names = [f"login_email:student{i}@example.edu" for i in range(keys)]
+    policy = RateLimitPolicy("bench", limit=5, period=60, algorithm=algorithm)
+    now = time.time()
+
+    tracemalloc.start()
+    store = ShardedMemoryStore(max_keys_per_shard=keys)
+    before = tracemalloc.get_traced_memory()[0]
+    for name in names:
+        store.hit(name, policy, now)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / keys
+
+
+def bench_contention(threads: int, hits_per_thread: int) -> float:
+    """
+    Return aggregate hits per second across threads sharing one store
+    """
+    store = ShardedMemoryStore()
+    policy = RateLimitPolicy("bench", limit=1_000_000, period=60)
+
+    def worker(tid: int):
+        now = time.time()
+        for i in range(hits_per_thread):
+            store.hit(f"bench:{tid}:{i % 500}", policy, now)
+
+    pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return threads * hits_per_thread / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the in-memory rate limiter")
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    print("⏱️  Rate limiter benchmark")
+    for algorithm in ("token_bucket", "sliding_window"):
+        ns = bench_hit_overhead(algorithm, args.iterations)
+        per_key = bench_memory_per_key(algorithm, args.keys)
+        print(f"   {algorithm:<15} {ns:8.0f} ns/hit   {per_key:6.0f} bytes/key")
+    rate = bench_contention(args.threads, args.iterations // args.threads)
+    print(f"   {args.threads} threads       {rate:,.0f} hits/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks
+Times the per-request hot functions and compares them with a saved baseline
+
+Usage:
+    cd backend && python benchmarks/microbench.py --save-baseline   # on the base commit
+    cd backend && python benchmarks/microbench.py                   # after a change
+    cd backend && python benchmarks/microbench.py --filter verify_admin --threshold 15
+
+Exits with status 1 when any benchmark's best round is slower than the baseline by
+more than --threshold percent. Baselines are machine specific, so they are
+kept in benchmarks/baseline.json locally rather than committed.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.requests import Request  # noqa: E402
+from starlette.responses import Response  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str):
+    """
+    Register a setup function; it returns the zero-argument callable to time
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def make_request(path: str = "/api/papers/", token: str | None = None) -> Request:
+    headers = [
+        (b"user-agent", b"Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/126.0 Safari/537.36"),
+        (b"referer", b"https://eduresources.example.com/papers"),
+        (b"accept-encoding", b"gzip, br"),
+    ]
+    if token:
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "scheme": "https",
+        "path": path,
+        "root_path": "",
+        "query_string": b"fields=title,subject,semester",
+        "headers": headers,
+        "client": ("10.0.3.17", 52814),
+        "server": ("api.eduresources.example.com", 443),
+    })
+
+
+# ============================================================
+# Auth
+# ============================================================
+@benchmark("auth.create_access_token")
+def bench_create_access_token():
+    from routes.auth import create_access_token
+    payload = {"sub": "student42@example.com", "role": "student", "is_admin": False}
+    return lambda: create_access_token(payload)
+
+
+def _verify_admin_bench(module):
+    from routes.auth import create_access_token
+    token = create_access_token({"sub": "admin@example.com", "role": "admin", "is_admin": True})
+    verify_admin = module.verify_admin
+    # A fresh Request each call: Starlette caches parsed headers per request object
+    return lambda: verify_admin(make_request(token=token))
+
+
+@benchmark("notes_routes.verify_admin")
+def bench_notes_verify_admin():
+    from routes import notes_routes
+    return _verify_admin_bench(notes_routes)
+
+
+@benchmark("papers_routes.verify_admin")
+def bench_papers_verify_admin():
+    from routes import papers_routes
+    return _verify_admin_bench(papers_routes)
+
+
+@benchmark("syllabus_routes.verify_admin")
+def bench_syllabus_verify_admin():
+    from routes import syllabus_routes
+    return _verify_admin_bench(syllabus_routes)
+
+
+@benchmark("rate_limiter.hit")
+def bench_rate_limiter_hit():
+    from utils.rate_limiter import RateLimitPolicy, ShardedMemoryStore
+    store = ShardedMemoryStore()
+    policy = RateLimitPolicy("bench", limit=1_000_000, period=60)
+    keys = [f"login_ip:10.0.{i // 256}.{i % 256}" for i in range(1000)]
+    state = {"i": 0}
+
+    def hit():
+        state["i"] += 1
+        store.hit(keys[state["i"] % 1000], policy, time.time())
+    return hit
+
+
+# ============================================================
+# Middleware and logging
+# ============================================================
+@benchmark("RequestLoggingMiddleware._extract_request_info")
+def bench_extract_request_info():
+    from middleware.logging_middleware import RequestLoggingMiddleware
+    middleware = RequestLoggingMiddleware(app=None)
+    return lambda: middleware._extract_request_info(make_request())
+
+
+@benchmark("SecurityHeadersMiddleware._add_security_headers")
+def bench_add_security_headers():
+    from middleware.security_headers import SecurityHeadersMiddleware
+    middleware = SecurityHeadersMiddleware(app=None, enforce_https=False)
+    return lambda: middleware._add_security_headers(Response(), make_request("/api/auth/login"))
+
+
+@benchmark("JSONFormatter.format")
+def bench_json_formatter():
+    from app_logging.config import JSONFormatter
+    formatter = JSONFormatter()
+    record = logging.makeLogRecord({
+        "name": "app.requests", "levelno": logging.INFO, "levelname": "INFO",
+        "msg": "GET /api/papers/ - 200 (12.41ms)", "client_ip": "10.0.3.17", "method": "GET",
+        "path": "/api/papers/", "status_code": 200, "duration_ms": 12.41,
+        "user_agent": "Mozilla/5.0 (X11; Linux x86_64)",
+    })
+    return lambda: formatter.format(record)
+
+
+# ============================================================
+# Validation and serialization
+# ============================================================
+@benchmark("NoteCreate.model_validate")
+def bench_note_create():
+    from routes.notes_routes import NoteCreate
+    payload = {"title": "Unit 3 Notes", "description": "Thermodynamics", "subject": "Physics",
+               "semester": "2", "file_url": "/uploads/notes/unit3.pdf"}
+    return lambda: NoteCreate.model_validate(payload)
+
+
+@benchmark("PaperCreate.model_validate")
+def bench_paper_create():
+    from routes.papers_routes import PaperCreate
+    payload = {"title": "Mathematics II", "subject": "Mathematics", "semester": "2",
+               "year": "2024", "file_url": "/uploads/papers/maths2.pdf"}
+    return lambda: PaperCreate.model_validate(payload)
+
+
+@benchmark("SyllabusCreate.model_validate")
+def bench_syllabus_create():
+    from routes.syllabus_routes import SyllabusCreate
+    payload = {"branch": "CSE", "semester": "4", "year": "2024", "file_url": "/uploads/syllabus/cse4.pdf"}
+    return lambda: SyllabusCreate.model_validate(payload)
+
+
+@benchmark("rename_ids[100 docs]")
+def bench_rename_ids():
+    from datetime import datetime as dt
+    from utils.projections import rename_ids
+    template = [
+        {"_id": f"paper-{i}", "title": f"Paper {i}", "subject": "Mathematics", "semester": "3",
+         "year": "2024", "file_url": f"/uploads/papers/{i}.pdf", "created_at": dt(2024, 1, 1)}
+        for i in range(100)
+    ]
+    # Copying the page is part of the timing, as the handler receives fresh dicts per request
+    return lambda: rename_ids([dict(doc) for doc in template])
+
+
+# ============================================================
+# Runner
+# ============================================================
+def measure(fn, repeat: int, min_time: float) -> dict:
+    """
+    Return ns/op statistics over `repeat` rounds of at least `min_time` seconds each
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    rounds = [t / number * 1e9 for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "median_ns": round(statistics.median(rounds), 1),
+        "min_ns": round(min(rounds), 1),
+        "stdev_ns": round(statistics.stdev(rounds), 1) if len(rounds) > 1 else 0.0,
+        "rounds": repeat,
+        "iterations": number,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-request hot functions")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per round")
+    parser.add_argument("--threshold", type=float, default=25.0, help="allowed slowdown in percent")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    # Keep log output from the imported modules out of the measurements
+    logging.disable(logging.CRITICAL)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    print("⏱️  Microbenchmarks" + (f" (baseline: {os.path.relpath(args.baseline)})" if baseline else ""))
+    results = {}
+    regressions = []
+    for name, setup in BENCHMARKS.items():
+        if args.filter and args.filter not in name:
+            continue
+        result = results[name] = measure(setup(), args.repeat, args.min_time)
+
+        line = f"   {name:<50} {result['min_ns']:>11,.0f} ns/op  (median {result['median_ns']:>9,.0f})"
+        before = baseline.get(name)
+        if before:
+            # The fastest round is the least disturbed by other load on the machine
+            delta = (result["min_ns"] - before["min_ns"]) / before["min_ns"] * 100
+            line += f"   {delta:+6.1f}%"
+            if delta > args.threshold:
+                line += "  ❌ regression"
+                regressions.append(name)
+        print(line)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "created_at": datetime.utcnow().isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            }, f, indent=2)
+        print(f"✅ Baseline saved to {os.path.relpath(args.baseline)}")
+
+    if regressions:
+        print(f"❌ {len(regressions)} benchmark(s) slower than baseline by more than {args.threshold:.0f}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
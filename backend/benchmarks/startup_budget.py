@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Cold-Start Budget Check
+Imports the app in a fresh interpreter under `python -X importtime` and fails
+if the import is slower than the budget, writes to stdout, or opens a
+database connection.
+
+Usage:
+    cd backend && python benchmarks/startup_budget.py [--budget-ms 1500] [--runs 3]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Unroutable address (TEST-NET-1): any connection attempt at import would hang or fail
+PROBE_ENV = {"MONGO_URL": "mongodb://192.0.2.1:27017/?serverSelectionTimeoutMS=1"}
+
+PROBE = "import server, database; assert database._client is None, 'MongoClient created at import'"
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def measure() -> tuple[int, list, str]:
+    """
+    Run one cold import; return (cumulative µs for `server`, per-module rows, stdout)
+    """
+    env = {**os.environ, **PROBE_ENV}
+    env.pop("MONGO_URI", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    if result.returncode != 0:
+        tail = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise SystemExit("❌ Import failed:\n" + "\n".join(tail[-20:]))
+
+    rows = []
+    total = 0
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        rows.append((int(cumulative_us), int(self_us), module))
+        if module == "server" and len(indent) == 1:
+            total = int(cumulative_us)
+    return total, rows, result.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enforce the backend cold-start import budget")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_BUDGET_MS", "1500")))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    # Take the best of several runs so one noisy run on a shared CI box doesn't fail the build
+    runs = [measure() for _ in range(args.runs)]
+    total, rows, stdout = min(runs, key=lambda run: run[0])
+    total_ms = total / 1000
+
+    print(f"⏱️  Cold import of server: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms, best of {args.runs})")
+    print("   Slowest modules (self time):")
+    for cumulative_us, self_us, module in sorted(rows, key=lambda r: r[1], reverse=True)[: args.top]:
+        print(f"   {self_us / 1000:8.1f} ms  {module}")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"import took {total_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    if stdout.strip():
+        failures.append(f"import wrote to stdout: {stdout.strip()[:200]!r}")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print("✅ Startup budget met")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 from pathlib import Path
 from dotenv import load_dotenv
 import os
-from pymongo import MongoClient
 
 # -----------------------------
 # Load .env explicitly from backend folder
@@ -14,13 +13,32 @@ load_dotenv(dotenv_path)
 # -----------------------------
 MONGO_URI = os.getenv("MONGO_URI") or os.getenv("MONGO_URL")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "academic_resources_db")
+# The MongoClient itself is created per worker process in database.py
 
-try:
-    client = MongoClient(MONGO_URI)
-    db = client[DATABASE_NAME]
-    print(f"✅ MongoDB connected successfully to database: {DATABASE_NAME}")
-except Exception as e:
-    print("❌ MongoDB connection failed:", e)
+# Connection pool / driver options (per worker process - total connections to the
+# server are roughly workers x MONGO_MAX_POOL_SIZE)
+MONGO_CLIENT_OPTIONS = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+    "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+    "maxConnecting": int(os.getenv("MONGO_MAX_CONNECTING", "2")),
+    "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")),
+    "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+    "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000")),
+    "retryWrites": os.getenv("MONGO_RETRY_WRITES", "true").lower() == "true",
+    "retryReads": os.getenv("MONGO_RETRY_READS", "true").lower() == "true",
+}
+# Catalog listings, search and stats read from secondaries within this staleness bound;
+# writes and auth lookups always use the primary. Set MONGO_MAX_STALENESS_SECONDS=-1 for no bound.
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "secondaryPreferred")
+MONGO_MAX_STALENESS_SECONDS = int(os.getenv("MONGO_MAX_STALENESS_SECONDS", "90"))
+# How long after a write an admin's reads wait for that write on secondaries
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "300"))
+
+# e.g. "zstd,snappy,zlib" - only compressors supported by both driver and server are used
+if os.getenv("MONGO_COMPRESSORS"):
+    MONGO_CLIENT_OPTIONS["compressors"] = os.getenv("MONGO_COMPRESSORS")
 
 # -----------------------------
 # JWT / Auth Configuration
@@ -28,6 +46,11 @@ except Exception as e:
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY") or os.getenv("SECRET_KEY") or "change_this_secret"
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Verification links are single use; an unverified registration is dropped by a TTL index after PENDING_TTL
+VERIFICATION_TOKEN_EXPIRE_MINUTES = int(os.getenv("VERIFICATION_TOKEN_EXPIRE_MINUTES", "15"))
+REGISTRATION_PENDING_TTL_HOURS = int(os.getenv("REGISTRATION_PENDING_TTL_HOURS", "48"))
+# Access tokens are renewed from a rotating refresh token for this long after the last renewal
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
 
 # -----------------------------
 # CORS / Frontend
@@ -35,6 +58,180 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000").split(",")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
+# -----------------------------
+# Worker Processes
+# -----------------------------
+# Thread pool size for blocking work (file I/O, hashing) in each worker process
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "16"))
+
+# -----------------------------
+# Rate Limiting
+# -----------------------------
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")  # "memory" or "mongo"
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+RATE_LIMIT_POLICIES = {
+    "login_ip": os.getenv("RATE_LIMIT_LOGIN_IP", "20/minute"),
+    "login_email": os.getenv("RATE_LIMIT_LOGIN_EMAIL", "5/minute"),
+    "register_ip": os.getenv("RATE_LIMIT_REGISTER_IP", "10/hour"),
+    "register_email": os.getenv("RATE_LIMIT_REGISTER_EMAIL", "3/hour"),
+    "resend_verification_ip": os.getenv("RATE_LIMIT_RESEND_VERIFICATION_IP", "10/hour"),
+    "resend_verification_email": os.getenv("RATE_LIMIT_RESEND_VERIFICATION_EMAIL", "3/hour"),
+}
+
+# -----------------------------
+# Request Log Sampling
+# -----------------------------
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_SAMPLE_MIN_RATE = float(os.getenv("LOG_SAMPLE_MIN_RATE", "0.01"))
+LOG_SAMPLE_TARGET_PER_SEC = float(os.getenv("LOG_SAMPLE_TARGET_PER_SEC", "50"))
+LOG_SUMMARY_INTERVAL_SECONDS = float(os.getenv("LOG_SUMMARY_INTERVAL_SECONDS", "60"))
+
+# -----------------------------
+# Response Compression
+# -----------------------------
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Bodies at least this large are compressed off the event loop
+COMPRESSION_OFFLOAD_SIZE = int(os.getenv("COMPRESSION_OFFLOAD_SIZE", "65536"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+COMPRESSION_CACHE_MAX_BYTES = int(os.getenv("COMPRESSION_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# -----------------------------
+# Catalog Snapshots
+# -----------------------------
+CATALOG_SNAPSHOT_DIR = os.getenv("CATALOG_SNAPSHOT_DIR", os.path.join("snapshots", "catalog"))
+# Rebuild this long after the last catalog write, but no later than the max delay after the first
+CATALOG_SNAPSHOT_DEBOUNCE_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_DEBOUNCE_SECONDS", "5"))
+CATALOG_SNAPSHOT_MAX_DELAY_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_MAX_DELAY_SECONDS", "60"))
+CATALOG_SNAPSHOT_KEEP = int(os.getenv("CATALOG_SNAPSHOT_KEEP", "3"))
+
+# -----------------------------
+# Download Events
+# -----------------------------
+# Buffered per worker and flushed every interval or once FLUSH_MAX_EVENTS are waiting
+DOWNLOAD_FLUSH_INTERVAL_MS = int(os.getenv("DOWNLOAD_FLUSH_INTERVAL_MS", "1000"))
+DOWNLOAD_FLUSH_MAX_EVENTS = int(os.getenv("DOWNLOAD_FLUSH_MAX_EVENTS", "500"))
+# Past this many buffered events, downloads wait (up to MAX_WAIT) for a flush
+DOWNLOAD_BUFFER_MAX_EVENTS = int(os.getenv("DOWNLOAD_BUFFER_MAX_EVENTS", "10000"))
+DOWNLOAD_BUFFER_MAX_WAIT_SECONDS = float(os.getenv("DOWNLOAD_BUFFER_MAX_WAIT_SECONDS", "2"))
+# Events that could not be written at shutdown are kept here and replayed on start
+DOWNLOAD_SPOOL_DIR = os.getenv("DOWNLOAD_SPOOL_DIR", os.path.join("spool", "downloads"))
+
+# -----------------------------
+# File Storage
+# -----------------------------
+# "local" keeps uploads under UPLOAD_ROOT; "s3" uses any S3-compatible store (AWS, MinIO, ...)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+UPLOAD_ROOT = os.getenv("UPLOAD_ROOT", "uploads")
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+# Set for MinIO / other S3 stand-ins; unset for AWS
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+# Host clients reach the store on, when it differs from the API's (e.g. a Docker service name)
+S3_PUBLIC_ENDPOINT_URL = os.getenv("S3_PUBLIC_ENDPOINT_URL") or S3_ENDPOINT_URL
+S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID") or None
+S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY") or None
+STORAGE_PRESIGN_EXPIRE_SECONDS = int(os.getenv("STORAGE_PRESIGN_EXPIRE_SECONDS", "900"))
+# Files this large or larger are uploaded in parts of MULTIPART_PART_MB
+STORAGE_MULTIPART_THRESHOLD_MB = int(os.getenv("STORAGE_MULTIPART_THRESHOLD_MB", "16"))
+STORAGE_MULTIPART_PART_MB = int(os.getenv("STORAGE_MULTIPART_PART_MB", "16"))
+
+# -----------------------------
+# Resumable Uploads
+# -----------------------------
+# Chunks of open upload sessions are staged here; with several API hosts this must be a shared volume
+UPLOAD_STAGING_DIR = os.getenv("UPLOAD_STAGING_DIR", os.path.join("spool", "uploads"))
+UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", "512"))
+UPLOAD_CHUNK_MAX_MB = int(os.getenv("UPLOAD_CHUNK_MAX_MB", "32"))
+# Every chunk but the last must be at least this big
+UPLOAD_CHUNK_MIN_KB = int(os.getenv("UPLOAD_CHUNK_MIN_KB", "256"))
+# Sessions expire this long after their last chunk; staged chunks are removed every GC interval
+UPLOAD_SESSION_TTL_HOURS = float(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+UPLOAD_SESSION_GC_INTERVAL_SECONDS = float(os.getenv("UPLOAD_SESSION_GC_INTERVAL_SECONDS", "600"))
+
+# -----------------------------
+# Profile Photos
+# -----------------------------
+# Square variants rendered from each upload (pixels); the profile uses the middle one
+PHOTO_SIZES = tuple(sorted(int(s) for s in os.getenv("PHOTO_SIZES", "64,256,512").split(",") if s.strip()))
+PHOTO_FORMAT = os.getenv("PHOTO_FORMAT", "webp").lower()  # webp or avif
+PHOTO_QUALITY = int(os.getenv("PHOTO_QUALITY", "80"))
+PHOTO_MAX_MB = int(os.getenv("PHOTO_MAX_MB", "15"))
+# Larger images are refused before decoding (decompression bombs)
+PHOTO_MAX_PIXELS = int(os.getenv("PHOTO_MAX_PIXELS", "50000000"))
+# Processes decoding and resizing photos, per API worker (started on first use)
+PHOTO_PROCESS_WORKERS = int(os.getenv("PHOTO_PROCESS_WORKERS", "2"))
+
+# -----------------------------
+# Trending
+# -----------------------------
+# Hourly download buckets inside the window count, halving in weight every HALF_LIFE hours
+TRENDING_WINDOW_HOURS = int(os.getenv("TRENDING_WINDOW_HOURS", "168"))
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "48"))
+TRENDING_TOP_K = int(os.getenv("TRENDING_TOP_K", "20"))
+TRENDING_REFRESH_SECONDS = float(os.getenv("TRENDING_REFRESH_SECONDS", "60"))
+
+# -----------------------------
+# Background Jobs
+# -----------------------------
+# Every API worker polls the `jobs` collection; set JOBS_ENABLED=false to only enqueue
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "true").lower() == "true"
+JOBS_POLL_INTERVAL_SECONDS = float(os.getenv("JOBS_POLL_INTERVAL_SECONDS", "1"))
+# A running job's lease is renewed every third of this; a job whose lease lapses is run again
+JOBS_LEASE_SECONDS = float(os.getenv("JOBS_LEASE_SECONDS", "30"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "5"))
+JOBS_RETRY_BASE_SECONDS = float(os.getenv("JOBS_RETRY_BASE_SECONDS", "5"))
+JOBS_RETRY_MAX_SECONDS = float(os.getenv("JOBS_RETRY_MAX_SECONDS", "600"))
+# Processes for CPU-bound jobs, per API worker (started on first use)
+JOBS_PROCESS_WORKERS = int(os.getenv("JOBS_PROCESS_WORKERS", "2"))
+# Finished and failed jobs are removed this long after they end
+JOBS_RETENTION_HOURS = int(os.getenv("JOBS_RETENTION_HOURS", "72"))
+JOBS_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("JOBS_SHUTDOWN_TIMEOUT_SECONDS", "10"))
+
+# -----------------------------
+# Backups (backup.py)
+# -----------------------------
+BACKUP_DIR = os.getenv("BACKUP_DIR", "/app/backups")
+# Ephemeral or derived collections that are rebuilt on their own
+BACKUP_EXCLUDE_COLLECTIONS = set(filter(None, os.getenv(
+    "BACKUP_EXCLUDE_COLLECTIONS",
+    "rate_limits,slow_queries,slow_query_plans,request_profiles,profiling_settings,catalog_snapshots,download_buckets",
+).split(",")))
+# `backup.py run` takes a full base this often and incrementals in between
+BACKUP_FULL_EVERY_HOURS = float(os.getenv("BACKUP_FULL_EVERY_HOURS", "24"))
+# Without a usable oplog, incrementals trust updated_at / created_at / ts only
+# for these collections (every write must set one); others are re-read and hashed
+BACKUP_TIMESTAMPED_COLLECTIONS = set(filter(None, os.getenv("BACKUP_TIMESTAMPED_COLLECTIONS", "").split(",")))
+BACKUP_PARALLEL = int(os.getenv("BACKUP_PARALLEL", "4"))
+# Restore points kept: the newest in each of the last N hours / days / weeks
+BACKUP_KEEP_HOURLY = int(os.getenv("BACKUP_KEEP_HOURLY", "24"))
+BACKUP_KEEP_DAILY = int(os.getenv("BACKUP_KEEP_DAILY", "7"))
+BACKUP_KEEP_WEEKLY = int(os.getenv("BACKUP_KEEP_WEEKLY", "4"))
+# restore.py: collections loaded at once, and the time a full restore should stay under
+RESTORE_PARALLEL = int(os.getenv("RESTORE_PARALLEL", "4"))
+RESTORE_TARGET_SECONDS = float(os.getenv("RESTORE_TARGET_SECONDS", "120"))
+
+# -----------------------------
+# Slow Query Log
+# -----------------------------
+# Commands at or over the threshold are recorded in the capped `slow_queries` collection
+SLOW_QUERY_LOG_ENABLED = os.getenv("SLOW_QUERY_LOG_ENABLED", "true").lower() == "true"
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
+SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", str(16 * 1024 * 1024)))
+SLOW_QUERY_LOG_MAX_DOCS = int(os.getenv("SLOW_QUERY_LOG_MAX_DOCS", "50000"))
+
+# -----------------------------
+# Request Profiling
+# -----------------------------
+# Requires pyinstrument; profiles are only taken for signed X-Profile-Token requests
+# or inside a sampling window an admin opens
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "1"))
+PROFILING_RETENTION_DAYS = int(os.getenv("PROFILING_RETENTION_DAYS", "7"))
+PROFILING_MAX_SAMPLE_FRACTION = float(os.getenv("PROFILING_MAX_SAMPLE_FRACTION", "0.05"))
+PROFILING_MAX_WINDOW_MINUTES = int(os.getenv("PROFILING_MAX_WINDOW_MINUTES", "60"))
+
 # -----------------------------
 # SMTP / Email Config
 # -----------------------------
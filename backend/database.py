@@ -1,20 +1,195 @@
 # database.py
+"""
+Per-process MongoDB connection management.
+
+The client is created lazily on first use (or explicitly from the app
+lifespan) and discarded in forked children, so pre-fork servers never
+share sockets or monitor threads between worker processes.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from contextlib import contextmanager
+
+import bson
+from bson.timestamp import Timestamp
 from pymongo import MongoClient
-from config import MONGO_URI as MONGO_URL, DATABASE_NAME
+from pymongo.read_preferences import Primary, Secondary, SecondaryPreferred, Nearest, PrimaryPreferred
+from config import (
+    MONGO_URI as MONGO_URL,
+    DATABASE_NAME,
+    MONGO_CLIENT_OPTIONS,
+    MONGO_READ_PREFERENCE,
+    MONGO_MAX_STALENESS_SECONDS,
+    READ_YOUR_WRITES_SECONDS,
+    JWT_SECRET_KEY,
+)
+from utils import metrics
+from utils.db_monitoring import pool_monitor, slow_query_monitor
+
+_client: MongoClient | None = None
+_read_db = None
+_lock = threading.Lock()
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+# Cookie carrying the operation time of an admin's last write (signed, short-lived)
+READ_AFTER_COOKIE = "read_after"
+
+
+def get_client() -> MongoClient:
+    """Return this process's MongoClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                # Falls back to localhost when MONGO_URL / MONGO_URI is unset
+                _client = MongoClient(
+                    MONGO_URL, event_listeners=[pool_monitor, slow_query_monitor], **MONGO_CLIENT_OPTIONS
+                )
+    return _client
+
+
+def get_db():
+    return get_client()[DATABASE_NAME]
+
+
+def get_read_db():
+    """Database handle for catalog reads, routed by MONGO_READ_PREFERENCE."""
+    global _read_db
+    if _read_db is None or _read_db.client is not get_client():
+        mode = READ_PREFERENCES[MONGO_READ_PREFERENCE]
+        preference = mode() if mode is Primary else mode(max_staleness=MONGO_MAX_STALENESS_SECONDS)
+        _read_db = get_client().get_database(DATABASE_NAME, read_preference=preference)
+    return _read_db
+
+
+def connect():
+    """Create the client for this worker (called from the app lifespan)."""
+    return get_client()
+
+
+def close():
+    """Close this worker's client so in-flight operations finish and sockets are released."""
+    global _client, _read_db
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+            _read_db = None
+
+
+def _reset_after_fork():
+    # The parent's client (if any) is unusable in the child; drop it without closing
+    # so the parent's sockets are left alone.
+    global _client, _read_db, _lock
+    _client = None
+    _read_db = None
+    _lock = threading.Lock()
+    pool_monitor.reset()
+    slow_query_monitor.reset()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+slow_query_monitor.bind(get_client, DATABASE_NAME)
+metrics.register("mongo_pool", pool_monitor.snapshot)
+metrics.register("slow_queries", slow_query_monitor.snapshot)
+
+
+# ------------------------------------------------------------
+# Read-your-writes across secondaries
+# ------------------------------------------------------------
+def _sign(value: str) -> str:
+    return hmac.new(JWT_SECRET_KEY.encode(), value.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def _encode_read_after(session) -> str:
+    """
+    Signed cookie value holding the session's operation time and, on replica
+    sets, the server-signed $clusterTime that other nodes need to serve
+    reads after it
+    """
+    state = {"operationTime": session.operation_time}
+    if session.cluster_time is not None:
+        state["clusterTime"] = session.cluster_time
+    value = base64.urlsafe_b64encode(bson.encode(state)).decode().rstrip("=")
+    return f"{value}.{_sign(value)}"
+
+
+def _decode_read_after(token: str | None) -> dict | None:
+    try:
+        value, signature = token.split(".")
+    except (AttributeError, ValueError):
+        return None
+    if not hmac.compare_digest(signature, _sign(value)):
+        return None
+    try:
+        state = bson.decode(base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)))
+    except Exception:
+        return None
+    return state if isinstance(state.get("operationTime"), Timestamp) else None
+
+
+@contextmanager
+def write_session(response=None):
+    """
+    Causally consistent session for writes. If `response` is given, the
+    operation time of the write is sent back as a signed cookie so the
+    writer's next reads (on any worker) wait for it on secondaries.
+    """
+    with get_client().start_session(causal_consistency=True) as session:
+        yield session
+        if response is not None and session.operation_time is not None:
+            response.set_cookie(
+                READ_AFTER_COOKIE,
+                _encode_read_after(session),
+                max_age=READ_YOUR_WRITES_SECONDS,
+                httponly=True,
+                samesite="lax",
+            )
+
+
+@contextmanager
+def read_session(request=None):
+    """
+    Session for catalog reads. Without a read-after cookie this yields None
+    (plain secondary reads); with one, reads are causally ordered after it.
+    """
+    state = _decode_read_after(request.cookies.get(READ_AFTER_COOKIE)) if request is not None else None
+    if state is None:
+        yield None
+        return
+    with get_client().start_session(causal_consistency=True) as session:
+        # The cluster time first: a node that has not seen it may reject
+        # (or stall on) an afterClusterTime beyond what it knows
+        if state.get("clusterTime") is not None:
+            session.advance_cluster_time(state["clusterTime"])
+        session.advance_operation_time(state["operationTime"])
+        yield session
+
+
+class LazyDatabase:
+    """Stand-in for a pymongo Database that resolves the per-process client on access."""
 
+    def __init__(self, resolve=get_db):
+        self._resolve = resolve
 
-import sys
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
 
-if not MONGO_URL:
-    raise ValueError("MONGO_URL / MONGO_URI is not set in environment variables (.env)")
+    def __getitem__(self, name):
+        return self._resolve()[name]
 
-client = MongoClient(MONGO_URL)
-db = client[DATABASE_NAME]
 
-# optional quick ping (will raise if problem)
-try:
-    client.admin.command("ping")
-    print("✅ MongoDB connected successfully")
-except Exception as e:
-    print(f"❌ MongoDB ping failed: {e}")
-    # Don't exit here; allow server to start but db calls will error explicitly
+# Primary: writes, auth lookups and anything that must see the latest data
+db = LazyDatabase()
+# Secondaries (per MONGO_READ_PREFERENCE): catalog listings, search and stats
+read_db = LazyDatabase(get_read_db)
@@ -0,0 +1,75 @@
+# gunicorn.conf.py
+"""
+Production launcher configuration.
+
+    cd backend && gunicorn server:app -c gunicorn.conf.py
+
+Runs one uvicorn worker per available core (respecting CPU affinity and
+cgroup quotas), optionally preloading the app in the master, and drains
+in-flight requests on SIGTERM before workers exit.
+"""
+import math
+import os
+
+
+def available_cpus() -> int:
+    """Cores this process may actually use: affinity mask, capped by any cgroup CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    # cgroup v2
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        # cgroup v1
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                quota = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if quota > 0:
+                cpus = min(cpus, math.ceil(quota / period))
+        except (OSError, ValueError):
+            pass
+
+    return max(1, cpus)
+
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8001')}")
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or available_cpus()
+
+# Import the app once in the master so workers fork with warm code pages.
+# Safe because the Mongo client and executors are created per worker in the lifespan.
+preload_app = os.getenv("PRELOAD_APP", "true").lower() == "true"
+
+# Graceful drain: on SIGTERM workers stop accepting, finish in-flight requests
+# (up to graceful_timeout) and run the lifespan shutdown before exiting.
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+
+# Recycle workers periodically to bound memory growth; jitter avoids synchronized restarts
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+
+accesslog = None  # request logging is done by RequestLoggingMiddleware
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+
+def when_ready(server):
+    server.log.info(f"✅ Serving on {bind} with {workers} workers (preload={preload_app})")
+
+
+def post_fork(server, worker):
+    server.log.info(f"👷 Worker spawned (pid: {worker.pid})")
+
+
+def worker_exit(server, worker):
+    server.log.info(f"👋 Worker exited (pid: {worker.pid})")
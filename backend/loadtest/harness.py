@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Load Test Harness
+Drives realistic traffic scenarios against a local server with asyncio + httpx
+and writes per-endpoint throughput and latency percentiles to test_reports/
+
+Usage:
+    cd backend && python loadtest/harness.py --launch --scenario all
+    cd backend && python loadtest/harness.py --base-url http://127.0.0.1:8001 --seed-db eduresources_loadtest --scenario browse_storm
+    cd backend && python loadtest/harness.py --launch --compare latest --max-regression 20
+
+With --launch, gunicorn is started on a free port against a throwaway
+`*_loadtest` database on the local mongod (MONGO_URL), seeded deterministically
+from --seed, and stopped afterwards. With --base-url the fixtures must live
+in the database that server uses, so --seed-db has to name it (the server's
+DATABASE_NAME, also a `*_loadtest` database).
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORTS_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "test_reports")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scenarios import SCENARIOS  # noqa: E402
+
+
+# ============================================================
+# Measurements
+# ============================================================
+def _percentile(ordered: list, pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 2)
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies_ms = []
+        self.status_codes = {}
+        self.errors = {}
+
+    def record(self, status: int | None, duration_ms: float, error: str | None = None):
+        self.latencies_ms.append(duration_ms)
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+        else:
+            self.status_codes[str(status)] = self.status_codes.get(str(status), 0) + 1
+
+    def summary(self, duration_s: float) -> dict:
+        ordered = sorted(self.latencies_ms)
+        failed = sum(self.errors.values()) + sum(
+            count for status, count in self.status_codes.items() if int(status) >= 500
+        )
+        return {
+            "requests": len(ordered),
+            "failed": failed,
+            "throughput_rps": round(len(ordered) / duration_s, 2) if duration_s else 0.0,
+            "p50_ms": _percentile(ordered, 50),
+            "p95_ms": _percentile(ordered, 95),
+            "p99_ms": _percentile(ordered, 99),
+            "max_ms": round(ordered[-1], 2) if ordered else 0.0,
+            "status_codes": dict(sorted(self.status_codes.items())),
+            "errors": self.errors,
+        }
+
+
+class Context:
+    """
+    Shared state for one scenario run: the HTTP client, seeded fixtures and stats.
+    Scenarios call `ctx.request(name, method, url, ...)`, where `name` is the
+    endpoint template results are grouped under (e.g. "GET /api/papers/{id}").
+    """
+
+    def __init__(self, client: httpx.AsyncClient, fixtures: dict, seed: int):
+        self.client = client
+        self.fixtures = fixtures
+        self.seed = seed
+        self.stats: dict[str, EndpointStats] = {}
+        self._counter = 0
+
+    def next_index(self) -> int:
+        """
+        Monotonic counter shared by all virtual users (unique emails, client IPs...)
+        """
+        self._counter += 1
+        return self._counter
+
+    def client_ip(self, index: int) -> str:
+        return f"10.{(index >> 16) & 255}.{(index >> 8) & 255}.{index & 255}"
+
+    async def request(self, name: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        stats = self.stats.setdefault(name, EndpointStats())
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            stats.record(None, (time.perf_counter() - started) * 1000, type(e).__name__)
+            return None
+        stats.record(response.status_code, (time.perf_counter() - started) * 1000)
+        return response
+
+
+async def run_scenario(scenario, base_url: str, fixtures: dict, seed: int, duration: float, scale: float) -> dict:
+    """
+    Run `scenario.concurrency * scale` closed-loop virtual users for `duration` seconds
+    """
+    concurrency = max(1, int(scenario.concurrency * scale))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        ctx = Context(client, fixtures, seed)
+        deadline = time.perf_counter() + duration
+
+        async def virtual_user(vu: int):
+            rng = random.Random(seed * 100_003 + vu)
+            state = {}
+            while time.perf_counter() < deadline:
+                await scenario.step(ctx, rng, state)
+                if scenario.think_time:
+                    await asyncio.sleep(rng.uniform(0, scenario.think_time))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(virtual_user(vu) for vu in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    total = sum(len(s.latencies_ms) for s in ctx.stats.values())
+    return {
+        "description": scenario.description,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "endpoints": {name: stats.summary(elapsed) for name, stats in sorted(ctx.stats.items())},
+    }
+
+
+# ============================================================
+# Local server and fixtures
+# ============================================================
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def launch_server(port: int, db_name: str, workers: int, workdir: str) -> subprocess.Popen:
+    """
+    Start gunicorn with the production config; uploads, logs and snapshots land in `workdir`
+    """
+    env = dict(
+        os.environ,
+        PYTHONPATH=BACKEND_DIR,
+        PORT=str(port),
+        BIND=f"127.0.0.1:{port}",
+        WEB_CONCURRENCY=str(workers),
+        DATABASE_NAME=db_name,
+        # Virtual users send distinct X-Forwarded-For addresses, like clients behind the proxy
+        RATE_LIMIT_TRUST_FORWARDED="true",
+        LOG_LEVEL="warning",
+    )
+    return subprocess.Popen(
+        ["gunicorn", "server:app", "-c", os.path.join(BACKEND_DIR, "gunicorn.conf.py")],
+        cwd=workdir,
+        env=env,
+    )
+
+
+def wait_until_ready(base_url: str, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(base_url + "/", timeout=2.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} did not become ready in {timeout:.0f}s")
+
+
+def seed_database(db_name: str, seed: int, students: int, papers: int, notes: int, pending: int) -> dict:
+    """
+    Replace `db_name` with a deterministic dataset; returns the fixtures scenarios use
+    """
+    if not db_name.endswith("_loadtest"):
+        raise SystemExit(f"❌ Refusing to seed '{db_name}': load test databases must end with _loadtest")
+
+    from passlib.context import CryptContext
+    from pymongo import MongoClient
+    from config import MONGO_URI
+
+    rng = random.Random(seed)
+    client = MongoClient(MONGO_URI)
+    client.drop_database(db_name)
+    database = client[db_name]
+
+    password = "loadtest-password"
+    # One hash shared by every seeded account keeps seeding fast; logins still pay full bcrypt cost
+    password_hash = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(password)
+    now = datetime.utcnow()
+
+    admin_email = "admin@loadtest.example.com"
+    users = [{
+        "_id": "loadtest-admin", "name": "Load Test Admin", "email": admin_email, "password": password_hash,
+        "is_admin": True, "role": "admin", "verified": True, "created_at": now,
+    }]
+    users += [
+        {
+            "_id": f"student-{i}", "name": f"Student {i}", "email": f"student{i}@loadtest.example.com",
+            "password": password_hash, "usn": f"1LT{i:05d}", "course": "BE",
+            "semester": str(rng.randint(1, 8)), "is_admin": False, "role": "student",
+            "verified": True, "created_at": now,
+        }
+        for i in range(students)
+    ]
+    database.users.insert_many(users)
+
+    subjects = ["Mathematics", "Physics", "Chemistry", "Programming", "Electronics", "Mechanics"]
+    paper_docs = [
+        {
+            "_id": f"paper-{i}", "title": f"{rng.choice(subjects)} Question Paper {i}",
+            "subject": rng.choice(subjects), "semester": str(rng.randint(1, 8)),
+            "year": str(rng.randint(2015, 2025)), "file_url": f"/uploads/papers/paper-{i}.pdf",
+            "uploaded_by": admin_email, "created_at": now,
+        }
+        for i in range(papers)
+    ]
+    note_docs = [
+        {
+            "_id": f"note-{i}", "title": f"Unit {rng.randint(1, 5)} Notes {i}",
+            "description": "Seeded for load testing", "subject": rng.choice(subjects),
+            "semester": str(rng.randint(1, 8)), "file_url": f"/uploads/notes/note-{i}.pdf",
+            "uploaded_by": admin_email, "created_at": now,
+        }
+        for i in range(notes)
+    ]
+    if paper_docs:
+        database.papers.insert_many(paper_docs)
+    if note_docs:
+        database.notes.insert_many(note_docs)
+
+    # Registrations awaiting verification; each token can be redeemed once
+    from routes.auth import hash_token
+    tokens = [f"loadtest-{seed}-{i}" for i in range(pending)]
+    pending_docs = [
+        {
+            "_id": f"new{seed}-{i}@loadtest.example.com", "name": f"New Student {i}",
+            "password_hash": password_hash, "usn": f"1NS{i:05d}", "course": "BE", "semester": "1",
+            "token_hash": hash_token(token), "token_expires_at": now + timedelta(hours=6),
+            "created_at": now, "expires_at": now + timedelta(hours=6),
+        }
+        for i, token in enumerate(tokens)
+    ]
+    if pending_docs:
+        database.pending_registrations.insert_many(pending_docs)
+    client.close()
+
+    return {
+        "admin_email": admin_email,
+        "password": password,
+        "students": [u["email"] for u in users[1:]],
+        "paper_ids": [p["_id"] for p in paper_docs],
+        "note_ids": [n["_id"] for n in note_docs],
+        "verification_tokens": tokens,
+    }
+
+
+# ============================================================
+# Reports
+# ============================================================
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report_paths() -> list:
+    def number(path):
+        return int(re.search(r"loadtest_(\d+)\.json$", path).group(1))
+
+    return sorted(glob.glob(os.path.join(REPORTS_DIR, "loadtest_*.json")), key=number)
+
+
+def write_report(report: dict) -> str:
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    existing = report_paths()
+    number = int(re.search(r"loadtest_(\d+)\.json$", existing[-1]).group(1)) + 1 if existing else 1
+    path = os.path.join(REPORTS_DIR, f"loadtest_{number}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def compare(current: dict, baseline: dict, max_regression: float | None) -> bool:
+    """
+    Print per-endpoint deltas against a baseline report; False if p95 regressed past the limit
+    """
+    ok = True
+    print(f"\n📊 Compared with run {baseline.get('run_id')} ({baseline.get('git_commit')})")
+    for name, scenario in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        print(f"\n  {name}")
+        for endpoint, now in scenario["endpoints"].items():
+            then = before["endpoints"].get(endpoint)
+            if then is None or not then["p95_ms"]:
+                continue
+            delta = (now["p95_ms"] - then["p95_ms"]) / then["p95_ms"] * 100
+            flag = ""
+            if max_regression is not None and delta > max_regression:
+                flag = "  ❌ regression"
+                ok = False
+            print(
+                f"    {endpoint:<40} p95 {then['p95_ms']:>8.1f} → {now['p95_ms']:>8.1f} ms ({delta:+.0f}%)"
+                f"   rps {then['throughput_rps']:>7.1f} → {now['throughput_rps']:>7.1f}{flag}"
+            )
+    return ok
+
+
+# ============================================================
+# Main
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="EduResources load test harness")
+    parser.add_argument("--scenario", default="all", help=f"one of: all, {', '.join(SCENARIOS)}")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per scenario")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for each scenario's virtual users")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--base-url", help="target an already running server instead of launching one")
+    parser.add_argument("--launch", action="store_true", help="launch gunicorn against a seeded local database")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers with --launch")
+    parser.add_argument("--db", default="eduresources_loadtest", help="database to seed and launch against (must end with _loadtest)")
+    parser.add_argument("--seed-db", help="with --base-url: the running server's database, seeded before the run (must end with _loadtest)")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--papers", type=int, default=500)
+    parser.add_argument("--notes", type=int, default=500)
+    parser.add_argument("--pending", type=int, default=5000, help="pending registrations for verify_links")
+    parser.add_argument("--compare", help="baseline report path, or 'latest'")
+    parser.add_argument("--max-regression", type=float, help="fail if any endpoint's p95 grows by more than this %%")
+    args = parser.parse_args()
+
+    if not args.launch and not args.base_url:
+        parser.error("pass --launch or --base-url")
+    if not args.launch and not args.seed_db:
+        parser.error("--base-url needs --seed-db: the database the running server uses, so the seeded fixtures exist there")
+    seed_db = args.db if args.launch else args.seed_db
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    for name in names:
+        if name not in SCENARIOS:
+            parser.error(f"unknown scenario '{name}'")
+
+    baseline = None
+    if args.compare:
+        paths = report_paths() if args.compare == "latest" else [args.compare]
+        if paths:
+            with open(paths[-1]) as f:
+                baseline = json.load(f)
+
+    print("======================================")
+    print("🏋️ EDURESOURCES LOAD TEST")
+    print("======================================")
+    print(f"⏳ Seeding {seed_db} (seed={args.seed})...")
+    fixtures = seed_database(seed_db, args.seed, args.students, args.papers, args.notes, args.pending)
+
+    server = None
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    base_url = args.base_url
+    if args.launch:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = launch_server(port, args.db, args.workers, workdir)
+
+    report = {
+        "run_id": datetime.utcnow().strftime("%Y%m%dT%H%M%SZ"),
+        "git_commit": git_commit(),
+        "summary": "",
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "workers": args.workers if args.launch else None,
+            "base_url": base_url,
+        },
+        "parameters": {
+            "duration_s": args.duration, "scale": args.scale, "seed": args.seed,
+            "students": args.students, "papers": args.papers, "notes": args.notes, "pending": args.pending,
+        },
+        "scenarios": {},
+    }
+
+    try:
+        wait_until_ready(base_url)
+        for name in names:
+            scenario = SCENARIOS[name]
+            print(f"🚀 {name}: {scenario.description}")
+            result = asyncio.run(run_scenario(scenario, base_url, fixtures, args.seed, args.duration, args.scale))
+            report["scenarios"][name] = result
+            for endpoint, stats in result["endpoints"].items():
+                print(
+                    f"   {endpoint:<40} {stats['throughput_rps']:>8.1f} rps"
+                    f"   p50 {stats['p50_ms']:>7.1f}   p95 {stats['p95_ms']:>7.1f}   p99 {stats['p99_ms']:>7.1f} ms"
+                    f"   failed {stats['failed']}"
+                )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=60)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report["summary"] = "; ".join(
+        f"{name}: {result['throughput_rps']} rps over {result['requests']} requests"
+        for name, result in report["scenarios"].items()
+    )
+    path = write_report(report)
+    print(f"\n✅ Report written to {os.path.relpath(path)}")
+
+    if baseline is not None and not compare(report, baseline, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
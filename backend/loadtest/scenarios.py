@@ -0,0 +1,159 @@
+"""
+Load Test Scenarios
+Traffic shapes modelled on real usage; each `step` is one iteration of a virtual user
+"""
+
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from routes.auth import create_access_token
+
+# Papers/notes uploads are 250 KB - 2 MB scanned PDFs in practice
+UPLOAD_SIZES = (256 * 1024, 512 * 1024, 1024 * 1024, 2 * 1024 * 1024)
+
+
+@dataclass
+class Scenario:
+    description: str
+    concurrency: int
+    step: Callable[..., Awaitable[None]]
+    think_time: float = 0.0
+
+
+def admin_headers(ctx) -> dict:
+    token = ctx.fixtures.get("admin_token")
+    if token is None:
+        token = ctx.fixtures["admin_token"] = create_access_token(
+            {"sub": ctx.fixtures["admin_email"], "role": "admin", "is_admin": True}
+        )
+    return {"Authorization": f"Bearer {token}"}
+
+
+# ========================
+# Browse storm
+# ========================
+async def browse_step(ctx, rng, state):
+    """
+    Students opening the papers page: the listing, a couple of papers, sometimes a filter
+    """
+    await ctx.request("GET /api/papers/", "GET", "/api/papers/")
+    for _ in range(rng.randint(1, 3)):
+        paper_id = rng.choice(ctx.fixtures["paper_ids"])
+        await ctx.request("GET /api/papers/{id}", "GET", f"/api/papers/{paper_id}")
+    if rng.random() < 0.3:
+        await ctx.request("GET /api/notes/", "GET", "/api/notes/", params={"fields": "title,subject,semester"})
+    if rng.random() < 0.1:
+        await ctx.request("GET /api/catalog/manifest", "GET", "/api/catalog/manifest")
+
+
+# ========================
+# 9 AM login storm
+# ========================
+async def login_step(ctx, rng, state):
+    """
+    A class logging in at once: every login is a different student from a different address
+    """
+    index = ctx.next_index()
+    students = ctx.fixtures["students"]
+    headers = {"X-Forwarded-For": ctx.client_ip(index)}
+    response = await ctx.request(
+        "POST /api/auth/login", "POST", "/api/auth/login",
+        json={"email": students[index % len(students)], "password": ctx.fixtures["password"]},
+        headers=headers,
+    )
+    if response is not None and response.status_code == 200:
+        headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+        await ctx.request("GET /api/profile", "GET", "/api/profile", headers=headers)
+
+
+# ========================
+# Session renewal
+# ========================
+async def refresh_step(ctx, rng, state):
+    """
+    Signed-in students renewing expired access tokens: one login per virtual user,
+    then refresh-token rotation only (no bcrypt)
+    """
+    if "refresh_token" not in state:
+        index = ctx.next_index()
+        students = ctx.fixtures["students"]
+        response = await ctx.request(
+            "POST /api/auth/login", "POST", "/api/auth/login",
+            json={"email": students[index % len(students)], "password": ctx.fixtures["password"]},
+            headers={"X-Forwarded-For": ctx.client_ip(index)},
+        )
+        if response is None or response.status_code != 200:
+            return
+        state["refresh_token"] = response.json()["refresh_token"]
+    response = await ctx.request(
+        "POST /api/auth/refresh", "POST", "/api/auth/refresh", json={"refresh_token": state["refresh_token"]}
+    )
+    if response is not None and response.status_code == 200:
+        state["refresh_token"] = response.json()["refresh_token"]
+    else:
+        state.pop("refresh_token")
+
+
+# ========================
+# Admin bulk edits
+# ========================
+async def admin_edit_step(ctx, rng, state):
+    """
+    Admins retitling papers and notes in bulk, re-reading the admin listing in between
+    """
+    headers = admin_headers(ctx)
+    paper_id = rng.choice(ctx.fixtures["paper_ids"])
+    await ctx.request(
+        "PUT /api/admin/papers/{id}", "PUT", f"/api/admin/papers/{paper_id}",
+        json={"title": f"Revised Paper {rng.randint(1, 10_000)}"}, headers=headers,
+    )
+    note_id = rng.choice(ctx.fixtures["note_ids"])
+    await ctx.request(
+        "PUT /api/notes/{id}", "PUT", f"/api/notes/{note_id}",
+        json={"description": f"Revision {rng.randint(1, 10_000)}"}, headers=headers,
+    )
+    if rng.random() < 0.2:
+        await ctx.request("GET /api/admin/papers", "GET", "/api/admin/papers", headers=headers)
+
+
+# ========================
+# Concurrent uploads
+# ========================
+async def upload_step(ctx, rng, state):
+    """
+    Admins uploading scanned papers before an exam week
+    """
+    if "payloads" not in state:
+        state["payloads"] = {size: rng.randbytes(size) for size in UPLOAD_SIZES}
+    size = rng.choice(UPLOAD_SIZES)
+    index = ctx.next_index()
+    token = admin_headers(ctx)["Authorization"].split(" ")[1]
+    await ctx.request(
+        "POST /api/papers/upload", "POST", "/api/papers/upload",
+        data={"title": f"Uploaded Paper {index}", "subject": "Mathematics", "semester": "3", "token": token},
+        files={"file": (f"paper-{index}.pdf", state["payloads"][size], "application/pdf")},
+    )
+
+
+# ========================
+# Verification link redemption
+# ========================
+async def verify_step(ctx, rng, state):
+    """
+    New students clicking the link in their verification email. Links are single
+    use, so once the seeded ones run out the rest measure the rejection path.
+    """
+    tokens = ctx.fixtures["verification_tokens"]
+    index = ctx.next_index()
+    token = tokens[index] if index < len(tokens) else f"used-{index}"
+    await ctx.request("GET /api/auth/verify/{token}", "GET", f"/api/auth/verify/{token}")
+
+
+SCENARIOS = {
+    "browse_storm": Scenario("Students browsing /api/papers/ and opening papers", concurrency=100, step=browse_step, think_time=0.5),
+    "login_storm": Scenario("9 AM login storm, one login per student", concurrency=200, step=login_step),
+    "session_refresh": Scenario("Access token renewal via refresh tokens", concurrency=200, step=refresh_step),
+    "admin_bulk_edits": Scenario("Admins editing papers and notes in bulk", concurrency=10, step=admin_edit_step),
+    "uploads": Scenario("Concurrent 256 KB - 2 MB paper uploads", concurrency=20, step=upload_step, think_time=1.0),
+    "verify_links": Scenario("Verification link redemption", concurrency=50, step=verify_step),
+}
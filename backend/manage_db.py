@@ -2,167 +2,356 @@
 """
 Database Management Utility for EduResources
 View and manage users, data, and statistics
+
+Usage:
+    python manage_db.py                                  # interactive menu
+    python manage_db.py users [--limit 50] [--after ID] [--admins] [--email PREFIX] [--all]
+    python manage_db.py stats
+    python manage_db.py recent [--limit 5]
+    python manage_db.py make-admin EMAIL
+    python manage_db.py export users papers --format csv --out exports/ [--fields a,b]
+
+Listings read only the fields they print and page by _id (`--after` the last
+id shown), so every page costs the same however large the collection is.
 """
 
+import argparse
+import itertools
 import os
-from pymongo import MongoClient
-from dotenv import load_dotenv
-from datetime import datetime
+import re
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+from config import MONGO_URI, DATABASE_NAME
+from utils.export import FORMATS, csv_fields, csv_lines, export_projection, jsonl_line
+
+# profile_photo can be a large data URL: only ask the server whether there is one
+USER_LIST_PROJECTION = {
+    "name": 1, "email": 1, "course": 1, "usn": 1, "is_admin": 1, "created_at": 1,
+    "has_photo": {"$gt": [{"$ifNull": ["$profile_photo", ""]}, ""]},
+}
+STAT_COLLECTIONS = [
+    ("📄 Total Papers", "papers"),
+    ("📝 Total Notes", "notes"),
+    ("📚 Total Syllabus", "syllabus"),
+    ("💬 Forum Posts", "forum_posts"),
+    ("💭 Forum Replies", "forum_replies"),
+    ("🔖 Total Bookmarks", "bookmarks"),
+    ("🎯 Learning Goals", "learning_goals"),
+    ("🏆 Achievements Earned", "achievements"),
+    ("📥 Total Downloads", "downloads"),
+    ("📢 Announcements", "cms_content"),
+]
+RECENT_COLLECTIONS = [("📄 Recent Papers", "papers"), ("📝 Recent Notes", "notes"), ("📚 Recent Syllabus", "syllabus")]
+BATCH_SIZE = 1000
+CSV_SAMPLE_SIZE = 1000
 
-load_dotenv()
 
 def get_db():
     """Get database connection"""
-    mongo_url = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-    db_name = os.getenv("DATABASE_NAME", "academic_resources")
-    client = MongoClient(mongo_url)
-    return client[db_name], client
+    client = MongoClient(MONGO_URI)
+    return client[DATABASE_NAME], client
 
-def view_all_users():
-    """Display all registered users"""
-    db, client = get_db()
-    
+
+def parse_id(value: str):
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
+
+# ============================================================
+# Users
+# ============================================================
+def iter_users(db, after: str | None = None, admins_only: bool = False, email_prefix: str | None = None,
+               limit: int | None = None):
+    query = {}
+    if after:
+        query["_id"] = {"$gt": parse_id(after)}
+    if admins_only:
+        query["is_admin"] = True
+    if email_prefix:
+        query["email"] = {"$regex": f"^{re.escape(email_prefix)}"}
+    cursor = db.users.find(query, USER_LIST_PROJECTION, batch_size=BATCH_SIZE).sort("_id", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor
+
+
+def view_users(db, limit: int | None = 50, after: str | None = None, admins_only: bool = False,
+               email_prefix: str | None = None):
+    """Display registered users, one page at a time"""
     print("\n" + "="*70)
-    print("👥 ALL REGISTERED USERS")
+    print("👥 REGISTERED USERS")
     print("="*70)
-    
-    users = db.users.find()
+
     count = 0
-    
-    for user in users:
+    last_id = None
+    for user in iter_users(db, after, admins_only, email_prefix, limit):
         count += 1
+        last_id = user["_id"]
         print(f"\n{count}. {user.get('name')}")
         print(f"   📧 Email: {user.get('email')}")
         print(f"   🎓 Course: {user.get('course', 'N/A')}")
         print(f"   🆔 USN: {user.get('usn', 'N/A')}")
         print(f"   👑 Admin: {'Yes' if user.get('is_admin') else 'No'}")
         print(f"   📅 Joined: {user.get('created_at', 'N/A')}")
-        print(f"   📷 Photo: {'Yes' if user.get('profile_photo') else 'No'}")
-    
+        print(f"   📷 Photo: {'Yes' if user.get('has_photo') else 'No'}")
+
     if count == 0:
         print("\n❌ No users found!")
+    elif limit and count == limit:
+        print(f"\n➡️  Next page: python manage_db.py users --limit {limit} --after {last_id}")
     else:
-        print(f"\n📊 Total Users: {count}")
-    
+        print(f"\n📊 Users shown: {count}")
+
     print("="*70 + "\n")
-    client.close()
+    return last_id
+
+
+# ============================================================
+# Statistics
+# ============================================================
+def collect_statistics(db) -> dict:
+    """Every count in one aggregation: users with a conditional sum, the rest via $unionWith"""
+    pipeline = [
+        {"$group": {
+            "_id": "users",
+            "count": {"$sum": 1},
+            "admins": {"$sum": {"$cond": [{"$eq": ["$is_admin", True]}, 1, 0]}},
+        }},
+    ]
+    for _, name in STAT_COLLECTIONS:
+        pipeline.append({"$unionWith": {"coll": name, "pipeline": [
+            {"$group": {"_id": name, "count": {"$sum": 1}}},
+        ]}})
+    rows = {row["_id"]: row for row in db.users.aggregate(pipeline)}
 
-def view_statistics():
+    users = rows.get("users", {})
+    stats = {
+        "👥 Total Users": users.get("count", 0),
+        "👑 Admin Users": users.get("admins", 0),
+    }
+    for label, name in STAT_COLLECTIONS:
+        stats[label] = rows.get(name, {}).get("count", 0)
+    return stats
+
+
+def view_statistics(db):
     """Display database statistics"""
-    db, client = get_db()
-    
     print("\n" + "="*70)
     print("📊 DATABASE STATISTICS")
     print("="*70)
-    
-    stats = {
-        "👥 Total Users": db.users.count_documents({}),
-        "👑 Admin Users": db.users.count_documents({"is_admin": True}),
-        "📄 Total Papers": db.papers.count_documents({}),
-        "📝 Total Notes": db.notes.count_documents({}),
-        "📚 Total Syllabus": db.syllabus.count_documents({}),
-        "💬 Forum Posts": db.forum_posts.count_documents({}),
-        "💭 Forum Replies": db.forum_replies.count_documents({}),
-        "🔖 Total Bookmarks": db.bookmarks.count_documents({}),
-        "🎯 Learning Goals": db.learning_goals.count_documents({}),
-        "🏆 Achievements Earned": db.achievements.count_documents({}),
-        "📥 Total Downloads": db.downloads.count_documents({}),
-        "📢 Announcements": db.cms_content.count_documents({}),
-    }
-    
-    for label, count in stats.items():
+
+    for label, count in collect_statistics(db).items():
         print(f"{label}: {count}")
-    
+
     print("="*70 + "\n")
-    client.close()
 
-def make_user_admin():
+
+# ============================================================
+# Recent uploads
+# ============================================================
+def collect_recent_uploads(db, limit: int = 5) -> dict:
+    """Newest uploads of each kind in one round trip"""
+    def newest(name):
+        return [
+            {"$sort": {"created_at": -1}},
+            {"$limit": limit},
+            {"$project": {"_id": 0, "kind": {"$literal": name}, "title": 1, "branch": 1, "year": 1}},
+        ]
+
+    (_, first), *rest = RECENT_COLLECTIONS
+    pipeline = newest(first) + [{"$unionWith": {"coll": name, "pipeline": newest(name)}} for _, name in rest]
+    recent = {name: [] for _, name in RECENT_COLLECTIONS}
+    for doc in db[first].aggregate(pipeline):
+        recent[doc["kind"]].append(doc)
+    return recent
+
+
+def view_recent_uploads(db, limit: int = 5):
+    """View recent uploads"""
+    print("\n" + "="*70)
+    print(f"📤 RECENT UPLOADS (Last {limit} of each)")
+    print("="*70)
+
+    recent = collect_recent_uploads(db, limit)
+    for label, name in RECENT_COLLECTIONS:
+        print(f"\n{label}:")
+        for doc in recent[name]:
+            tag = f"{doc.get('branch')} - {doc.get('year')}" if name == "syllabus" else doc.get("branch")
+            print(f"  • {doc.get('title')} [{tag}]")
+
+    print("="*70 + "\n")
+
+
+# ============================================================
+# Admin
+# ============================================================
+def make_user_admin(db, email: str) -> bool:
     """Make a user admin by email"""
-    db, client = get_db()
-    
-    email = input("\n📧 Enter user email to make admin: ").strip()
-    
     if not email:
         print("❌ Email cannot be empty!")
-        client.close()
-        return
-    
-    user = db.users.find_one({"email": email})
-    
+        return False
+
+    user = db.users.find_one({"email": email}, {"name": 1, "is_admin": 1})
+
     if not user:
         print(f"❌ User with email '{email}' not found!")
-        client.close()
-        return
-    
+        return False
+
     if user.get("is_admin"):
         print(f"ℹ️  User '{user['name']}' is already an admin!")
-        client.close()
-        return
-    
+        return True
+
     db.users.update_one(
         {"email": email},
         {"$set": {"is_admin": True}}
     )
-    
+
     print(f"✅ Successfully made '{user['name']}' an admin!")
-    client.close()
+    return True
+
+
+# ============================================================
+# Export
+# ============================================================
+def export_collection(db, name: str, out_dir: str, fmt: str = "jsonl", fields: list | None = None) -> int:
+    """Stream one collection to <out_dir>/<name>.<fmt>; returns the number of documents"""
+    path = os.path.join(out_dir, f"{name}.{fmt}")
+    cursor = db[name].find({}, export_projection(fields), batch_size=BATCH_SIZE).sort("_id", 1)
+    count = 0
+    with open(path + ".tmp", "w", newline="") as f:
+        if fmt == "jsonl":
+            for doc in cursor:
+                f.write(jsonl_line(doc))
+                count += 1
+        else:
+            # Columns come from --fields or from the first documents
+            head = list(itertools.islice(cursor, CSV_SAMPLE_SIZE))
+            columns = fields or csv_fields(head)
+
+            def docs():
+                yield from head
+                yield from cursor
+
+            lines = csv_lines(columns, docs())
+            f.write(next(lines))
+            for line in lines:
+                f.write(line)
+                count += 1
+    os.replace(path + ".tmp", path)
+    return count
 
-def view_recent_uploads():
-    """View recent uploads"""
-    db, client = get_db()
-    
-    print("\n" + "="*70)
-    print("📤 RECENT UPLOADS (Last 10)")
-    print("="*70)
-    
-    print("\n📄 Recent Papers:")
-    for paper in db.papers.find().sort("created_at", -1).limit(5):
-        print(f"  • {paper.get('title')} [{paper.get('branch')}]")
-    
-    print("\n📝 Recent Notes:")
-    for note in db.notes.find().sort("created_at", -1).limit(5):
-        print(f"  • {note.get('title')} [{note.get('branch')}]")
-    
-    print("\n📚 Recent Syllabus:")
-    for syl in db.syllabus.find().sort("created_at", -1).limit(5):
-        print(f"  • {syl.get('title')} [{syl.get('branch')} - {syl.get('year')}]")
-    
-    print("="*70 + "\n")
-    client.close()
 
-def main_menu():
+def export_collections(db, names: list, out_dir: str, fmt: str = "jsonl", fields: list | None = None,
+                       parallel: int = 4):
+    """Export several collections at once, one reader per collection"""
+    os.makedirs(out_dir, exist_ok=True)
+    print(f"📦 Exporting {len(names)} collection(s) as {fmt} to {out_dir}")
+
+    def one(name):
+        started = time.perf_counter()
+        count = export_collection(db, name, out_dir, fmt, fields)
+        return name, count, time.perf_counter() - started
+
+    with ThreadPoolExecutor(parallel) as pool:
+        for name, count, elapsed in pool.map(one, names):
+            print(f"   ✓ {name}: {count:,} documents in {elapsed:.1f}s")
+    print("✅ Export complete")
+
+
+# ============================================================
+# CLI
+# ============================================================
+def main_menu(db):
     """Display main menu"""
     while True:
         print("\n" + "="*70)
         print("🎓 EduResources Database Manager")
         print("="*70)
-        print("\n1. View All Users")
+        print("\n1. View Users")
         print("2. View Statistics")
         print("3. Make User Admin")
         print("4. View Recent Uploads")
         print("5. Exit")
         print("\n" + "="*70)
-        
+
         choice = input("\nEnter your choice (1-5): ").strip()
-        
+
         if choice == "1":
-            view_all_users()
+            after = None
+            while True:
+                after = view_users(db, limit=50, after=after)
+                if after is None or input("Show more? (y/N): ").strip().lower() != "y":
+                    break
         elif choice == "2":
-            view_statistics()
+            view_statistics(db)
         elif choice == "3":
-            make_user_admin()
+            make_user_admin(db, input("\n📧 Enter user email to make admin: ").strip())
         elif choice == "4":
-            view_recent_uploads()
+            view_recent_uploads(db)
         elif choice == "5":
             print("\n👋 Goodbye!\n")
             break
         else:
             print("\n❌ Invalid choice! Please try again.")
 
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="EduResources database manager")
+    sub = parser.add_subparsers(dest="command")
+
+    users = sub.add_parser("users", help="list users, one page at a time")
+    users.add_argument("--limit", type=int, default=50, help="page size")
+    users.add_argument("--after", help="continue after this user _id")
+    users.add_argument("--admins", action="store_true", help="admins only")
+    users.add_argument("--email", help="email prefix")
+    users.add_argument("--all", action="store_true", help="no paging")
+
+    sub.add_parser("stats", help="collection counts")
+
+    recent = sub.add_parser("recent", help="newest uploads")
+    recent.add_argument("--limit", type=int, default=5)
+
+    admin = sub.add_parser("make-admin", help="grant admin rights")
+    admin.add_argument("email")
+
+    export = sub.add_parser("export", help="export collections to JSONL or CSV")
+    export.add_argument("collections", nargs="+")
+    export.add_argument("--format", choices=FORMATS, default="jsonl")
+    export.add_argument("--out", default="exports")
+    export.add_argument("--fields", help="comma-separated fields (default: all but secrets)")
+    export.add_argument("--parallel", type=int, default=4, help="collections read at once")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    db, client = get_db()
+    try:
+        if args.command is None:
+            main_menu(db)
+        elif args.command == "users":
+            view_users(db, None if args.all else args.limit, args.after, args.admins, args.email)
+        elif args.command == "stats":
+            view_statistics(db)
+        elif args.command == "recent":
+            view_recent_uploads(db, args.limit)
+        elif args.command == "make-admin":
+            if not make_user_admin(db, args.email):
+                sys.exit(1)
+        elif args.command == "export":
+            fields = [f.strip() for f in args.fields.split(",") if f.strip()] if args.fields else None
+            export_collections(db, args.collections, args.out, args.format, fields, args.parallel)
+    finally:
+        client.close()
+
+
 if __name__ == "__main__":
     try:
-        main_menu()
+        main()
     except KeyboardInterrupt:
         print("\n\n👋 Goodbye!\n")
         sys.exit(0)
@@ -0,0 +1,173 @@
+"""
+Compression Middleware
+Negotiated gzip/brotli response compression with a cache of precompressed hot payloads
+"""
+
+import asyncio
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from fastapi import Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional - gzip only without it
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+# Set by routes whose body is the same for every caller; stripped before sending
+SHARED_PAYLOAD_HEADER = "x-shared-payload"
+
+
+def mark_shared(response: Response):
+    """
+    Opt a response into the precompressed payload cache. Only for bodies that
+    are identical across users and requests, e.g. unfiltered catalog listings.
+    """
+    response.headers[SHARED_PAYLOAD_HEADER] = "1"
+
+
+class CompressedPayloadCache:
+    """
+    LRU of compressed bodies keyed by (encoding, digest of the uncompressed body).
+    The digest is the content version: identical listings served to thousands of
+    users are compressed once, and any content change is a new key.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def put(self, key, payload: bytes):
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = payload
+            self.size += len(payload)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+
+class CompressionMiddleware(BaseHTTPMiddleware):
+    """
+    Compresses text/JSON responses of at least `minimum_size` bytes:
+    - brotli when the client accepts it and the module is installed, else gzip
+    - bodies of `offload_size` bytes or more are compressed in the default executor
+    - Responses marked with `mark_shared()` are cached by content digest and
+      compressed at a higher level, since the cost is paid once; everything
+      else is compressed once at the configured level and not cached
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        offload_size: int = 64 * 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+        cache: CompressedPayloadCache | None = None,
+    ):
+        super().__init__(app)
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache = cache if cache is not None else CompressedPayloadCache(32 * 1024 * 1024)
+
+    async def dispatch(self, request: Request, call_next):
+        encoding = self._negotiate(request.headers.get("accept-encoding", ""))
+        response = await call_next(request)
+        shared = response.headers.get(SHARED_PAYLOAD_HEADER) == "1"
+        if shared:
+            del response.headers[SHARED_PAYLOAD_HEADER]
+
+        if encoding is None or not self._should_compress(response):
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+
+        cacheable = shared and request.method == "GET" and response.status_code == 200
+        if cacheable:
+            key = (encoding, hashlib.sha1(body).digest())
+            compressed = self.cache.get(key)
+            if compressed is None:
+                compressed = await self._compress(body, encoding, high=True)
+                self.cache.put(key, compressed)
+        else:
+            compressed = await self._compress(body, encoding, high=False)
+
+        return self._rebuild(response, compressed, encoding)
+
+    def _negotiate(self, accept_encoding: str) -> str | None:
+        accepted = set()
+        for part in accept_encoding.lower().split(","):
+            name, _, params = part.strip().partition(";")
+            if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            accepted.add(name.strip())
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted or "*" in accepted:
+            return "gzip"
+        return None
+
+    def _should_compress(self, response) -> bool:
+        if "content-encoding" in response.headers or response.status_code < 200 or response.status_code in (204, 304):
+            return False
+        content_type = response.headers.get("content-type", "")
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        # Streams without a known length (file downloads, exports) are left alone
+        length = response.headers.get("content-length")
+        return length is not None and int(length) >= self.minimum_size
+
+    async def _compress(self, body: bytes, encoding: str, high: bool) -> bytes:
+        if len(body) >= self.offload_size:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._compress_sync, body, encoding, high)
+        return self._compress_sync(body, encoding, high)
+
+    def _compress_sync(self, body: bytes, encoding: str, high: bool) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=9 if high else self.brotli_quality)
+        return gzip.compress(body, compresslevel=9 if high else self.gzip_level, mtime=0)
+
+    def _rebuild(self, response, body: bytes, encoding: str) -> Response:
+        # Work on raw headers so repeated ones (e.g. several Set-Cookie) survive
+        raw = [(k, v) for k, v in response.headers.raw if k not in (b"content-length", b"vary")]
+        vary = response.headers.get("vary")
+        raw += [
+            (b"content-length", str(len(body)).encode()),
+            (b"content-encoding", encoding.encode()),
+            (b"vary", (f"{vary}, Accept-Encoding" if vary else "Accept-Encoding").encode()),
+        ]
+        compressed = Response(content=body, status_code=response.status_code)
+        compressed.raw_headers = raw
+        return compressed
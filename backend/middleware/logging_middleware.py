@@ -11,6 +11,8 @@ import json
 from datetime import datetime
 import traceback
 
+from app_logging.sampling import RequestLogSampler
+
 
 class RequestLoggingMiddleware(BaseHTTPMiddleware):
     """
@@ -19,13 +21,17 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
     - Response details (status, time)
     - Security events
     - Errors and exceptions
+    
+    Successful requests are sampled by a RequestLogSampler; dropped lines are
+    replaced by periodic per-route summary records on the same logger.
     """
     
-    def __init__(self, app):
+    def __init__(self, app, sampler: RequestLogSampler | None = None):
         super().__init__(app)
         self.logger = logging.getLogger("app.requests")
         self.security_logger = logging.getLogger("app.security")
         self.error_logger = logging.getLogger("app.errors")
+        self.sampler = sampler or RequestLogSampler(logger=self.logger)
     
     async def dispatch(self, request: Request, call_next):
         # Start timer
@@ -34,12 +40,6 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
         # Extract request info
         request_info = self._extract_request_info(request)
         
-        # Log incoming request
-        self.logger.info(
-            f"Request: {request.method} {request.url.path}",
-            extra=request_info
-        )
-        
         try:
             # Process request
             response = await call_next(request)
@@ -54,16 +54,30 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                 "duration_ms": round(duration * 1000, 2),
             }
             
-            # Log response
-            log_level = self._get_log_level(response.status_code)
-            self.logger.log(
-                log_level,
-                f"Response: {request.method} {request.url.path} - {response.status_code} ({duration:.2f}s)",
-                extra=response_info
-            )
-            
             # Log security events
-            self._log_security_events(request, response, response_info)
+            security_event = self._log_security_events(request, response.status_code, response_info)
+            
+            # Errors and security events are always logged, successes are sampled
+            keep = self.sampler.should_log(response.status_code, security_event)
+            if keep:
+                self.logger.info(
+                    f"Request: {request.method} {request.url.path}",
+                    extra=request_info
+                )
+                log_level = self._get_log_level(response.status_code)
+                self.logger.log(
+                    log_level,
+                    f"Response: {request.method} {request.url.path} - {response.status_code} ({duration:.2f}s)",
+                    extra=response_info
+                )
+            
+            self.sampler.record(
+                self._route_key(request),
+                response.status_code,
+                response_info["duration_ms"],
+                int(response.headers.get("content-length", 0) or 0),
+                keep,
+            )
             
             return response
             
@@ -79,14 +93,33 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                 "traceback": traceback.format_exc()
             }
             
+            # Failed requests are never sampled away: the request line is
+            # written here since no response line will follow it
+            self.logger.info(
+                f"Request: {request.method} {request.url.path}",
+                extra=request_info
+            )
             self.error_logger.error(
                 f"Error: {request.method} {request.url.path} - {type(e).__name__}: {str(e)}",
                 extra=error_info
             )
             
+            # The client sees a 500 once FastAPI handles the exception
+            self._log_security_events(request, 500, {**error_info, "status_code": 500})
+            self.sampler.record(self._route_key(request), 500, error_info["duration_ms"], 0, True)
+            
             # Re-raise the exception to be handled by FastAPI
             raise
     
+    def _route_key(self, request: Request) -> str:
+        """
+        Group requests by route template so IDs in paths don't explode summaries;
+        requests no route matched (404 scans, crawlers) share one key
+        """
+        route = request.scope.get("route")
+        path = getattr(route, "path", None) or "<unmatched>"
+        return f"{request.method} {path}"
+    
     def _extract_request_info(self, request: Request) -> dict:
         """
         Extract relevant information from request
@@ -112,12 +145,13 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
         else:
             return logging.ERROR
     
-    def _log_security_events(self, request: Request, response, response_info: dict):
+    def _log_security_events(self, request: Request, status: int, response_info: dict):
         """
         Log security-relevant events
+        
+        Returns True if the request was a security event
         """
         path = request.url.path
-        status = response.status_code
         
         # Log authentication events
         if "/auth/login" in path:
@@ -126,11 +160,13 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                     f"Successful login from {response_info['client_ip']}",
                     extra=response_info
                 )
+                return True
             elif status == 401:
                 self.security_logger.warning(
                     f"Failed login attempt from {response_info['client_ip']}",
                     extra=response_info
                 )
+                return True
         
         # Log registration events
         elif "/auth/register" in path:
@@ -139,6 +175,7 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                     f"New user registration from {response_info['client_ip']}",
                     extra=response_info
                 )
+                return True
         
         # Log password reset events
         elif "/auth/forgot-password" in path or "/auth/reset-password" in path:
@@ -146,6 +183,7 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                 f"Password reset request from {response_info['client_ip']}",
                 extra=response_info
             )
+            return True
         
         # Log file upload events
         elif request.method == "POST" and ("/papers" in path or "/notes" in path or "/syllabus" in path):
@@ -154,6 +192,7 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                     f"File uploaded from {response_info['client_ip']}",
                     extra=response_info
                 )
+                return True
         
         # Log admin actions (deletes, updates)
         elif request.method in ["DELETE", "PUT", "PATCH"] and status == 200:
@@ -161,6 +200,7 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                 f"Resource modification: {request.method} {path} from {response_info['client_ip']}",
                 extra=response_info
             )
+            return True
         
         # Log rate limit violations
         elif status == 429:
@@ -168,6 +208,7 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                 f"Rate limit exceeded from {response_info['client_ip']} on {path}",
                 extra=response_info
             )
+            return True
         
         # Log unauthorized access attempts
         elif status == 401:
@@ -175,6 +216,7 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                 f"Unauthorized access attempt: {request.method} {path} from {response_info['client_ip']}",
                 extra=response_info
             )
+            return True
         
         # Log forbidden access attempts
         elif status == 403:
@@ -182,3 +224,6 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                 f"Forbidden access attempt: {request.method} {path} from {response_info['client_ip']}",
                 extra=response_info
             )
+            return True
+        
+        return False
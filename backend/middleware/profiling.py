@@ -0,0 +1,70 @@
+"""
+Profiling Middleware
+Profiles requests selected by the RequestProfiler and tags responses with X-Profile-Id
+"""
+
+import asyncio
+import time
+
+from utils.profiling import PROFILE_TOKEN_HEADER, RequestProfiler
+
+_TOKEN_HEADER = PROFILE_TOKEN_HEADER.lower().encode()
+
+
+class ProfilingMiddleware:
+    """
+    Plain ASGI middleware rather than BaseHTTPMiddleware: requests that are not
+    profiled pass straight through after one header scan and one sampling check,
+    without the extra task and body streaming BaseHTTPMiddleware adds.
+    """
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.enabled:
+            return await self.app(scope, receive, send)
+
+        token = None
+        for name, value in scope["headers"]:
+            if name == _TOKEN_HEADER:
+                token = value.decode("latin-1")
+                break
+
+        requested_by = self.profiler.token_subject(token) if token is not None else None
+        if requested_by is not None:
+            trigger = "header"
+        elif self.profiler.sample():
+            trigger = "sampled"
+        else:
+            return await self.app(scope, receive, send)
+
+        profile_id = self.profiler.new_id()
+        status = {"code": None}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        profiler = self.profiler.start_profiler()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            profiler.stop()
+            route = scope.get("route")
+            meta = {
+                "_id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None) or scope["path"],
+                "status": status["code"],
+                "duration_ms": round(duration_ms, 2),
+                "trigger": trigger,
+                "requested_by": requested_by,
+            }
+            asyncio.get_running_loop().run_in_executor(None, self.profiler.save, profiler, meta)
@@ -0,0 +1,24 @@
+"""
+Request Context Middleware
+Exposes the current request's scope through utils.request_context
+"""
+
+from utils.request_context import current_scope
+
+
+class RequestContextMiddleware:
+    """
+    Plain ASGI middleware: one context variable set and reset per request
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_scope.reset(token)
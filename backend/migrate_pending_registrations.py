@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Pending Registration Migration
+Purges the placeholder rows the old registration flow left in `users`
+(verified: false, no password) now that pending registrations live in
+their own TTL-indexed collection. Runs in batches so a large backlog does
+not hold locks or flood the oplog in one go. Safe to re-run.
+
+Usage:
+    python migrate_pending_registrations.py --dry-run
+    python migrate_pending_registrations.py --batch-size 1000 --pause 0.2
+"""
+
+import argparse
+import sys
+import time
+
+from database import db
+from routes.auth import pending_registrations
+
+# Old-flow placeholders: never verified and never given a password, so nobody can log in with them
+STALE_PENDING = {"verified": False, "password": {"$exists": False}}
+
+
+def purge_stale_pending(batch_size: int, pause: float, dry_run: bool) -> int:
+    total = db.users.count_documents(STALE_PENDING)
+    print(f"🔍 {total} stale pending rows in users")
+    if dry_run or total == 0:
+        return 0
+
+    removed = 0
+    while True:
+        ids = [doc["_id"] for doc in db.users.find(STALE_PENDING, {"_id": 1}).limit(batch_size)]
+        if not ids:
+            break
+        # Re-check the filter so a row completed since the read is left alone
+        removed += db.users.delete_many({"_id": {"$in": ids}, **STALE_PENDING}).deleted_count
+        print(f"   🗑️  {removed}/{total} removed")
+        time.sleep(pause)
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move registration bookkeeping out of the users collection")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.1, help="seconds to wait between batches")
+    parser.add_argument("--dry-run", action="store_true", help="only count what would be removed")
+    args = parser.parse_args()
+
+    print("🔄 Pending registration migration")
+    print("=" * 50)
+    try:
+        # Creates the TTL and token indexes on the new collection
+        pending_registrations()
+        print("✅ pending_registrations indexes in place")
+        removed = purge_stale_pending(args.batch_size, args.pause, args.dry_run)
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        sys.exit(1)
+
+    if args.dry_run:
+        print("ℹ️  Dry run - nothing removed")
+    else:
+        print(f"✅ Done - {removed} stale rows removed")
+
+
+if __name__ == "__main__":
+    main()
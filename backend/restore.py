@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Database Restore
+Loads a restore point written by backup.py, several collections at a time.
+
+Usage:
+    python restore.py                    # restore the latest restore point (replaces every backed-up collection)
+    python restore.py ID                 # a specific restore point (see `python backup.py list`)
+    python restore.py --missing-only     # only collections that are missing or empty (used at startup)
+    python restore.py --check            # rebuild and verify everything without writing
+    python restore.py --db scratch_db    # restore into another database (restore drills)
+
+Until backup.py has written its first restore point, the newest legacy
+mongodump in the backup directory (backup_YYYYMMDD_HHMMSS/<database>/) is
+loaded with mongorestore instead, honouring --missing-only and --check.
+The next `backup.py run` then finds no manifest and takes a full base, and
+from then on restore points are used; old dumps can be deleted once one
+exists.
+
+Each collection is loaded into a staging collection with unordered
+insert_many batches, its indexes are built once the data is in, and the
+document count and checksum are compared with the manifest. Only then is
+the staging collection renamed over the live one, so a failed or partial
+restore never replaces good data.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from bson.raw_bson import RawBSONDocument
+from pymongo import IndexModel, MongoClient
+
+from config import (
+    MONGO_URI,
+    DATABASE_NAME,
+    BACKUP_DIR,
+    RESTORE_PARALLEL,
+    RESTORE_TARGET_SECONDS,
+)
+from utils.backup_store import BackupIntegrityError, BackupStore, collection_checksum
+
+STAGING_SUFFIX = "__restoring"
+BATCH_SIZE = 1000
+PROGRESS_INTERVAL_SECONDS = 5
+
+
+class Progress:
+    """
+    Documents loaded across all collections, reported every few seconds
+    """
+
+    def __init__(self, total: int, interval: float = PROGRESS_INTERVAL_SECONDS):
+        self.total = total
+        self.done = 0
+        self.interval = interval
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._report, daemon=True)
+
+    def add(self, n: int):
+        with self._lock:
+            self.done += n
+
+    def _report(self):
+        while not self._stop.wait(self.interval):
+            elapsed = time.perf_counter() - self.started
+            rate = self.done / elapsed if elapsed else 0
+            eta = f", ETA {(self.total - self.done) / rate:.0f}s" if rate else ""
+            pct = 100 * self.done / self.total if self.total else 100
+            print(f"⏳ {self.done:,} / {self.total:,} documents ({pct:.1f}%) - {rate:,.0f}/s{eta}", flush=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def index_model(spec: dict) -> IndexModel:
+    """
+    IndexModel from an index_information() entry saved in the manifest
+    """
+    options = {k: v for k, v in spec.items() if k not in ("key", "v", "ns", "textIndexVersion")}
+    keys = [tuple(k) for k in spec["key"]]
+    if keys[0][0] == "_fts":
+        keys = [(field, "text") for field in spec["weights"]]
+    return IndexModel(keys, **options)
+
+
+def restore_collection(store: BackupStore, chain: list, database, name: str, progress: Progress,
+                       batch_size: int = BATCH_SIZE, check: bool = False) -> dict:
+    entry = chain[-1]["collections"][name]
+    started = time.perf_counter()
+    staging = None if check else database[name + STAGING_SUFFIX]
+    if staging is not None:
+        staging.drop()
+
+    hashes, batch = [], []
+    try:
+        for raw, h in store.documents(chain, name):
+            hashes.append(h)
+            if staging is None:
+                progress.add(1)
+                continue
+            batch.append(RawBSONDocument(raw))
+            if len(batch) >= batch_size:
+                staging.insert_many(batch, ordered=False, bypass_document_validation=True)
+                progress.add(len(batch))
+                batch = []
+        if batch:
+            staging.insert_many(batch, ordered=False, bypass_document_validation=True)
+            progress.add(len(batch))
+
+        loaded = time.perf_counter()
+        if staging is not None and entry["indexes"]:
+            staging.create_indexes([index_model(spec) for spec in entry["indexes"]])
+
+        count = len(hashes) if staging is None else staging.count_documents({})
+        if count != entry["count"] or len(hashes) != entry["count"]:
+            raise BackupIntegrityError(f"{name}: restored {count} documents, manifest has {entry['count']}")
+        if collection_checksum(hashes) != entry["checksum"]:
+            raise BackupIntegrityError(f"{name}: checksum does not match the manifest")
+
+        if staging is not None:
+            staging.rename(name, dropTarget=True)
+    except Exception:
+        if staging is not None:
+            staging.drop()
+        raise
+
+    finished = time.perf_counter()
+    return {
+        "documents": count,
+        "load_seconds": round(loaded - started, 3),
+        "index_seconds": round(finished - loaded, 3),
+    }
+
+
+def missing_collections(names: list, database) -> list:
+    existing = set(database.list_collection_names())
+    return [n for n in names if n not in existing or database[n].estimated_document_count() == 0]
+
+
+def collections_to_restore(manifest: dict, database, missing_only: bool) -> list:
+    names = list(manifest["collections"])
+    if missing_only:
+        names = missing_collections(names, database)
+    # Largest first, so the long ones are not left running alone at the end
+    return sorted(names, key=lambda n: manifest["collections"][n]["count"], reverse=True)
+
+
+def latest_legacy_dump(directory: str, db_name: str) -> str | None:
+    """
+    Database directory of the newest mongodump written before restore points
+    existed (backup_<timestamp>/<database>/), or None
+    """
+    if not os.path.isdir(directory):
+        return None
+    # backup_YYYYMMDD_HHMMSS sorts by age
+    for dump in sorted((d for d in os.listdir(directory) if d.startswith("backup_")), reverse=True):
+        root = os.path.join(directory, dump)
+        if not os.path.isdir(root):
+            continue
+        # Dumps are named after the source database, which may differ from --db
+        candidates = [db_name] + sorted(os.listdir(root))
+        for name in candidates:
+            path = os.path.join(root, name)
+            if os.path.isdir(path) and any(f.endswith(".bson") for f in os.listdir(path)):
+                return path
+    return None
+
+
+def restore_legacy_dump(path: str, database, missing_only: bool, check: bool) -> bool:
+    """
+    Load a legacy mongodump with mongorestore, one collection at a time
+    """
+    names = sorted(f[:-len(".bson")] for f in os.listdir(path) if f.endswith(".bson"))
+    if missing_only:
+        names = missing_collections(names, database)
+    if not names:
+        print(f"✅ Nothing to restore - every collection in {database.name} has data")
+        return True
+
+    mongorestore = shutil.which("mongorestore")
+    if mongorestore is None:
+        print("❌ mongorestore is not installed - cannot load the legacy dump")
+        return False
+
+    print(f"📦 No restore points yet - {'checking' if check else 'restoring'} {len(names)} collections "
+          f"from legacy dump {path} with mongorestore")
+    ok = True
+    for name in names:
+        command = [mongorestore, "--uri", MONGO_URI, "--db", database.name, "--collection", name,
+                   "--drop", "--quiet", os.path.join(path, name + ".bson")]
+        if check:
+            command.append("--dryRun")
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode == 0:
+            print(f"   ✓ {name}", flush=True)
+        else:
+            ok = False
+            print(f"❌ {name}: {result.stderr.strip()}", flush=True)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Restore the database from backup.py restore points")
+    parser.add_argument("id", nargs="?", help="restore point (default: latest)")
+    parser.add_argument("--missing-only", action="store_true", help="only restore missing or empty collections")
+    parser.add_argument("--check", action="store_true", help="rebuild and verify without writing")
+    parser.add_argument("--db", default=DATABASE_NAME, help="database to restore into")
+    parser.add_argument("--dir", default=BACKUP_DIR, help="backup store directory")
+    parser.add_argument("--parallel", type=int, default=RESTORE_PARALLEL, help="collections loaded at once")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--target-seconds", type=float, default=RESTORE_TARGET_SECONDS,
+                        help="warn when the restore takes longer than this")
+    args = parser.parse_args()
+
+    store = BackupStore(args.dir)
+    manifests = store.manifests()
+    if not manifests and not args.id:
+        legacy = latest_legacy_dump(args.dir, args.db)
+        if legacy is not None:
+            client = MongoClient(MONGO_URI)
+            ok = restore_legacy_dump(legacy, client[args.db], args.missing_only, args.check)
+            client.close()
+            sys.exit(0 if ok else 1)
+    if not manifests:
+        print(f"⚠️  No restore points in {args.dir}")
+        # Nothing to fall back on is not an error for a fresh install's startup check
+        sys.exit(0 if args.missing_only else 1)
+    manifest_id = args.id or manifests[-1]["id"]
+    try:
+        chain = store.chain(manifest_id)
+    except FileNotFoundError:
+        print(f"❌ Restore point {manifest_id} not found (or part of its chain was pruned)")
+        sys.exit(1)
+    manifest = chain[-1]
+
+    client = MongoClient(MONGO_URI)
+    database = client[args.db]
+    names = collections_to_restore(manifest, database, args.missing_only)
+    if not names:
+        print(f"✅ Nothing to restore - every backed-up collection in {args.db} has data")
+        return
+
+    total = sum(manifest["collections"][n]["count"] for n in names)
+    action, done = ("Checking", "Checked") if args.check else ("Restoring", "Restored")
+    print(f"📦 {action} {len(names)} collections ({total:,} documents) from {manifest_id} "
+          f"into {args.db}, {args.parallel} at a time")
+
+    results, failures = {}, {}
+    started = time.perf_counter()
+    with Progress(total) as progress, ThreadPoolExecutor(args.parallel) as pool:
+        futures = {
+            pool.submit(restore_collection, store, chain, database, name, progress, args.batch_size, args.check): name
+            for name in names
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                failures[name] = str(e)
+                print(f"❌ {name}: {e}", flush=True)
+            else:
+                r = results[name]
+                print(f"   ✓ {name}: {r['documents']:,} documents "
+                      f"(load {r['load_seconds']:.1f}s, indexes {r['index_seconds']:.1f}s)", flush=True)
+    elapsed = time.perf_counter() - started
+    client.close()
+
+    if not args.check:
+        report = {
+            "restore_point": manifest_id,
+            "database": args.db,
+            "finished_at": datetime.utcnow().isoformat(),
+            "seconds": round(elapsed, 3),
+            "target_seconds": args.target_seconds,
+            "documents": sum(r["documents"] for r in results.values()),
+            "collections": results,
+            "failures": failures,
+        }
+        with open(os.path.join(args.dir, "last_restore.json"), "w") as f:
+            json.dump(report, f, indent=2)
+
+    rate = total / elapsed if elapsed else 0
+    if failures:
+        print(f"❌ {len(failures)} of {len(names)} collections failed verification and were left untouched")
+        sys.exit(1)
+    print(f"✅ {done} {len(results)} collections, {total:,} documents in {elapsed:.1f}s ({rate:,.0f}/s)")
+    if elapsed > args.target_seconds:
+        print(f"⚠️  Slower than the {args.target_seconds:.0f}s restore target")
+    else:
+        print(f"🎯 Within the {args.target_seconds:.0f}s restore target")
+
+
+if __name__ == "__main__":
+    main()
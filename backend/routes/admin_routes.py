@@ -1,12 +1,65 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Body, Request, Response, Query
 from jose import jwt, JWTError
-from config import JWT_SECRET_KEY, JWT_ALGORITHM, db
-from datetime import datetime
+from config import JWT_SECRET_KEY, JWT_ALGORITHM
+from database import db, read_db, read_session, write_session
+from utils import metrics
+from utils.projections import build_projection
+from utils.db_monitoring import pool_monitor, redact_plan, slow_query_monitor, SLOW_QUERY_COLLECTION, SLOW_QUERY_PLANS_COLLECTION
+from utils.profiling import PROFILE_TOKEN_HEADER, request_profiler
+from utils.jobs import job_queue
+from config import PROFILING_MAX_SAMPLE_FRACTION, PROFILING_MAX_WINDOW_MINUTES
+from utils.export import SECRET_FIELDS, encode_stream
+from utils.file_serving import discard_resource_file
+from routes.catalog_routes import CATALOG_WRITE
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from datetime import datetime, timedelta
+import os
 import uuid
 from typing import Optional
 
 router = APIRouter()
 
+# Only what authorization and audit fields need - never the password hash
+CURRENT_USER_PROJECTION = {"email": 1, "name": 1, "is_admin": 1, "role": 1}
+
+NOTE_FIELDS = {"title", "content", "tags", "created_by", "download_count", "created_at", "updated_at"}
+SYLLABUS_FIELDS = {"course", "semester", "topics", "created_by", "download_count", "created_at", "updated_at"}
+PAPER_FIELDS = {"title", "description", "file_url", "created_by", "download_count", "created_at", "updated_at"}
+
+# List views show titles, not full note bodies
+NOTE_LIST_PROJECTION = {"content": 0}
+
+# Exportable collections: the timestamp `since` applies to, the query
+# parameters accepted as equality filters, and the CSV columns
+EXPORTS = {
+    "users": {
+        "since": "created_at",
+        "filters": ("role", "course", "semester", "verified", "is_admin"),
+        "columns": ["_id", "name", "email", "usn", "course", "semester", "role", "is_admin", "verified", "created_at", "verified_at"],
+    },
+    "notes": {
+        "since": "created_at",
+        "filters": ("subject", "semester", "branch", "created_by"),
+        "columns": ["_id", "title", "description", "subject", "semester", "branch", "tags", "file_url", "created_by", "download_count", "created_at", "updated_at"],
+    },
+    "papers": {
+        "since": "created_at",
+        "filters": ("subject", "semester", "year", "branch", "created_by"),
+        "columns": ["_id", "title", "description", "subject", "semester", "year", "branch", "tags", "file_url", "created_by", "download_count", "created_at", "updated_at"],
+    },
+    "syllabus": {
+        "since": "created_at",
+        "filters": ("branch", "semester", "year", "course"),
+        "columns": ["_id", "title", "description", "branch", "course", "semester", "year", "topics", "file_url", "created_by", "download_count", "created_at", "updated_at"],
+    },
+    "downloads": {
+        "since": "ts",
+        "filters": ("resource_type", "resource_id", "subject", "semester", "action", "user"),
+        "columns": ["_id", "resource_type", "resource_id", "subject", "semester", "action", "user", "ts"],
+    },
+}
+EXPORT_BATCH_SIZE = 2000
+
 
 def get_current_user(request: Request):
     token = None
@@ -29,7 +82,7 @@ def get_current_user(request: Request):
         if not email:
             raise HTTPException(status_code=401, detail="Invalid token payload")
 
-        user = db.users.find_one({"email": email})
+        user = db.users.find_one({"email": email}, CURRENT_USER_PROJECTION)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         return user
@@ -47,9 +100,9 @@ async def admin_dashboard(current_user=Depends(get_current_user)):
     if not is_admin_user(current_user):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admins only")
 
-    total_users = db.users.count_documents({})
-    total_admins = db.users.count_documents({"$or": [{"is_admin": True}, {"role": "admin"}]})
-    total_students = db.users.count_documents({"role": "student"})
+    total_users = read_db.users.count_documents({})
+    total_admins = read_db.users.count_documents({"$or": [{"is_admin": True}, {"role": "admin"}]})
+    total_students = read_db.users.count_documents({"role": "student"})
     return {
         "message": f"Welcome Admin {current_user.get('name')}",
         "stats": {
@@ -59,9 +112,229 @@ async def admin_dashboard(current_user=Depends(get_current_user)):
         }
     }
 
+
+# ---------------- Monitoring ----------------
+@router.get("/db/pool")
+async def db_pool_stats(current_user=Depends(get_current_user)):
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admins only")
+    return {"pid": os.getpid(), **pool_monitor.snapshot()}
+
+
+@router.get("/db/slow-queries")
+async def slow_query_offenders(limit: int = Query(20, le=100), hours: int = Query(24, le=24 * 30), current_user=Depends(get_current_user)):
+    """Query shapes with the most total time over the threshold, with their captured plans"""
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admins only")
+    pipeline = [
+        {"$match": {"ts": {"$gte": datetime.utcnow() - timedelta(hours=hours)}}},
+        {"$group": {
+            "_id": "$shape_hash",
+            "total_ms": {"$sum": "$duration_ms"},
+            "count": {"$sum": 1},
+            "avg_ms": {"$avg": "$duration_ms"},
+            "max_ms": {"$max": "$duration_ms"},
+            "avg_returned": {"$avg": "$returned"},
+            "command": {"$first": "$command"},
+            "collection": {"$first": "$collection"},
+            "shape": {"$first": "$shape"},
+            "routes": {"$addToSet": "$route"},
+            "last_seen": {"$max": "$ts"},
+        }},
+        {"$sort": {"total_ms": -1}},
+        {"$limit": limit},
+    ]
+    offenders = list(db[SLOW_QUERY_COLLECTION].aggregate(pipeline))
+    plans = {
+        plan.pop("_id"): plan
+        for plan in db[SLOW_QUERY_PLANS_COLLECTION].find({"_id": {"$in": [o["_id"] for o in offenders]}}, {"winning_plan": 0})
+    }
+    for offender in offenders:
+        offender["shape_hash"] = offender.pop("_id")
+        offender["plan"] = plans.get(offender["shape_hash"])
+        for key in ("total_ms", "avg_ms", "max_ms"):
+            offender[key] = round(offender[key], 2)
+    return {"threshold_ms": slow_query_monitor.threshold_ms, "offenders": offenders}
+
+
+@router.get("/db/slow-queries/{shape_hash}")
+async def slow_query_detail(shape_hash: str, limit: int = Query(50, le=500), current_user=Depends(get_current_user)):
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admins only")
+    records = list(db[SLOW_QUERY_COLLECTION].find({"shape_hash": shape_hash}, {"_id": 0}).sort("$natural", -1).limit(limit))
+    plan = db[SLOW_QUERY_PLANS_COLLECTION].find_one({"_id": shape_hash}, {"_id": 0})
+    if not records and plan is None:
+        raise HTTPException(status_code=404, detail="Query shape not found")
+    if plan and plan.get("winning_plan"):
+        # Plans captured before redaction was added still hold literal values
+        plan["winning_plan"] = redact_plan(plan["winning_plan"])
+    return {"shape_hash": shape_hash, "plan": plan, "records": records}
+
+
+@router.get("/metrics")
+async def admin_metrics(current_user=Depends(get_current_user)):
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admins only")
+    return metrics.snapshot()
+
+
+# ---------------- Profiling ----------------
+def require_profiler():
+    if not request_profiler.enabled:
+        raise HTTPException(status_code=503, detail="Profiling is disabled or pyinstrument is not installed")
+
+
+@router.post("/profiling/token")
+async def create_profile_token(minutes: int = Body(10, embed=True), current_user=Depends(get_current_user)):
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admins only")
+    require_profiler()
+    minutes = max(1, min(minutes, PROFILING_MAX_WINDOW_MINUTES))
+    return {
+        "header": PROFILE_TOKEN_HEADER,
+        "token": request_profiler.mint_token(current_user["email"], minutes),
+        "expires_in_minutes": minutes,
+    }
+
+
+@router.get("/profiling/sampling")
+async def get_profile_sampling(current_user=Depends(get_current_user)):
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admins only")
+    return {"sampling": request_profiler.sampling_status()}
+
+
+@router.post("/profiling/sampling")
+async def start_profile_sampling(fraction: float = Body(..., embed=True), minutes: int = Body(10, embed=True), current_user=Depends(get_current_user)):
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admins only")
+    require_profiler()
+    if not 0 < fraction <= PROFILING_MAX_SAMPLE_FRACTION:
+        raise HTTPException(status_code=400, detail=f"fraction must be in (0, {PROFILING_MAX_SAMPLE_FRACTION}]")
+    if not 0 < minutes <= PROFILING_MAX_WINDOW_MINUTES:
+        raise HTTPException(status_code=400, detail=f"minutes must be in (0, {PROFILING_MAX_WINDOW_MINUTES}]")
+    doc = request_profiler.start_sampling(fraction, minutes, current_user["email"])
+    return {"message": "Profile sampling started", "sampling": doc}
+
+
+@router.delete("/profiling/sampling")
+async def stop_profile_sampling(current_user=Depends(get_current_user)):
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admins only")
+    request_profiler.stop_sampling()
+    return {"message": "Profile sampling stopped"}
+
+
+@router.get("/profiles")
+async def list_profiles(route: Optional[str] = None, limit: int = Query(50, le=200), current_user=Depends(get_current_user)):
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admins only")
+    return {"profiles": request_profiler.list(route, limit)}
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = Query("speedscope", pattern="^(speedscope|text)$"), current_user=Depends(get_current_user)):
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admins only")
+    profile = request_profiler.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "text":
+        return PlainTextResponse(profile["text"])
+    # Open in https://www.speedscope.app
+    return Response(
+        content=profile["speedscope"],
+        media_type="application/json",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.speedscope.json"'},
+    )
+
+
+# ---------------- Background Jobs ----------------
+@router.get("/jobs")
+async def list_jobs(state: Optional[str] = Query(None, pattern="^(queued|running|done|failed)$"), type: Optional[str] = None,
+                    limit: int = Query(50, le=200), current_user=Depends(get_current_user)):
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admins only")
+    jobs = job_queue.list(state, type, limit)
+    return {"jobs": jobs, "count": len(jobs)}
+
+
+@router.post("/jobs/{job_id}/retry")
+async def retry_job(job_id: str, current_user=Depends(get_current_user)):
+    """Requeue a failed job"""
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admins only")
+    if not job_queue.retry(job_id):
+        raise HTTPException(status_code=404, detail="No failed job with that id")
+    return {"message": "Job requeued"}
+
+# ---------------- Data Export ----------------
+def export_filter_value(value: str):
+    """
+    Query strings are untyped: match "true"/"false" as booleans and numbers as either type
+    """
+    if value in ("true", "false"):
+        return value == "true"
+    if value.lstrip("-").isdigit():
+        return {"$in": [value, int(value)]}
+    return value
+
+
+@router.get("/export/{collection}")
+async def export_collection(
+    collection: str,
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(True, description="Gzip the download"),
+    since: Optional[datetime] = Query(None, description="Only documents created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only documents created before this time"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to export"),
+    current_user=Depends(get_current_user),
+):
+    """
+    Stream a whole collection as NDJSON or CSV. Any of the collection's filter
+    fields may be passed as query parameters, e.g. ?subject=Maths&semester=3
+    """
+    if not is_admin_user(current_user):
+        raise HTTPException(status_code=403, detail="Admins only")
+    spec = EXPORTS.get(collection)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"Exportable collections: {', '.join(EXPORTS)}")
+
+    columns = spec["columns"]
+    if fields:
+        columns = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in columns if f not in spec["columns"]]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {unknown[0]}")
+    # CSV has fixed columns; NDJSON keeps every field unless some were asked for
+    projection = {f: 1 for f in columns} if fields or format == "csv" else {f: 0 for f in SECRET_FIELDS}
+
+    query = {name: export_filter_value(request.query_params[name]) for name in spec["filters"] if name in request.query_params}
+    if since or until:
+        query[spec["since"]] = {**({"$gte": since} if since else {}), **({"$lt": until} if until else {})}
+
+    def stream():
+        # A sync generator: Starlette pulls each chunk in the threadpool, so the
+        # cursor's network reads and the encoding never block the event loop
+        cursor = read_db[collection].find(query, projection, batch_size=EXPORT_BATCH_SIZE)
+        try:
+            yield from encode_stream(cursor, "csv" if format == "csv" else "jsonl", columns, compress=gzip)
+        finally:
+            cursor.close()
+
+    extension = "csv" if format == "csv" else "ndjson"
+    filename = f"{collection}-{datetime.utcnow():%Y%m%dT%H%M%SZ}.{extension}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else ("text/csv" if format == "csv" else "application/x-ndjson")
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
 # ---------------- Notes CRUD ----------------
-@router.post("/notes")
-async def add_notes(current_user=Depends(get_current_user), data: dict = Body(...)):
+@router.post("/notes", dependencies=CATALOG_WRITE)
+async def add_notes(response: Response, current_user=Depends(get_current_user), data: dict = Body(...)):
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admins only")
     if not data.get("title") or not data.get("content"):
@@ -74,45 +347,51 @@ async def add_notes(current_user=Depends(get_current_user), data: dict = Body(..
         "created_by": current_user["email"],
         "created_at": datetime.utcnow()
     }
-    db.notes.insert_one(note)
+    with write_session(response) as session:
+        db.notes.insert_one(note, session=session)
     return {"message": "Note added successfully", "note": note}
 
 
 @router.get("/notes")
-async def list_notes(skip: int = 0, limit: int = 50, current_user=Depends(get_current_user)):
+async def list_notes(request: Request, skip: int = 0, limit: int = 50, fields: Optional[str] = Query(None, description="Comma-separated fields to return"), current_user=Depends(get_current_user)):
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admins only")
-    cursor = db.notes.find().sort("created_at", -1).skip(skip).limit(limit)
-    return {"notes": list(cursor)}
+    projection = build_projection(fields, NOTE_FIELDS, NOTE_LIST_PROJECTION)
+    with read_session(request) as session:
+        cursor = read_db.notes.find({}, projection, session=session).sort("created_at", -1).skip(skip).limit(limit)
+        return {"notes": list(cursor)}
 
 
-@router.put("/notes/{note_id}")
-async def update_note(note_id: str, data: dict = Body(...), current_user=Depends(get_current_user)):
+@router.put("/notes/{note_id}", dependencies=CATALOG_WRITE)
+async def update_note(response: Response, note_id: str, data: dict = Body(...), current_user=Depends(get_current_user)):
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admins only")
     update = {k: v for k, v in data.items() if k in ("title", "content", "tags")}
     if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
     update["updated_at"] = datetime.utcnow()
-    result = db.notes.update_one({"_id": note_id}, {"$set": update})
+    with write_session(response) as session:
+        result = db.notes.update_one({"_id": note_id}, {"$set": update}, session=session)
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Note not found")
     return {"message": "Note updated successfully"}
 
 
-@router.delete("/notes/{note_id}")
-async def delete_note(note_id: str, current_user=Depends(get_current_user)):
+@router.delete("/notes/{note_id}", dependencies=CATALOG_WRITE)
+async def delete_note(response: Response, note_id: str, current_user=Depends(get_current_user)):
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admins only")
-    result = db.notes.delete_one({"_id": note_id})
-    if result.deleted_count == 0:
+    with write_session(response) as session:
+        deleted = db.notes.find_one_and_delete({"_id": note_id}, {"file_url": 1}, session=session)
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Note not found")
+    discard_resource_file(deleted)
     return {"message": "Note deleted successfully"}
 
 
 # ---------------- Syllabus CRUD ----------------
-@router.post("/syllabus")
-async def add_syllabus(current_user=Depends(get_current_user), data: dict = Body(...)):
+@router.post("/syllabus", dependencies=CATALOG_WRITE)
+async def add_syllabus(response: Response, current_user=Depends(get_current_user), data: dict = Body(...)):
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admins only")
     required = ("course", "semester", "topics")
@@ -126,48 +405,54 @@ async def add_syllabus(current_user=Depends(get_current_user), data: dict = Body
         "created_by": current_user["email"],
         "created_at": datetime.utcnow()
     }
-    db.syllabus.insert_one(syllabus)
+    with write_session(response) as session:
+        db.syllabus.insert_one(syllabus, session=session)
     return {"message": "Syllabus added successfully", "syllabus": syllabus}
 
 
 @router.get("/syllabus")
-async def list_syllabus(course: Optional[str] = None, current_user=Depends(get_current_user)):
+async def list_syllabus(request: Request, course: Optional[str] = None, fields: Optional[str] = Query(None, description="Comma-separated fields to return"), current_user=Depends(get_current_user)):
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admins only")
+    projection = build_projection(fields, SYLLABUS_FIELDS)
     query = {}
     if course:
         query["course"] = course
-    docs = list(db.syllabus.find(query).sort("created_at", -1))
+    with read_session(request) as session:
+        docs = list(read_db.syllabus.find(query, projection, session=session).sort("created_at", -1))
     return {"syllabus": docs}
 
 
-@router.put("/syllabus/{sid}")
-async def update_syllabus(sid: str, data: dict = Body(...), current_user=Depends(get_current_user)):
+@router.put("/syllabus/{sid}", dependencies=CATALOG_WRITE)
+async def update_syllabus(response: Response, sid: str, data: dict = Body(...), current_user=Depends(get_current_user)):
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admins only")
     update = {k: v for k, v in data.items() if k in ("course", "semester", "topics")}
     if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
     update["updated_at"] = datetime.utcnow()
-    res = db.syllabus.update_one({"_id": sid}, {"$set": update})
+    with write_session(response) as session:
+        res = db.syllabus.update_one({"_id": sid}, {"$set": update}, session=session)
     if res.matched_count == 0:
         raise HTTPException(status_code=404, detail="Syllabus not found")
     return {"message": "Syllabus updated successfully"}
 
 
-@router.delete("/syllabus/{sid}")
-async def delete_syllabus(sid: str, current_user=Depends(get_current_user)):
+@router.delete("/syllabus/{sid}", dependencies=CATALOG_WRITE)
+async def delete_syllabus(response: Response, sid: str, current_user=Depends(get_current_user)):
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admins only")
-    res = db.syllabus.delete_one({"_id": sid})
-    if res.deleted_count == 0:
+    with write_session(response) as session:
+        deleted = db.syllabus.find_one_and_delete({"_id": sid}, {"file_url": 1}, session=session)
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Syllabus not found")
+    discard_resource_file(deleted)
     return {"message": "Syllabus deleted successfully"}
 
 
 # ---------------- Papers CRUD ----------------
-@router.post("/papers")
-async def add_paper(current_user=Depends(get_current_user), data: dict = Body(...)):
+@router.post("/papers", dependencies=CATALOG_WRITE)
+async def add_paper(response: Response, current_user=Depends(get_current_user), data: dict = Body(...)):
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admins only")
     if not data.get("title") or not data.get("file_url"):
@@ -180,37 +465,43 @@ async def add_paper(current_user=Depends(get_current_user), data: dict = Body(..
         "created_by": current_user["email"],
         "created_at": datetime.utcnow()
     }
-    db.papers.insert_one(paper)
+    with write_session(response) as session:
+        db.papers.insert_one(paper, session=session)
     return {"message": "Paper added successfully", "paper": paper}
 
 
 @router.get("/papers")
-async def list_papers(skip: int = 0, limit: int = 50, current_user=Depends(get_current_user)):
+async def list_papers(request: Request, skip: int = 0, limit: int = 50, fields: Optional[str] = Query(None, description="Comma-separated fields to return"), current_user=Depends(get_current_user)):
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admins only")
-    docs = list(db.papers.find().sort("created_at", -1).skip(skip).limit(limit))
+    projection = build_projection(fields, PAPER_FIELDS)
+    with read_session(request) as session:
+        docs = list(read_db.papers.find({}, projection, session=session).sort("created_at", -1).skip(skip).limit(limit))
     return {"papers": docs}
 
 
-@router.put("/papers/{pid}")
-async def update_paper(pid: str, data: dict = Body(...), current_user=Depends(get_current_user)):
+@router.put("/papers/{pid}", dependencies=CATALOG_WRITE)
+async def update_paper(response: Response, pid: str, data: dict = Body(...), current_user=Depends(get_current_user)):
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admins only")
     update = {k: v for k, v in data.items() if k in ("title", "description", "file_url")}
     if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
     update["updated_at"] = datetime.utcnow()
-    res = db.papers.update_one({"_id": pid}, {"$set": update})
+    with write_session(response) as session:
+        res = db.papers.update_one({"_id": pid}, {"$set": update}, session=session)
     if res.matched_count == 0:
         raise HTTPException(status_code=404, detail="Paper not found")
     return {"message": "Paper updated successfully"}
 
 
-@router.delete("/papers/{pid}")
-async def delete_paper(pid: str, current_user=Depends(get_current_user)):
+@router.delete("/papers/{pid}", dependencies=CATALOG_WRITE)
+async def delete_paper(response: Response, pid: str, current_user=Depends(get_current_user)):
     if not is_admin_user(current_user):
         raise HTTPException(status_code=403, detail="Admins only")
-    res = db.papers.delete_one({"_id": pid})
-    if res.deleted_count == 0:
+    with write_session(response) as session:
+        deleted = db.papers.find_one_and_delete({"_id": pid}, {"file_url": 1}, session=session)
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Paper not found")
+    discard_resource_file(deleted)
     return {"message": "Paper deleted successfully"}
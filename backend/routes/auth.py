@@ -1,15 +1,17 @@
 # routes/auth.py
-from fastapi import APIRouter, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, HTTPException, status, Request, Response
 from fastapi.responses import HTMLResponse
 from pydantic import BaseModel, EmailStr
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from jose import jwt, JWTError
+from jose import jwt
 from config import (
-    db,
     JWT_SECRET_KEY,
     JWT_ALGORITHM,
     ACCESS_TOKEN_EXPIRE_MINUTES,
+    VERIFICATION_TOKEN_EXPIRE_MINUTES,
+    REGISTRATION_PENDING_TTL_HOURS,
+    REFRESH_TOKEN_EXPIRE_DAYS,
     FRONTEND_URL,
     SMTP_SERVER,
     SMTP_PORT,
@@ -18,10 +20,16 @@ from config import (
     SMTP_FROM_EMAIL,
     SMTP_FROM_NAME,
 )
+from database import db
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+import hashlib
+import secrets
 import uuid
+from utils.jobs import job_queue
+from utils.rate_limiter import limiter
+from utils.refresh_tokens import refresh_tokens
 
 router = APIRouter()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -42,6 +50,9 @@ class LoginModel(BaseModel):
 class ResendVerificationModel(BaseModel):
     email: EmailStr
 
+class RefreshModel(BaseModel):
+    refresh_token: str | None = None
+
 # -------------------- UTILITIES --------------------
 def create_access_token(data: dict, expires_minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES):
     to_encode = data.copy()
@@ -50,6 +61,74 @@ def create_access_token(data: dict, expires_minutes: int = ACCESS_TOKEN_EXPIRE_M
     return jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
 
+# Refresh tokens also go in an httpOnly cookie, sent only to the auth endpoints
+REFRESH_COOKIE = "refresh_token"
+
+
+def set_refresh_cookie(response: Response, token: str):
+    response.set_cookie(
+        REFRESH_COOKIE,
+        token,
+        max_age=REFRESH_TOKEN_EXPIRE_DAYS * 86400,
+        httponly=True,
+        secure=FRONTEND_URL.startswith("https://"),
+        samesite="strict",
+        path="/api/auth",
+    )
+
+
+def session_response(user: dict, refresh_token: str) -> dict:
+    """
+    Access token plus the user object for the frontend (never includes the password)
+    """
+    # Include 'sub' for email and 'role'/'is_admin' for admin checks
+    is_admin = bool(user.get("is_admin", False) or user.get("role") == "admin")
+    payload = {"sub": user["email"], "role": user.get("role", "student"), "is_admin": is_admin}
+    token = create_access_token(payload, expires_minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+
+    user_response = {
+        "name": user.get("name"),
+        "email": user.get("email"),
+        "usn": user.get("usn"),
+        "course": user.get("course"),
+        "semester": user.get("semester"),
+        "is_admin": is_admin,
+        "role": user.get("role", "student"),
+    }
+
+    return {"access_token": token, "refresh_token": refresh_token, "token_type": "bearer", "user": user_response}
+
+
+# Pending registrations live in their own collection, one document per email (_id),
+# until the verification link is used or the TTL index drops them
+_pending_indexed = False
+
+
+def pending_registrations():
+    global _pending_indexed
+    if not _pending_indexed:
+        db.pending_registrations.create_index("expires_at", expireAfterSeconds=0)
+        db.pending_registrations.create_index("token_hash", unique=True)
+        _pending_indexed = True
+    return db.pending_registrations
+
+
+def hash_token(token: str) -> str:
+    """Verification tokens are stored hashed, so a leaked collection holds no usable links"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def new_verification_token() -> tuple[str, dict]:
+    """
+    A fresh single-use token and the fields that record it on the pending registration
+    """
+    token = secrets.token_urlsafe(32)
+    return token, {
+        "token_hash": hash_token(token),
+        "token_expires_at": datetime.utcnow() + timedelta(minutes=VERIFICATION_TOKEN_EXPIRE_MINUTES),
+    }
+
+
 def send_verification_email(to_email: str, token: str):
     # Use backend verify endpoint so clicking in email works from any device
     verify_link = f"{FRONTEND_URL.rstrip('/')}/verify-email/{token}"
@@ -65,7 +144,7 @@ def send_verification_email(to_email: str, token: str):
         f"Hi,\n\n"
         f"Please verify your email by visiting this link:\n\n{verify_link}\n\n"
         f"If the above doesn't work, open this alternative link in your browser:\n{backend_verify}\n\n"
-        "This link expires in 15 minutes.\n\nEduResources"
+        f"This link expires in {VERIFICATION_TOKEN_EXPIRE_MINUTES} minutes.\n\nEduResources"
     )
     html = f"""
     <html><body style="font-family: sans-serif; font-size: 16px;">
@@ -78,7 +157,7 @@ def send_verification_email(to_email: str, token: str):
         </a>
       </p>
       <p>If that doesn't work, paste this URL into your browser:<br><small>{backend_verify}</small></p>
-      <p>This link expires in 15 minutes.</p>
+      <p>This link expires in {VERIFICATION_TOKEN_EXPIRE_MINUTES} minutes.</p>
       <p>EduResources</p>
     </body></html>
     """
@@ -86,62 +165,69 @@ def send_verification_email(to_email: str, token: str):
     message.attach(MIMEText(html, "html"))
 
     try:
-        with smtplib.SMTP(SMTP_SERVER, int(SMTP_PORT)) as server:
+        with smtplib.SMTP(SMTP_SERVER, int(SMTP_PORT), timeout=30) as server:
             server.starttls()
             server.login(SMTP_USERNAME, SMTP_PASSWORD)
             server.sendmail(SMTP_FROM_EMAIL, to_email, message.as_string())
             print(f"📨 Verification email sent to {to_email}")
     except Exception as e:
         # Provide useful debugging info to logs while not leaking credentials.
-        raise HTTPException(status_code=500, detail=f"Failed to send verification email: {e}")
+        raise RuntimeError(f"Failed to send verification email: {e}") from e
+
+
+@job_queue.job("send_verification_email", executor="thread", concurrency=4)
+def send_verification_job(email: str):
+    """
+    Email a fresh verification link for a pending registration. Issuing the
+    token here means a retried send simply replaces the previous link.
+    """
+    verification_token, token_fields = new_verification_token()
+    result = pending_registrations().update_one({"_id": email}, {"$set": token_fields})
+    if result.matched_count == 0:
+        return  # verified or expired in the meantime
+    send_verification_email(email, verification_token)
 
 
 # -------------------- REGISTER --------------------
 @router.post("/register")
-async def register_user(data: RegisterModel):
+async def register_user(data: RegisterModel, request: Request):
     """
     Registration flow:
     - If an existing verified user exists: reject.
-    - If an existing unverified record exists: remove it (reset).
-    - Hash password and create a signed token containing the user data.
-    - Send verification email with token.
-    - Insert a minimal pending record (so UI knows registration started).
-    - NOTE: full user document with password is only created when user clicks verification link.
+    - Hash password and store it with the other details as a pending registration
+      (replacing any earlier attempt for the same email, which also voids its link).
+    - Queue the verification email (a background job issues the single-use token and sends it).
+    - NOTE: the user document is only created when the user clicks the verification link;
+      unverified registrations expire via a TTL index.
     """
+    limiter.check(request, "register", email=data.email)
+
     if db is None:
         raise HTTPException(status_code=500, detail="Database not connected")
 
-    existing_user = db.users.find_one({"email": data.email})
-    if existing_user and existing_user.get("verified", False):
+    if db.users.find_one({"email": data.email, "verified": True}, {"_id": 1}):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered and verified")
 
-    # Remove any stale unverified entry to reset the flow
-    if existing_user and not existing_user.get("verified", False):
-        db.users.delete_one({"email": data.email})
-
     hashed_pw = pwd_context.hash(data.password)
-
-    token_data = {
-        "name": data.name,
-        "email": data.email,
-        "password_hash": hashed_pw,
-        "usn": data.usn,
-        "course": data.course,
-        "semester": data.semester,
-    }
-    verification_token = create_access_token(token_data, expires_minutes=15)
-
-    # send email; if this raises, do not touch DB
-    send_verification_email(data.email, verification_token)
-
-    # create minimal pending record so frontend can show "pending verification"
-    pending = {
-        "_id": str(uuid.uuid4()),
-        "email": data.email,
-        "verified": False,
-        "created_at": datetime.utcnow()
-    }
-    db.users.insert_one(pending)
+    # Placeholder token that is never sent; the email job replaces it with the one it mails
+    _, token_fields = new_verification_token()
+
+    now = datetime.utcnow()
+    pending_registrations().replace_one(
+        {"_id": data.email},
+        {
+            "name": data.name,
+            "password_hash": hashed_pw,
+            "usn": data.usn,
+            "course": data.course,
+            "semester": data.semester,
+            **token_fields,
+            "created_at": now,
+            "expires_at": now + timedelta(hours=REGISTRATION_PENDING_TTL_HOURS),
+        },
+        upsert=True,
+    )
+    job_queue.enqueue("send_verification_email", {"email": data.email})
 
     return {"message": "Verification email sent successfully. Please verify to complete registration."}
 
@@ -150,33 +236,25 @@ async def register_user(data: RegisterModel):
 @router.get("/verify/{token}", response_class=HTMLResponse)
 async def verify_email(token: str):
     """
-    When user clicks the email link we decode token and create the full user document (or update if present).
+    When user clicks the email link we consume the pending registration and create the user document.
     We return a small HTML page that redirects to frontend login after 3 seconds.
     """
-    try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-    except JWTError:
+    # Deleting on match makes the token single use, even with concurrent clicks
+    pending = pending_registrations().find_one_and_delete(
+        {"token_hash": hash_token(token), "token_expires_at": {"$gt": datetime.utcnow()}}
+    )
+    if not pending:
         raise HTTPException(status_code=400, detail="Invalid or expired verification link")
 
-    email = payload.get("email")
-    name = payload.get("name")
-    password_hash = payload.get("password_hash")
-
-    if not email or not name or not password_hash:
-        raise HTTPException(status_code=400, detail="Invalid token payload")
-
-    # remove any pending documents with same email to avoid duplicates
-    db.users.delete_many({"email": email})
-
-    # Build final user doc
+    email = pending["_id"]
     user_doc = {
         "_id": str(uuid.uuid4()),
-        "name": name,
+        "name": pending["name"],
         "email": email,
-        "password": password_hash,
-        "usn": payload.get("usn"),
-        "course": payload.get("course"),
-        "semester": payload.get("semester"),
+        "password": pending["password_hash"],
+        "usn": pending.get("usn"),
+        "course": pending.get("course"),
+        "semester": pending.get("semester"),
         "is_admin": False,
         "role": "student",
         "verified": True,
@@ -184,7 +262,14 @@ async def verify_email(token: str):
         "created_at": datetime.utcnow(),
     }
 
-    db.users.insert_one(user_doc)
+    # Single atomic upsert: creates the user unless one with this email already exists
+    result = db.users.update_one({"email": email}, {"$setOnInsert": user_doc}, upsert=True)
+    if result.upserted_id is None:
+        # A pending row left in users by the old flow (see migrate_pending_registrations.py)
+        db.users.update_one(
+            {"email": email, "verified": {"$ne": True}},
+            {"$set": {k: v for k, v in user_doc.items() if k != "_id"}},
+        )
 
     # Friendly HTML response (redirects to frontend login)
     redirect_url = f"{FRONTEND_URL.rstrip('/')}/login"
@@ -201,7 +286,9 @@ async def verify_email(token: str):
 
 # -------------------- LOGIN --------------------
 @router.post("/login")
-async def login_user(data: LoginModel):
+async def login_user(data: LoginModel, request: Request, response: Response):
+    limiter.check(request, "login", email=data.email)
+
     if db is None:
         raise HTTPException(status_code=500, detail="Database not connected")
 
@@ -215,46 +302,62 @@ async def login_user(data: LoginModel):
     if not pwd_context.verify(data.password, user.get("password", "")):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    # Include 'sub' for email and 'role'/'is_admin' for admin checks
-    is_admin = bool(user.get("is_admin", False) or user.get("role") == "admin")
-    payload = {"sub": user["email"], "role": user.get("role", "student"), "is_admin": is_admin}
-    token = create_access_token(payload, expires_minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    # Starts a new session family; later renewals go through /refresh without bcrypt
+    refresh_token = refresh_tokens.issue(user["email"])
+    set_refresh_cookie(response, refresh_token)
+    return session_response(user, refresh_token)
 
-    # Return user object for frontend (do not include password)
-    user_response = {
-        "name": user.get("name"),
-        "email": user.get("email"),
-        "usn": user.get("usn"),
-        "course": user.get("course"),
-        "semester": user.get("semester"),
-        "is_admin": is_admin,
-        "role": user.get("role", "student"),
-    }
 
-    return {"access_token": token, "token_type": "bearer", "user": user_response}
+# -------------------- REFRESH --------------------
+@router.post("/refresh")
+async def refresh_session(request: Request, response: Response, data: RefreshModel | None = None):
+    """
+    Exchange a refresh token (body or cookie) for a new access token and the next refresh token.
+    Each refresh token works once; replaying a used one ends the whole session.
+    """
+    presented = (data.refresh_token if data else None) or request.cookies.get(REFRESH_COOKIE)
+    if not presented:
+        raise HTTPException(status_code=401, detail="Refresh token missing")
+
+    rotated = refresh_tokens.rotate(presented)
+    if rotated is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    email, refresh_token = rotated
+
+    # Re-read the user so role changes and deletions apply at the next renewal
+    user = db.users.find_one({"email": email, "verified": True}, {"password": 0})
+    if not user:
+        refresh_tokens.revoke(refresh_token)
+        raise HTTPException(status_code=401, detail="User not found")
+
+    set_refresh_cookie(response, refresh_token)
+    return session_response(user, refresh_token)
+
+
+# -------------------- LOGOUT --------------------
+@router.post("/logout")
+async def logout_user(request: Request, response: Response, data: RefreshModel | None = None):
+    presented = (data.refresh_token if data else None) or request.cookies.get(REFRESH_COOKIE)
+    if presented:
+        refresh_tokens.revoke(presented)
+    response.delete_cookie(REFRESH_COOKIE, path="/api/auth")
+    return {"message": "Logged out"}
 
 
 # -------------------- RESEND VERIFICATION --------------------
 @router.post("/resend-verification")
-async def resend_verification(data: ResendVerificationModel, background_tasks: BackgroundTasks):
+async def resend_verification(data: ResendVerificationModel, request: Request):
+    limiter.check(request, "resend_verification", email=data.email)
+
     if db is None:
         raise HTTPException(status_code=500, detail="Database not connected")
 
-    user = db.users.find_one({"email": data.email})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    if user.get("verified", False):
-        return {"message": "Email already verified"}
-
-    # If user doc has a password hash already, reuse it. Otherwise instruct re-register.
-    password_hash = user.get("password")
-    name = user.get("name", "EduResources User")
-    if not password_hash:
-        # There may be only a pending entry with no password — ask to register again.
-        raise HTTPException(status_code=400, detail="No pending registration data — please register again")
+    if not pending_registrations().find_one({"_id": data.email}, {"_id": 1}):
+        if db.users.find_one({"email": data.email, "verified": True}, {"_id": 1}):
+            return {"message": "Email already verified"}
+        # Never registered, or the pending registration expired
+        raise HTTPException(status_code=404, detail="No pending registration — please register again")
 
-    token_data = {"name": name, "email": data.email, "password_hash": password_hash, "usn": user.get("usn"), "course": user.get("course"), "semester": user.get("semester")}
-    verification_token = create_access_token(token_data, expires_minutes=15)
-    background_tasks.add_task(send_verification_email, data.email, verification_token)
+    # The job issues a new token, so only the latest link works
+    job_queue.enqueue("send_verification_email", {"email": data.email})
     return {"message": "Verification email resent successfully."}
@@ -0,0 +1,86 @@
+# routes/catalog_routes.py
+import asyncio
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse
+
+from utils.catalog_snapshot import catalog_snapshots
+
+router = APIRouter()
+
+# Snapshot files are content-addressed, so a URL never changes meaning
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+
+async def mark_catalog_dirty(request: Request):
+    """
+    Router dependency: schedule a snapshot rebuild after a successful catalog write
+    """
+    yield
+    if request.method not in ("GET", "HEAD", "OPTIONS"):
+        catalog_snapshots.mark_dirty()
+
+
+# Route dependencies for handlers that create, change or delete catalog content
+CATALOG_WRITE = [Depends(mark_catalog_dirty)]
+
+
+def _accepted_encodings(request: Request) -> set:
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+    return accepted
+
+
+# ========================
+# Manifest
+# ========================
+@router.get("/manifest")
+async def get_manifest():
+    manifest = catalog_snapshots.manifest()
+    if manifest is None:
+        # First request on a fresh deployment: build once, synchronously
+        manifest = await asyncio.get_running_loop().run_in_executor(None, catalog_snapshots.build)
+
+    return JSONResponse(
+        {
+            "version": manifest["version"],
+            "url": f"/api/catalog/{manifest['file']}",
+            "bytes": manifest["bytes"],
+            "counts": manifest["counts"],
+            "generated_at": manifest["generated_at"].isoformat(),
+        },
+        # Tiny and always revalidated; the snapshot it points at is cached forever
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+# ========================
+# Snapshot file
+# ========================
+@router.get("/{filename}")
+async def get_snapshot(filename: str, request: Request):
+    path = catalog_snapshots.path_for(filename)
+    if path is None:
+        manifest = catalog_snapshots.manifest()
+        if manifest is None or manifest["file"] != filename:
+            raise HTTPException(status_code=404, detail="Snapshot not found")
+        # Current version built by a worker on another host - build it here
+        await asyncio.get_running_loop().run_in_executor(None, catalog_snapshots.build)
+        path = catalog_snapshots.path_for(filename)
+        if path is None:
+            raise HTTPException(status_code=404, detail="Snapshot not found")
+
+    headers = {"Cache-Control": IMMUTABLE_CACHE, "Vary": "Accept-Encoding"}
+    accepted = _accepted_encodings(request)
+    # Serve the precompressed variant as-is; the compression middleware skips encoded responses
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if encoding in accepted and os.path.exists(path + suffix):
+            headers["Content-Encoding"] = encoding
+            return FileResponse(path + suffix, media_type="application/json", headers=headers)
+
+    return FileResponse(path, media_type="application/json", headers=headers)
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, Depends, Query
 from jose import jwt, JWTError
-from config import db, JWT_SECRET_KEY, JWT_ALGORITHM
+from config import JWT_SECRET_KEY, JWT_ALGORITHM
+from database import db, read_db, read_session, write_session
+from utils.projections import build_projection, rename_ids
+from utils.file_serving import FILE_PROJECTION, discard_resource_file, serve_resource_file
+from middleware.compression import mark_shared
+from routes.catalog_routes import CATALOG_WRITE
 from datetime import datetime
 from pydantic import BaseModel
 from typing import Optional
 import uuid
 
-# Remove prefix - let server.py handle it via auto_include_routers
+# Remove prefix - server.py mounts it via the router registry
 router = APIRouter()
 
 
@@ -27,6 +32,13 @@ class NoteUpdate(BaseModel):
     file_url: Optional[str] = None
 
 
+# Fields a client may request with ?fields=
+NOTE_FIELDS = {"title", "description", "subject", "semester", "file_url", "branch", "tags", "download_count", "created_at", "updated_at"}
+
+# Lean default projection: uploaded_by is internal and never returned
+NOTE_DEFAULT_PROJECTION = {"uploaded_by": 0}
+
+
 # Admin Verification via Authorization Header
 def verify_admin(request: Request):
     auth_header = request.headers.get("Authorization")
@@ -49,23 +61,54 @@ def verify_admin(request: Request):
 
 # ---------------- GET All Notes ----------------
 @router.get("/")
-async def get_all_notes():
+async def get_all_notes(request: Request, response: Response, fields: Optional[str] = Query(None, description="Comma-separated fields to return")):
     """Fetch all notes from the database"""
+    projection = build_projection(fields, NOTE_FIELDS, NOTE_DEFAULT_PROJECTION)
     try:
-        notes = list(db.notes.find({}))
+        with read_session(request) as session:
+            notes = list(read_db.notes.find({}, projection, session=session))
         # Convert _id to id for consistency
-        for note in notes:
-            if "_id" in note:
-                note["id"] = note["_id"]
-                del note["_id"]
+        rename_ids(notes)
+        if not fields:
+            mark_shared(response)
         return {"success": True, "notes": notes, "count": len(notes)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching notes: {str(e)}")
 
 
+# ---------------- GET Single Note ----------------
+@router.get("/{note_id}")
+async def get_note(note_id: str, request: Request, fields: Optional[str] = Query(None, description="Comma-separated fields to return")):
+    """Fetch a single note by ID"""
+    projection = build_projection(fields, NOTE_FIELDS, NOTE_DEFAULT_PROJECTION)
+    with read_session(request) as session:
+        note_doc = read_db.notes.find_one({"_id": note_id}, projection, session=session)
+    if not note_doc:
+        raise HTTPException(status_code=404, detail="Note not found")
+    note_doc["id"] = note_doc.pop("_id")
+    return {"success": True, "note": note_doc}
+
+
+# ---------------- GET Download / View Note ----------------
+@router.get("/{note_id}/download")
+async def download_note(note_id: str, request: Request):
+    """Download a note's file (counts towards download_count)"""
+    with read_session(request) as session:
+        note_doc = read_db.notes.find_one({"_id": note_id}, FILE_PROJECTION, session=session)
+    return await serve_resource_file(request, "notes", note_doc, attachment=True)
+
+
+@router.get("/{note_id}/view")
+async def view_note(note_id: str, request: Request):
+    """Open a note's file inline in the browser"""
+    with read_session(request) as session:
+        note_doc = read_db.notes.find_one({"_id": note_id}, FILE_PROJECTION, session=session)
+    return await serve_resource_file(request, "notes", note_doc, attachment=False)
+
+
 # ---------------- POST Add New Note ----------------
-@router.post("/")
-async def add_note(note: NoteCreate, request: Request):
+@router.post("/", dependencies=CATALOG_WRITE)
+async def add_note(note: NoteCreate, request: Request, response: Response):
     """Add a new note (Admin only)"""
     verify_admin(request)
     
@@ -82,7 +125,8 @@ async def add_note(note: NoteCreate, request: Request):
             "created_at": datetime.utcnow(),
         }
         
-        db.notes.insert_one(note_data)
+        with write_session(response) as session:
+            db.notes.insert_one(note_data, session=session)
         
         # Return with id instead of _id
         note_data["id"] = note_data["_id"]
@@ -98,8 +142,8 @@ async def add_note(note: NoteCreate, request: Request):
 
 
 # ---------------- PUT Update Note ----------------
-@router.put("/{note_id}")
-async def update_note(note_id: str, note: NoteUpdate, request: Request):
+@router.put("/{note_id}", dependencies=CATALOG_WRITE)
+async def update_note(note_id: str, note: NoteUpdate, request: Request, response: Response):
     """Update an existing note by ID (Admin only)"""
     verify_admin(request)
     
@@ -118,7 +162,8 @@ async def update_note(note_id: str, note: NoteUpdate, request: Request):
         update_data["updated_at"] = datetime.utcnow()
         
         # Update the note
-        result = db.notes.update_one({"_id": note_id}, {"$set": update_data})
+        with write_session(response) as session:
+            result = db.notes.update_one({"_id": note_id}, {"$set": update_data}, session=session)
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Note not found")
@@ -141,8 +186,8 @@ async def update_note(note_id: str, note: NoteUpdate, request: Request):
 
 
 # ---------------- DELETE Note ----------------
-@router.delete("/{note_id}")
-async def delete_note(note_id: str, request: Request):
+@router.delete("/{note_id}", dependencies=CATALOG_WRITE)
+async def delete_note(note_id: str, request: Request, response: Response):
     """Delete a note by ID (Admin only)"""
     verify_admin(request)
     
@@ -153,11 +198,15 @@ async def delete_note(note_id: str, request: Request):
             raise HTTPException(status_code=404, detail="Note not found")
         
         # Delete from database
-        result = db.notes.delete_one({"_id": note_id})
+        with write_session(response) as session:
+            result = db.notes.delete_one({"_id": note_id}, session=session)
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Note not found")
         
+        # Remove the uploaded file in the background
+        discard_resource_file(note)
+        
         return {
             "success": True,
             "message": "Note deleted successfully"
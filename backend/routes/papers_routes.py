@@ -1,17 +1,27 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Request
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Request, Response, Query, Header
 from jose import jwt, JWTError
-from config import db, JWT_SECRET_KEY, JWT_ALGORITHM
-from datetime import datetime
+from config import JWT_SECRET_KEY, JWT_ALGORITHM, UPLOAD_MAX_MB
+from database import db, read_db, read_session, write_session
+from utils.projections import build_projection, rename_ids
+from utils.file_serving import FILE_PROJECTION, discard_resource_file, save_upload, serve_resource_file
+from utils.storage import is_new_key, new_key, storage, url_for_key
+from utils.trending import trending
+from utils.upload_sessions import parse_checksum, upload_sessions
+from middleware.compression import mark_shared
+from routes.catalog_routes import CATALOG_WRITE
+from datetime import datetime, timedelta
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+import asyncio
 import uuid
-import os
 
-# Remove prefix - let server.py handle it via auto_include_routers
+# Remove prefix - server.py mounts it via the router registry
 router = APIRouter()
 
-UPLOAD_DIR = "uploads/papers"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Storage key prefix for uploaded paper files
+UPLOAD_DIR = "papers"
+# How long a direct upload may take between /upload-url and /upload-complete
+UPLOAD_TOKEN_HOURS = 24
 
 
 # Pydantic Models for Request Validation
@@ -31,6 +41,51 @@ class PaperUpdate(BaseModel):
     file_url: Optional[str] = None
 
 
+class DirectUploadRequest(BaseModel):
+    filename: str
+    content_type: str = "application/pdf"
+    size: int
+
+
+class UploadedPart(BaseModel):
+    part_number: int
+    etag: str
+
+
+class DirectUploadComplete(BaseModel):
+    key: str
+    # From /upload-url: binds the key to its declared size
+    upload_token: str
+    title: str
+    subject: str
+    semester: str
+    year: Optional[str] = None
+    upload_id: Optional[str] = None
+    parts: Optional[List[UploadedPart]] = None
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    content_type: str = "application/pdf"
+    size: int
+    # Hex SHA-256 of the whole file, checked once it is assembled
+    sha256: Optional[str] = None
+
+
+class UploadSessionComplete(BaseModel):
+    title: str
+    subject: str
+    semester: str
+    year: Optional[str] = None
+
+
+# Fields a client may request with ?fields=
+PAPER_FIELDS = {"title", "description", "subject", "semester", "year", "file_url", "branch", "tags", "download_count", "created_at", "updated_at"}
+
+# Lean default projection: uploaded_by is internal and never returned
+PAPER_DEFAULT_PROJECTION = {"uploaded_by": 0}
+
+
 # Admin Verification via Authorization Header
 def verify_admin(request: Request):
     auth_header = request.headers.get("Authorization")
@@ -53,23 +108,74 @@ def verify_admin(request: Request):
 
 # ---------------- GET All Papers ----------------
 @router.get("/")
-async def get_all_papers():
+async def get_all_papers(request: Request, response: Response, fields: Optional[str] = Query(None, description="Comma-separated fields to return")):
     """Fetch all papers from the database"""
+    projection = build_projection(fields, PAPER_FIELDS, PAPER_DEFAULT_PROJECTION)
     try:
-        papers = list(db.papers.find({}))
+        with read_session(request) as session:
+            papers = list(read_db.papers.find({}, projection, session=session))
         # Convert _id to id for consistency
-        for paper in papers:
-            if "_id" in paper:
-                paper["id"] = paper["_id"]
-                del paper["_id"]
+        rename_ids(papers)
+        if not fields:
+            # The default listing is the same for everyone: compress it once
+            mark_shared(response)
         return {"success": True, "papers": papers, "count": len(papers)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching papers: {str(e)}")
 
 
+# ---------------- GET Trending Papers ----------------
+# Declared before /{paper_id} so "trending" is not taken for an ID
+@router.get("/trending")
+async def get_trending_papers(
+    subject: Optional[str] = None,
+    semester: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=trending.top_k),
+):
+    """Most downloaded papers recently, optionally for one subject and/or semester"""
+    papers = trending.top("papers", subject, semester, limit)
+    return {
+        "success": True,
+        "papers": papers,
+        "count": len(papers),
+        "window_hours": int(trending.window.total_seconds() // 3600),
+        "refreshed_at": trending.refreshed_at,
+    }
+
+
+# ---------------- GET Single Paper ----------------
+@router.get("/{paper_id}")
+async def get_paper(paper_id: str, request: Request, fields: Optional[str] = Query(None, description="Comma-separated fields to return")):
+    """Fetch a single paper by ID"""
+    projection = build_projection(fields, PAPER_FIELDS, PAPER_DEFAULT_PROJECTION)
+    with read_session(request) as session:
+        paper_doc = read_db.papers.find_one({"_id": paper_id}, projection, session=session)
+    if not paper_doc:
+        raise HTTPException(status_code=404, detail="Paper not found")
+    paper_doc["id"] = paper_doc.pop("_id")
+    return {"success": True, "paper": paper_doc}
+
+
+# ---------------- GET Download / View Paper ----------------
+@router.get("/{paper_id}/download")
+async def download_paper(paper_id: str, request: Request):
+    """Download a paper's file (counts towards download_count)"""
+    with read_session(request) as session:
+        paper_doc = read_db.papers.find_one({"_id": paper_id}, FILE_PROJECTION, session=session)
+    return await serve_resource_file(request, "papers", paper_doc, attachment=True)
+
+
+@router.get("/{paper_id}/view")
+async def view_paper(paper_id: str, request: Request):
+    """Open a paper's file inline in the browser"""
+    with read_session(request) as session:
+        paper_doc = read_db.papers.find_one({"_id": paper_id}, FILE_PROJECTION, session=session)
+    return await serve_resource_file(request, "papers", paper_doc, attachment=False)
+
+
 # ---------------- POST Add New Paper ----------------
-@router.post("/")
-async def add_paper(paper: PaperCreate, request: Request):
+@router.post("/", dependencies=CATALOG_WRITE)
+async def add_paper(paper: PaperCreate, request: Request, response: Response):
     """Add a new paper (Admin only)"""
     verify_admin(request)
     
@@ -86,7 +192,8 @@ async def add_paper(paper: PaperCreate, request: Request):
             "created_at": datetime.utcnow(),
         }
         
-        db.papers.insert_one(paper_data)
+        with write_session(response) as session:
+            db.papers.insert_one(paper_data, session=session)
         
         # Return with id instead of _id
         paper_data["id"] = paper_data["_id"]
@@ -102,8 +209,8 @@ async def add_paper(paper: PaperCreate, request: Request):
 
 
 # ---------------- PUT Update Paper ----------------
-@router.put("/{paper_id}")
-async def update_paper(paper_id: str, paper: PaperUpdate, request: Request):
+@router.put("/{paper_id}", dependencies=CATALOG_WRITE)
+async def update_paper(paper_id: str, paper: PaperUpdate, request: Request, response: Response):
     """Update an existing paper by ID (Admin only)"""
     verify_admin(request)
     
@@ -122,7 +229,8 @@ async def update_paper(paper_id: str, paper: PaperUpdate, request: Request):
         update_data["updated_at"] = datetime.utcnow()
         
         # Update the paper
-        result = db.papers.update_one({"_id": paper_id}, {"$set": update_data})
+        with write_session(response) as session:
+            result = db.papers.update_one({"_id": paper_id}, {"$set": update_data}, session=session)
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Paper not found")
@@ -145,8 +253,8 @@ async def update_paper(paper_id: str, paper: PaperUpdate, request: Request):
 
 
 # ---------------- DELETE Paper ----------------
-@router.delete("/{paper_id}")
-async def delete_paper(paper_id: str, request: Request):
+@router.delete("/{paper_id}", dependencies=CATALOG_WRITE)
+async def delete_paper(paper_id: str, request: Request, response: Response):
     """Delete a paper by ID (Admin only)"""
     verify_admin(request)
     
@@ -156,20 +264,16 @@ async def delete_paper(paper_id: str, request: Request):
         if not paper:
             raise HTTPException(status_code=404, detail="Paper not found")
         
-        # Delete associated file if exists
-        file_path = paper.get("file_url", "").lstrip("/")
-        if file_path and os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception as e:
-                print(f"Warning: Could not delete file {file_path}: {e}")
-        
         # Delete from database
-        result = db.papers.delete_one({"_id": paper_id})
+        with write_session(response) as session:
+            result = db.papers.delete_one({"_id": paper_id}, session=session)
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Paper not found")
         
+        # Remove the uploaded file in the background
+        discard_resource_file(paper)
+        
         return {
             "success": True,
             "message": "Paper deleted successfully"
@@ -183,14 +287,15 @@ async def delete_paper(paper_id: str, request: Request):
 # ============================================================
 # File Upload Endpoint (Optional - for file-based uploads)
 # ============================================================
-@router.post("/upload")
+@router.post("/upload", dependencies=CATALOG_WRITE)
 async def upload_paper(
+    response: Response,
     file: UploadFile = File(...),
     title: str = Form(...),
     subject: str = Form(...),
     semester: str = Form(...),
     year: str = Form(None),
-    token: str = Form(...)
+    token: str = Form(...),
 ):
     """Upload a paper with file (Admin only)"""
     # Verify admin via token
@@ -203,11 +308,7 @@ async def upload_paper(
     
     try:
         # Save file
-        filename = f"{uuid.uuid4()}_{file.filename}"
-        filepath = os.path.join(UPLOAD_DIR, filename)
-        
-        with open(filepath, "wb") as f:
-            f.write(await file.read())
+        file_url = await save_upload(file, UPLOAD_DIR)
         
         # Create paper record
         paper_id = str(uuid.uuid4())
@@ -217,12 +318,13 @@ async def upload_paper(
             "subject": subject,
             "semester": semester,
             "year": year,
-            "file_url": f"/{filepath}",
+            "file_url": file_url,
             "uploaded_by": payload.get("sub"),
             "created_at": datetime.utcnow(),
         }
         
-        db.papers.insert_one(paper_data)
+        with write_session(response) as session:
+            db.papers.insert_one(paper_data, session=session)
         
         # Return with id instead of _id
         paper_data["id"] = paper_data["_id"]
@@ -235,3 +337,203 @@ async def upload_paper(
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading paper: {str(e)}")
+
+
+# ============================================================
+# Direct Uploads (object storage only)
+# ============================================================
+# The client asks for presigned URLs, sends the file straight to the store,
+# then registers the paper - the file never passes through an API worker.
+@router.post("/upload-url")
+async def create_upload_url(data: DirectUploadRequest, request: Request):
+    """Presigned upload URL(s) for a new paper file (Admin only)"""
+    verify_admin(request)
+    if not storage.supports_direct_upload:
+        raise HTTPException(status_code=501, detail="Direct uploads need object storage; use POST /upload")
+    if data.size <= 0:
+        raise HTTPException(status_code=400, detail="size must be positive")
+    if data.size > UPLOAD_MAX_MB * 1024 * 1024:
+        raise HTTPException(status_code=413, detail=f"Uploads are limited to {UPLOAD_MAX_MB} MB")
+
+    key = new_key(UPLOAD_DIR, data.filename)
+    # Multipart uploads are created on the store, so this may do network I/O
+    upload = await asyncio.get_running_loop().run_in_executor(
+        None, storage.presign_upload, key, data.content_type, data.size
+    )
+    token = jwt.encode(
+        {"key": key, "size": data.size, "scope": "upload",
+         "exp": datetime.utcnow() + timedelta(hours=UPLOAD_TOKEN_HOURS)},
+        JWT_SECRET_KEY, algorithm=JWT_ALGORITHM,
+    )
+    return {"key": key, "file_url": url_for_key(key), "upload_token": token, **upload}
+
+
+def verify_upload_token(token: str, key: str) -> int:
+    """
+    Declared size of an upload issued by /upload-url for `key`
+    """
+    try:
+        grant = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=400, detail="Invalid or expired upload token")
+    if grant.get("scope") != "upload" or grant.get("key") != key:
+        raise HTTPException(status_code=400, detail="Invalid upload key")
+    return grant["size"]
+
+
+@router.post("/upload-complete", dependencies=CATALOG_WRITE)
+async def complete_upload(data: DirectUploadComplete, request: Request, response: Response):
+    """Register a paper whose file was uploaded with /upload-url (Admin only)"""
+    payload = verify_admin(request)
+    if not storage.supports_direct_upload:
+        raise HTTPException(status_code=501, detail="Direct uploads need object storage; use POST /upload")
+    # Only keys handed out by /upload-url, each registered once
+    if not is_new_key(data.key, UPLOAD_DIR):
+        raise HTTPException(status_code=400, detail="Invalid upload key")
+    declared = verify_upload_token(data.upload_token, data.key)
+
+    loop = asyncio.get_running_loop()
+    in_use = await loop.run_in_executor(
+        None, lambda: db.papers.find_one({"file_url": url_for_key(data.key)}, {"_id": 1})
+    )
+    if in_use:
+        raise HTTPException(status_code=409, detail="This upload is already registered")
+
+    try:
+        if data.upload_id:
+            if not data.parts:
+                raise HTTPException(status_code=400, detail="parts are required to complete a multipart upload")
+            await loop.run_in_executor(
+                None, storage.complete_upload, data.key, data.upload_id, [p.model_dump() for p in data.parts]
+            )
+        size = await loop.run_in_executor(None, storage.size, data.key)
+        if size is None:
+            raise HTTPException(status_code=400, detail="Uploaded file not found")
+        if size != declared or size > UPLOAD_MAX_MB * 1024 * 1024:
+            # Multipart parts are not length-bound, so the total is checked here
+            await loop.run_in_executor(None, storage.delete, data.key)
+            raise HTTPException(
+                status_code=413 if size > UPLOAD_MAX_MB * 1024 * 1024 else 400,
+                detail=f"Uploaded {size} bytes, declared {declared}",
+            )
+
+        paper_id = str(uuid.uuid4())
+        paper_data = {
+            "_id": paper_id,
+            "title": data.title,
+            "subject": data.subject,
+            "semester": data.semester,
+            "year": data.year,
+            "file_url": url_for_key(data.key),
+            "file_size": size,
+            "uploaded_by": payload.get("sub"),
+            "created_at": datetime.utcnow(),
+        }
+
+        with write_session(response) as session:
+            db.papers.insert_one(paper_data, session=session)
+
+        paper_data["id"] = paper_data.pop("_id")
+        return {
+            "success": True,
+            "message": "Paper uploaded successfully",
+            "paper": paper_data
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error uploading paper: {str(e)}")
+
+
+# ============================================================
+# Resumable Uploads (any storage backend)
+# ============================================================
+# The client opens a session, PATCHes the file in order (each chunk at the
+# offset the server reports), and after a dropped connection asks for the
+# offset and carries on from there instead of starting again.
+@router.post("/upload-sessions")
+async def create_upload_session(data: UploadSessionCreate, request: Request):
+    """Open a resumable upload session (Admin only)"""
+    payload = verify_admin(request)
+    session = await asyncio.get_running_loop().run_in_executor(
+        None, upload_sessions.create, data.filename, data.content_type, data.size, data.sha256, payload.get("sub")
+    )
+    return {"success": True, "session": upload_sessions.describe(session)}
+
+
+@router.get("/upload-sessions/{session_id}")
+async def get_upload_session(session_id: str, request: Request, response: Response):
+    """How much of the file the server has, to resume from (Admin only)"""
+    verify_admin(request)
+    session = await asyncio.get_running_loop().run_in_executor(None, upload_sessions.get, session_id)
+    response.headers["Upload-Offset"] = str(session["offset"])
+    return {"success": True, "session": upload_sessions.describe(session)}
+
+
+@router.patch("/upload-sessions/{session_id}")
+async def upload_chunk(
+    session_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    upload_checksum: Optional[str] = Header(None, alias="Upload-Checksum"),
+):
+    """Append the request body at Upload-Offset (Admin only)"""
+    verify_admin(request)
+    checksum = parse_checksum(upload_checksum)
+    session = await upload_sessions.append(session_id, upload_offset, request.stream(), checksum)
+    response.headers["Upload-Offset"] = str(session["offset"])
+    return {"success": True, "session": upload_sessions.describe(session)}
+
+
+@router.post("/upload-sessions/{session_id}/complete", dependencies=CATALOG_WRITE)
+async def complete_upload_session(session_id: str, data: UploadSessionComplete, request: Request, response: Response):
+    """Store the uploaded file and register the paper (Admin only)"""
+    payload = verify_admin(request)
+    loop = asyncio.get_running_loop()
+    session = await loop.run_in_executor(None, upload_sessions.get, session_id)
+    key = new_key(UPLOAD_DIR, session["filename"])
+    try:
+        stored = await upload_sessions.assemble(session_id, key)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error assembling upload: {str(e)}")
+
+    paper_id = str(uuid.uuid4())
+    paper_data = {
+        "_id": paper_id,
+        "title": data.title,
+        "subject": data.subject,
+        "semester": data.semester,
+        "year": data.year,
+        "file_url": url_for_key(key),
+        "file_size": stored["size"],
+        "file_sha256": stored["sha256"],
+        "uploaded_by": payload.get("sub"),
+        "created_at": datetime.utcnow(),
+    }
+    try:
+        with write_session(response) as session:
+            db.papers.insert_one(paper_data, session=session)
+    except Exception as e:
+        await loop.run_in_executor(None, storage.delete, key)
+        # The staged chunks are still there: let the client retry /complete
+        await loop.run_in_executor(None, upload_sessions.reopen, session_id)
+        raise HTTPException(status_code=500, detail=f"Error uploading paper: {str(e)}")
+    await loop.run_in_executor(None, upload_sessions.discard, session_id)
+
+    paper_data["id"] = paper_data.pop("_id")
+    return {
+        "success": True,
+        "message": "Paper uploaded successfully",
+        "paper": paper_data
+    }
+
+
+@router.delete("/upload-sessions/{session_id}")
+async def abort_upload_session(session_id: str, request: Request):
+    """Abandon an upload session and drop its chunks (Admin only)"""
+    verify_admin(request)
+    await asyncio.get_running_loop().run_in_executor(None, upload_sessions.discard, session_id)
+    return {"success": True, "message": "Upload session discarded"}
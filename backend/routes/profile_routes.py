@@ -0,0 +1,159 @@
+# routes/profile_routes.py
+import asyncio
+import base64
+import binascii
+
+from fastapi import APIRouter, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import RedirectResponse, Response
+from jose import JWTError, jwt
+
+from config import JWT_SECRET_KEY, JWT_ALGORITHM, PHOTO_MAX_MB
+from database import db, read_db
+from utils.jobs import job_queue
+from utils.photos import media_type, photo_key, photo_processor
+from utils.storage import storage
+
+# Mounted at /api/profile
+router = APIRouter()
+# Mounted at /api/photos - outside /api/profile, whose responses are never cached
+photos_router = APIRouter()
+
+# Variant names are content hashes, so a URL never changes meaning
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+PHOTO_FIELDS = {"profile_photo": 1, "profile_photo_variants": 1}
+
+
+def require_user(request: Request) -> str:
+    """
+    Email of the signed-in user, from the Authorization header
+    """
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Token missing or invalid")
+    try:
+        payload = jwt.decode(auth_header.split(" ")[1], JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return payload.get("sub")
+
+
+def pick_variant(variants: list, size: int) -> dict:
+    """
+    The smallest variant at least `size` pixels wide, else the largest there is
+    """
+    fitting = [v for v in variants if v["size"] >= size]
+    return min(fitting, key=lambda v: v["size"]) if fitting else max(variants, key=lambda v: v["size"])
+
+
+def replaced_urls(old: dict | None, keep: list) -> list:
+    kept = {v["url"] for v in keep}
+    return [v["url"] for v in (old or {}).get("profile_photo_variants") or [] if v["url"] not in kept]
+
+
+# ========================
+# Upload / remove
+# ========================
+@router.post("/photo")
+async def upload_photo(request: Request, file: UploadFile = File(...)):
+    """Set the signed-in user's photo: resized to every variant size and re-encoded"""
+    email = require_user(request)
+    limit = PHOTO_MAX_MB * 1024 * 1024
+    data = await file.read(limit + 1)
+    if len(data) > limit:
+        raise HTTPException(status_code=413, detail=f"Photos are limited to {PHOTO_MAX_MB} MB")
+    if not data:
+        raise HTTPException(status_code=400, detail="Empty file")
+
+    try:
+        variants = await photo_processor.process(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Listings use the smallest variant; the profile page the one nearest 256px
+    photo = pick_variant(variants, 256)["url"]
+    old = await asyncio.get_running_loop().run_in_executor(None, lambda: db.users.find_one_and_update(
+        {"email": email},
+        {"$set": {
+            "profile_photo": photo,
+            "profile_photo_thumb": variants[-1]["url"],
+            "profile_photo_variants": variants,
+        }},
+        projection=PHOTO_FIELDS,
+    ))
+    if old is None:
+        job_queue.enqueue("delete_profile_photos", {"urls": [v["url"] for v in variants]})
+        raise HTTPException(status_code=404, detail="User not found")
+    stale = replaced_urls(old, variants)
+    if stale:
+        job_queue.enqueue("delete_profile_photos", {"urls": stale})
+
+    return {"success": True, "file_path": photo, "variants": variants}
+
+
+@router.delete("/photo")
+async def remove_photo(request: Request):
+    """Remove the signed-in user's photo"""
+    email = require_user(request)
+    old = await asyncio.get_running_loop().run_in_executor(None, lambda: db.users.find_one_and_update(
+        {"email": email},
+        {"$set": {"profile_photo": None}, "$unset": {"profile_photo_thumb": "", "profile_photo_variants": ""}},
+        projection=PHOTO_FIELDS,
+    ))
+    if old is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    stale = replaced_urls(old, [])
+    if stale:
+        job_queue.enqueue("delete_profile_photos", {"urls": stale})
+    return {"success": True, "message": "Profile photo removed"}
+
+
+# ========================
+# A user's photo
+# ========================
+@router.get("/photo/{user_id}")
+async def get_user_photo(user_id: str, size: int = Query(256, ge=1, le=4096)):
+    """Redirect to the user's photo variant that best fits `size` pixels"""
+    user = read_db.users.find_one({"_id": user_id}, PHOTO_FIELDS)
+    if not user or not user.get("profile_photo"):
+        raise HTTPException(status_code=404, detail="No profile photo")
+
+    variants = user.get("profile_photo_variants")
+    if variants:
+        return RedirectResponse(pick_variant(variants, size)["url"], status_code=307)
+
+    # Photos saved before variants existed were stored as data URLs. Only
+    # raster images are relayed (SVG can carry script), and nothing else -
+    # e.g. an arbitrary link - is followed
+    photo = user["profile_photo"]
+    if not photo.startswith("data:"):
+        raise HTTPException(status_code=404, detail="No profile photo")
+    header, _, encoded = photo.partition(",")
+    content_type = header[5:].split(";")[0].strip().lower()
+    if not content_type.startswith("image/") or content_type == "image/svg+xml":
+        raise HTTPException(status_code=404, detail="No profile photo")
+    try:
+        content = base64.b64decode(encoded)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=404, detail="No profile photo")
+    return Response(content, media_type=content_type, headers={"X-Content-Type-Options": "nosniff"})
+
+
+# ========================
+# Variant files
+# ========================
+@photos_router.get("/{name}")
+async def get_photo(name: str):
+    key = photo_key(name)
+    if key is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    # Variants are a few KB, so they are relayed even from object storage:
+    # presigned URLs change on every request and would defeat caching
+    content = await asyncio.get_running_loop().run_in_executor(None, storage.read, key)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    return Response(
+        content,
+        media_type=media_type(name),
+        headers={"Cache-Control": IMMUTABLE_CACHE, "ETag": f'"{name.split(".")[0]}"'},
+    )
@@ -1,18 +1,19 @@
 # routes/stats.py
 from fastapi import APIRouter
-from config import db
+from database import read_db
 from bson import ObjectId
 
 router = APIRouter()
 
+# Public-safe profile fields only; the password hash never leaves the database
+RECENT_USER_PROJECTION = {"name": 1, "email": 1, "course": 1, "semester": 1, "profile_photo_thumb": 1, "created_at": 1}
+
 @router.get("/")
 async def get_stats():
-    total_users = db.users.count_documents({})
-    recent_users_cursor = db.users.find().sort("created_at", -1).limit(5)
+    total_users = read_db.users.count_documents({})
+    recent_users_cursor = read_db.users.find({}, RECENT_USER_PROJECTION).sort("created_at", -1).limit(5)
     recent_users = []
     for u in recent_users_cursor:
         u["_id"] = str(u["_id"])
-        # avoid returning password
-        u.pop("password", None)
         recent_users.append(u)
     return {"total_users": total_users, "recent_users": recent_users}
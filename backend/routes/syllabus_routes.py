@@ -1,12 +1,17 @@
-from fastapi import APIRouter, HTTPException, Request, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, Depends, Query
 from jose import jwt, JWTError
-from config import db, JWT_SECRET_KEY, JWT_ALGORITHM
+from config import JWT_SECRET_KEY, JWT_ALGORITHM
+from database import db, read_db, read_session, write_session
+from utils.projections import build_projection, rename_ids
+from utils.file_serving import FILE_PROJECTION, discard_resource_file, serve_resource_file
+from middleware.compression import mark_shared
+from routes.catalog_routes import CATALOG_WRITE
 from datetime import datetime
 from pydantic import BaseModel
 from typing import Optional
 import uuid
 
-# Remove prefix - let server.py handle it via auto_include_routers
+# Remove prefix - server.py mounts it via the router registry
 router = APIRouter()
 
 
@@ -25,6 +30,13 @@ class SyllabusUpdate(BaseModel):
     file_url: Optional[str] = None
 
 
+# Fields a client may request with ?fields=
+SYLLABUS_FIELDS = {"title", "description", "branch", "semester", "year", "file_url", "tags", "download_count", "created_at", "updated_at"}
+
+# Lean default projection: uploaded_by is internal and never returned
+SYLLABUS_DEFAULT_PROJECTION = {"uploaded_by": 0}
+
+
 # Admin Verification via Authorization Header
 def verify_admin(request: Request):
     auth_header = request.headers.get("Authorization")
@@ -47,23 +59,54 @@ def verify_admin(request: Request):
 
 # ---------------- GET All Syllabus ----------------
 @router.get("/")
-async def get_all_syllabus():
+async def get_all_syllabus(request: Request, response: Response, fields: Optional[str] = Query(None, description="Comma-separated fields to return")):
     """Fetch all syllabus from the database"""
+    projection = build_projection(fields, SYLLABUS_FIELDS, SYLLABUS_DEFAULT_PROJECTION)
     try:
-        syllabus = list(db.syllabus.find({}))
+        with read_session(request) as session:
+            syllabus = list(read_db.syllabus.find({}, projection, session=session))
         # Convert _id to id for consistency
-        for syl in syllabus:
-            if "_id" in syl:
-                syl["id"] = syl["_id"]
-                del syl["_id"]
+        rename_ids(syllabus)
+        if not fields:
+            mark_shared(response)
         return {"success": True, "syllabus": syllabus, "count": len(syllabus)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching syllabus: {str(e)}")
 
 
+# ---------------- GET Single Syllabus ----------------
+@router.get("/{syllabus_id}")
+async def get_syllabus(syllabus_id: str, request: Request, fields: Optional[str] = Query(None, description="Comma-separated fields to return")):
+    """Fetch a single syllabus by ID"""
+    projection = build_projection(fields, SYLLABUS_FIELDS, SYLLABUS_DEFAULT_PROJECTION)
+    with read_session(request) as session:
+        syllabus_doc = read_db.syllabus.find_one({"_id": syllabus_id}, projection, session=session)
+    if not syllabus_doc:
+        raise HTTPException(status_code=404, detail="Syllabus not found")
+    syllabus_doc["id"] = syllabus_doc.pop("_id")
+    return {"success": True, "syllabus": syllabus_doc}
+
+
+# ---------------- GET Download / View Syllabus ----------------
+@router.get("/{syllabus_id}/download")
+async def download_syllabus(syllabus_id: str, request: Request):
+    """Download a syllabus file (counts towards download_count)"""
+    with read_session(request) as session:
+        syllabus_doc = read_db.syllabus.find_one({"_id": syllabus_id}, FILE_PROJECTION, session=session)
+    return await serve_resource_file(request, "syllabus", syllabus_doc, attachment=True)
+
+
+@router.get("/{syllabus_id}/view")
+async def view_syllabus(syllabus_id: str, request: Request):
+    """Open a syllabus file inline in the browser"""
+    with read_session(request) as session:
+        syllabus_doc = read_db.syllabus.find_one({"_id": syllabus_id}, FILE_PROJECTION, session=session)
+    return await serve_resource_file(request, "syllabus", syllabus_doc, attachment=False)
+
+
 # ---------------- POST Add New Syllabus ----------------
-@router.post("/")
-async def add_syllabus(syllabus: SyllabusCreate, request: Request):
+@router.post("/", dependencies=CATALOG_WRITE)
+async def add_syllabus(syllabus: SyllabusCreate, request: Request, response: Response):
     """Add a new syllabus (Admin only)"""
     verify_admin(request)
     
@@ -79,7 +122,8 @@ async def add_syllabus(syllabus: SyllabusCreate, request: Request):
             "created_at": datetime.utcnow(),
         }
         
-        db.syllabus.insert_one(syllabus_data)
+        with write_session(response) as session:
+            db.syllabus.insert_one(syllabus_data, session=session)
         
         # Return with id instead of _id
         syllabus_data["id"] = syllabus_data["_id"]
@@ -95,8 +139,8 @@ async def add_syllabus(syllabus: SyllabusCreate, request: Request):
 
 
 # ---------------- PUT Update Syllabus ----------------
-@router.put("/{syllabus_id}")
-async def update_syllabus(syllabus_id: str, syllabus: SyllabusUpdate, request: Request):
+@router.put("/{syllabus_id}", dependencies=CATALOG_WRITE)
+async def update_syllabus(syllabus_id: str, syllabus: SyllabusUpdate, request: Request, response: Response):
     """Update an existing syllabus by ID (Admin only)"""
     verify_admin(request)
     
@@ -115,7 +159,8 @@ async def update_syllabus(syllabus_id: str, syllabus: SyllabusUpdate, request: R
         update_data["updated_at"] = datetime.utcnow()
         
         # Update the syllabus
-        result = db.syllabus.update_one({"_id": syllabus_id}, {"$set": update_data})
+        with write_session(response) as session:
+            result = db.syllabus.update_one({"_id": syllabus_id}, {"$set": update_data}, session=session)
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Syllabus not found")
@@ -138,8 +183,8 @@ async def update_syllabus(syllabus_id: str, syllabus: SyllabusUpdate, request: R
 
 
 # ---------------- DELETE Syllabus ----------------
-@router.delete("/{syllabus_id}")
-async def delete_syllabus(syllabus_id: str, request: Request):
+@router.delete("/{syllabus_id}", dependencies=CATALOG_WRITE)
+async def delete_syllabus(syllabus_id: str, request: Request, response: Response):
     """Delete a syllabus by ID (Admin only)"""
     verify_admin(request)
     
@@ -150,11 +195,15 @@ async def delete_syllabus(syllabus_id: str, request: Request):
             raise HTTPException(status_code=404, detail="Syllabus not found")
         
         # Delete from database
-        result = db.syllabus.delete_one({"_id": syllabus_id})
+        with write_session(response) as session:
+            result = db.syllabus.delete_one({"_id": syllabus_id}, session=session)
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Syllabus not found")
         
+        # Remove the uploaded file in the background
+        discard_resource_file(syllabus)
+        
         return {
             "success": True,
             "message": "Syllabus deleted successfully"
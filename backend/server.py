@@ -1,39 +1,55 @@
 # ============================================================
-# ✅ STEP 1: Load environment variables BEFORE anything else
+# ✅ STEP 1: Imports
 # ============================================================
+# Environment variables are loaded once, by config.py.
+# Nothing in this module may touch the network at import time - connections
+# are opened per worker in the lifespan below.
 import os
-from pathlib import Path
-from dotenv import load_dotenv
-
-dotenv_path = Path(__file__).resolve().parent / ".env"
-print(f"🔍 Loading .env from: {dotenv_path}")
-load_dotenv(dotenv_path)
-
-# ============================================================
-# ✅ STEP 2: Imports
-# ============================================================
-import uuid
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from passlib.context import CryptContext
 from jose import JWTError, jwt
-from pydantic import BaseModel, EmailStr
-import importlib
-import pkgutil
 
 # ✅ Central Config
 from config import (
-    db,
     JWT_SECRET_KEY,
     JWT_ALGORITHM,
     ACCESS_TOKEN_EXPIRE_MINUTES,
     ALLOWED_ORIGINS,
+    LOG_SAMPLE_RATE,
+    LOG_SAMPLE_MIN_RATE,
+    LOG_SAMPLE_TARGET_PER_SEC,
+    LOG_SUMMARY_INTERVAL_SECONDS,
+    WORKER_THREADS,
+    COMPRESSION_MIN_SIZE,
+    COMPRESSION_OFFLOAD_SIZE,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_BROTLI_QUALITY,
+    COMPRESSION_CACHE_MAX_BYTES,
 )
-
-# ============================================================
-# ✅ STEP 3: Logging Setup
+import database
+from database import db
+from app_logging.sampling import RequestLogSampler
+from middleware.logging_middleware import RequestLoggingMiddleware
+from middleware.compression import CompressionMiddleware, CompressedPayloadCache
+from middleware.profiling import ProfilingMiddleware
+from middleware.request_context import RequestContextMiddleware
+from utils import metrics
+from utils.catalog_snapshot import catalog_snapshots
+from utils.download_events import download_events
+from utils.trending import trending
+from utils.upload_sessions import upload_sessions
+from utils.jobs import job_queue
+from utils.photos import photo_processor
+from utils.profiling import request_profiler
+from utils.projections import build_projection
+
+# ============================================================
+# ✅ STEP 2: Logging Setup
 # ============================================================
 LOG_DIR = os.path.join(os.getcwd(), "app_logging", "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -46,10 +62,8 @@ logger = logging.getLogger(__name__)
 logger.info("✅ Logging initialized")
 
 # ============================================================
-# ✅ STEP 4: Password Hashing & JWT
+# ✅ STEP 3: JWT
 # ============================================================
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     """Generate JWT token"""
     to_encode = data.copy()
@@ -66,9 +80,49 @@ def verify_token(token: str):
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
 # ============================================================
-# ✅ STEP 5: FastAPI App Initialization
-# ============================================================
-app = FastAPI(title="EduResources API")
+# ✅ STEP 4: FastAPI App Initialization
+# ============================================================
+# Per-worker resources are created here rather than at import time so the
+# app can be preloaded in a pre-fork master without sharing them across workers.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    database.connect()
+    executor = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="worker")
+    asyncio.get_running_loop().set_default_executor(executor)
+    app.state.executor = executor
+    await download_events.start()
+    await trending.start()
+    await job_queue.start()
+    await upload_sessions.start()
+    await request_profiler.start()
+    await request_log_sampler.start()
+    # Build the catalog snapshot in the background if this host has none yet
+    await catalog_snapshots.ensure_current()
+    logger.info(f"✅ Worker {os.getpid()} started")
+    try:
+        yield
+    finally:
+        await request_log_sampler.close()
+        # Let running jobs finish (or hand them back) while Mongo is still reachable
+        await job_queue.close()
+        # Drain buffered download events before the executor and client go away
+        await download_events.close()
+        await trending.close()
+        await upload_sessions.close()
+        await request_profiler.close()
+        photo_processor.close()
+        await catalog_snapshots.flush()
+        executor.shutdown(wait=True)
+        database.close()
+        logger.info(f"👋 Worker {os.getpid()} stopped")
+
+
+app = FastAPI(title="EduResources API", lifespan=lifespan)
+
+# Innermost, so profiles cover routing and the handler (added first = runs last)
+app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+# Lets the slow query log attribute Mongo commands to routes
+app.add_middleware(RequestContextMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -76,90 +130,48 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Resumable upload clients read where to continue from
+    expose_headers=["Upload-Offset"],
 )
 
-# ============================================================
-# ✅ STEP 6: Pydantic Models
-# ============================================================
-class UserRegister(BaseModel):
-    name: str
-    email: EmailStr
-    password: str
-    usn: str | None = None
-    course: str | None = None
-    semester: str | None = None
+# Compression sits inside request logging so logged sizes are bytes on the wire
+compressed_payload_cache = CompressedPayloadCache(COMPRESSION_CACHE_MAX_BYTES)
+metrics.register("compression_cache", compressed_payload_cache.stats)
+metrics.register("download_events", download_events.snapshot)
+metrics.register("trending", trending.snapshot)
+metrics.register("jobs", job_queue.snapshot)
+metrics.register("upload_sessions", upload_sessions.snapshot)
+metrics.register("photos", photo_processor.snapshot)
+download_events.subscribe(trending.record)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MIN_SIZE,
+    offload_size=COMPRESSION_OFFLOAD_SIZE,
+    gzip_level=COMPRESSION_GZIP_LEVEL,
+    brotli_quality=COMPRESSION_BROTLI_QUALITY,
+    cache=compressed_payload_cache,
+)
 
-class UserLogin(BaseModel):
-    email: EmailStr
-    password: str
+# Successful requests are sampled; errors and security events are always logged
+request_log_sampler = RequestLogSampler(
+    sample_rate=LOG_SAMPLE_RATE,
+    min_rate=LOG_SAMPLE_MIN_RATE,
+    target_per_second=LOG_SAMPLE_TARGET_PER_SEC,
+    summary_interval=LOG_SUMMARY_INTERVAL_SECONDS,
+)
+app.add_middleware(RequestLoggingMiddleware, sampler=request_log_sampler)
 
 # ============================================================
-# ✅ STEP 7: Auth Routes
+# ✅ STEP 5: Profile Route
 # ============================================================
-@app.post("/api/auth/register")
-async def register(user: UserRegister):
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not connected")
-
-    users_collection = db.users
-    existing_user = users_collection.find_one({"email": user.email})
-    if existing_user:
-        raise HTTPException(status_code=400, detail="User already exists")
-
-    hashed_password = pwd_context.hash(user.password)
-    user_id = str(uuid.uuid4())
-
-    user_doc = {
-        "_id": user_id,
-        "name": user.name,
-        "email": user.email,
-        "password": hashed_password,
-        "usn": user.usn,
-        "course": user.course,
-        "semester": user.semester,
-        "is_admin": users_collection.count_documents({}) == 0,  # first user = admin
-        "created_at": datetime.utcnow(),
-    }
-
-    users_collection.insert_one(user_doc)
-    logger.info(f"👤 New user registered: {user.email}")
-
-    token = create_access_token({"sub": user.email, "is_admin": user_doc["is_admin"]})
-    return {"message": "User registered successfully", "token": token, "user_id": user_id}
-
-
-@app.post("/api/auth/login")
-async def login(user: UserLogin):
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not connected")
-
-    users_collection = db.users
-    existing_user = users_collection.find_one({"email": user.email})
-
-    if not existing_user or not pwd_context.verify(user.password, existing_user["password"]):
-        raise HTTPException(status_code=401, detail="Invalid credentials")
-
-    is_admin = existing_user.get("is_admin", False)
-    token = create_access_token({"sub": user.email, "is_admin": is_admin})
-
-    logger.info(f"✅ User logged in: {user.email} | Admin: {is_admin}")
-
-    return {
-        "message": "Login successful",
-        "token": token,
-        "user": {
-            "name": existing_user["name"],
-            "email": existing_user["email"],
-            "usn": existing_user.get("usn"),
-            "course": existing_user.get("course"),
-            "semester": existing_user.get("semester"),
-            "is_admin": is_admin,
-        },
-    }
+PROFILE_FIELDS = {
+    "name", "email", "usn", "course", "semester", "is_admin", "role",
+    "verified", "profile_photo", "profile_photo_thumb", "profile_photo_variants", "created_at", "verified_at",
+}
 
 
 @app.get("/api/profile")
-async def profile(request: Request):
+async def profile(request: Request, fields: str | None = Query(None, description="Comma-separated fields to return")):
     token = request.headers.get("Authorization")
     if not token or not token.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Token missing or invalid")
@@ -167,39 +179,48 @@ async def profile(request: Request):
     payload = verify_token(token.split(" ")[1])
     email = payload.get("sub")
 
-    user = db.users.find_one({"email": email}, {"password": 0})
+    projection = build_projection(fields, PROFILE_FIELDS, {"password": 0})
+    user = db.users.find_one({"email": email}, projection)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     return user
 
 # ============================================================
-# ✅ STEP 8: Auto-Import All Routers from /routes
+# ✅ STEP 6: Router Registry
 # ============================================================
-import routes
+# Routers are listed explicitly (rather than discovered) so startup only
+# imports what is served and no module can register routes by accident.
+# Catalog create/update/delete handlers declare CATALOG_WRITE themselves, so
+# only they rebuild the catalog snapshot afterwards.
+from routes import admin_routes, auth, catalog_routes, notes_routes, papers_routes, profile_routes, stats, syllabus_routes
 
-def auto_include_routers(app):
-    """Automatically include all routers from the 'routes' package."""
-    for _, module_name, _ in pkgutil.iter_modules(routes.__path__):
-        module = importlib.import_module(f"routes.{module_name}")
-        if hasattr(module, "router"):
-            prefix = f"/api/{module_name.replace('_routes', '')}"
-            tag = module_name.replace("_routes", "").capitalize()
-            app.include_router(module.router, prefix=prefix, tags=[tag])
-            logger.info(f"✅ Router loaded: {module_name} -> {prefix}")
+ROUTERS = [
+    (auth.router, "/api/auth", "Auth"),
+    (admin_routes.router, "/api/admin", "Admin"),
+    (notes_routes.router, "/api/notes", "Notes"),
+    (papers_routes.router, "/api/papers", "Papers"),
+    (syllabus_routes.router, "/api/syllabus", "Syllabus"),
+    (catalog_routes.router, "/api/catalog", "Catalog"),
+    (profile_routes.router, "/api/profile", "Profile"),
+    (profile_routes.photos_router, "/api/photos", "Profile"),
+    (stats.router, "/api/stats", "Stats"),
+]
 
-auto_include_routers(app)
+for router, prefix, tag in ROUTERS:
+    app.include_router(router, prefix=prefix, tags=[tag])
 
 # ============================================================
-# ✅ STEP 9: Root Endpoint
+# ✅ STEP 7: Root Endpoint
 # ============================================================
 @app.get("/")
 async def root():
     return {"message": "🚀 EduResources Backend Running Successfully!"}
 
 # ============================================================
-# ✅ STEP 10: Run Server
+# ✅ STEP 8: Run Server
 # ============================================================
+# Development only - production runs under gunicorn (see gunicorn.conf.py)
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("server:app", host="0.0.0.0", port=8000, reload=True)
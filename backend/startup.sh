@@ -19,26 +19,11 @@ for i in {1..30}; do
     sleep 1
 done
 
-# CRITICAL: Auto-restore data if database is empty
+# CRITICAL: Auto-restore any collection that is missing or empty
+# (parallel, verified against the backup manifest - see restore.py)
 echo "📦 Checking data integrity..."
-TOTAL_RECORDS=$(mongosh academic_resources --quiet --eval "db.users.countDocuments() + db.papers.countDocuments() + db.notes.countDocuments() + db.syllabus.countDocuments()" 2>/dev/null || echo "0")
-
-if [ "$TOTAL_RECORDS" = "0" ] || [ -z "$TOTAL_RECORDS" ]; then
-    echo "⚠️  DATABASE IS EMPTY! Auto-restoring from latest backup..."
-    
-    LATEST_BACKUP=$(ls -td /app/backups/backup_* 2>/dev/null | head -1)
-    if [ -n "$LATEST_BACKUP" ] && [ -d "$LATEST_BACKUP/academic_resources" ]; then
-        echo "📦 Restoring from: $LATEST_BACKUP"
-        mongorestore --db academic_resources "$LATEST_BACKUP/academic_resources" --drop --quiet 2>&1 | grep -v "deprecated" || true
-        
-        RESTORED_RECORDS=$(mongosh academic_resources --quiet --eval "db.users.countDocuments() + db.papers.countDocuments() + db.notes.countDocuments() + db.syllabus.countDocuments()" 2>/dev/null)
-        echo "✅ RESTORATION COMPLETE! Restored $RESTORED_RECORDS records"
-    else
-        echo "⚠️  No backup found to restore from"
-    fi
-else
-    echo "✅ Database has $TOTAL_RECORDS records - all good!"
-fi
+cd /app/backend
+/root/.venv/bin/python restore.py --missing-only || echo "⚠️  Auto-restore incomplete - see the output above"
 
 # Initialize database with admin user (only if needed)
 echo "👤 Checking admin user..."
@@ -57,4 +42,4 @@ mongosh academic_resources --quiet --eval "printjson({users: db.users.countDocum
 
 # Start the FastAPI server
 echo "🌐 Starting FastAPI server..."
-exec /root/.venv/bin/uvicorn server:app --host 0.0.0.0 --port 8001 --workers 1 --reload
+exec /root/.venv/bin/gunicorn server:app -c gunicorn.conf.py
@@ -22,7 +22,8 @@ done
 
 # Restore data if needed
 echo "📦 Checking data integrity..."
-/app/scripts/auto_restore.sh
+cd /app/backend
+/root/.venv/bin/python restore.py --missing-only || echo "⚠️  Auto-restore incomplete - see the output above"
 
 # Initialize database with admin
 echo "👤 Ensuring admin user exists..."
@@ -35,4 +36,4 @@ echo "🛡️  Starting continuous backup system..."
 
 # Start FastAPI server
 echo "🌐 Starting FastAPI server..."
-exec /root/.venv/bin/uvicorn server:app --host 0.0.0.0 --port 8001 --workers 1 --reload
+exec /root/.venv/bin/gunicorn server:app -c gunicorn.conf.py
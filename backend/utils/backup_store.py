@@ -0,0 +1,283 @@
+"""
+Backup Store
+On-disk format shared by backup.py and restore.py: zlib-compressed,
+content-addressed chunks of raw BSON plus one JSON manifest per restore point
+
+    <root>/chunks/ab/ab12...ef.z     sha256 of the uncompressed chunk
+    <root>/manifests/<id>.json       one per restore point (full or incremental)
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import os
+import threading
+import zlib
+from datetime import datetime, timedelta
+
+import bson
+from bson import json_util
+from bson.binary import Binary
+from bson.raw_bson import RawBSONDocument
+
+# Chunk boundaries are chosen from each record's _id, so inserting or changing
+# one document only changes the chunk it falls in and every other chunk dedupes
+CHUNK_TARGET_RECORDS = 512
+CHUNK_MAX_BYTES = 4 * 1024 * 1024
+COMPRESSION_LEVEL = 6
+
+
+class BackupIntegrityError(Exception):
+    pass
+
+
+def id_key(doc_id) -> bytes:
+    """
+    A document's _id as the BSON document {"_id": ...}: hashable, ordered like Mongo and reusable as a record
+    """
+    return bson.encode({"_id": doc_id})
+
+
+def doc_hash(raw: bytes) -> bytes:
+    return hashlib.blake2b(raw, digest_size=16).digest()
+
+
+def collection_checksum(hashes) -> str:
+    """
+    Order-independent checksum of a collection: the sum of its document hashes
+    """
+    return format(sum(int.from_bytes(h, "big") for h in hashes) % (1 << 128), "032x")
+
+
+def index_record(key: bytes, h: bytes) -> bytes:
+    return bson.encode({"_id": bson.decode(key)["_id"], "h": Binary(h)})
+
+
+def iter_records(data: bytes):
+    """
+    Split concatenated BSON documents without decoding them
+    """
+    pos = 0
+    while pos < len(data):
+        size = int.from_bytes(data[pos:pos + 4], "little")
+        yield data[pos:pos + size]
+        pos += size
+
+
+class ChunkWriter:
+    """
+    Groups a stream of (key, record) pairs into content-defined chunks in a store
+    """
+
+    def __init__(self, store: "BackupStore"):
+        self.store = store
+        self.refs = []
+        self._records = []
+        self._bytes = 0
+
+    def add(self, key: bytes, record: bytes):
+        self._records.append(record)
+        self._bytes += len(record)
+        if zlib.crc32(key) % CHUNK_TARGET_RECORDS == 0 or self._bytes >= CHUNK_MAX_BYTES:
+            self.flush()
+
+    def flush(self):
+        if not self._records:
+            return
+        data = b"".join(self._records)
+        self.refs.append({"sha256": self.store.put(data), "records": len(self._records), "bytes": len(data)})
+        self._records, self._bytes = [], 0
+
+    def close(self) -> list:
+        self.flush()
+        return self.refs
+
+
+class BackupStore:
+    def __init__(self, root: str):
+        self.root = root
+        self.chunks_dir = os.path.join(root, "chunks")
+        self.manifests_dir = os.path.join(root, "manifests")
+        self._lock = threading.Lock()
+        self.written_chunks = 0
+        self.written_bytes = 0
+        self.reused_chunks = 0
+
+    @contextlib.contextmanager
+    def lock(self):
+        """
+        Exclusive lock on the store, so pruning never removes chunks a running backup just wrote
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, ".lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ---------------- Chunks ----------------
+    def _chunk_path(self, sha: str) -> str:
+        return os.path.join(self.chunks_dir, sha[:2], f"{sha}.z")
+
+    def put(self, data: bytes) -> str:
+        sha = hashlib.sha256(data).hexdigest()
+        path = self._chunk_path(sha)
+        if os.path.exists(path):
+            with self._lock:
+                self.reused_chunks += 1
+            return sha
+        compressed = zlib.compress(data, COMPRESSION_LEVEL)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp, path)
+        with self._lock:
+            self.written_chunks += 1
+            self.written_bytes += len(compressed)
+        return sha
+
+    def get(self, sha: str) -> bytes:
+        try:
+            with open(self._chunk_path(sha), "rb") as f:
+                data = zlib.decompress(f.read())
+        except FileNotFoundError:
+            raise BackupIntegrityError(f"chunk {sha} is missing")
+        except zlib.error as e:
+            raise BackupIntegrityError(f"chunk {sha} is corrupt: {e}")
+        if hashlib.sha256(data).hexdigest() != sha:
+            raise BackupIntegrityError(f"chunk {sha} does not match its checksum")
+        return data
+
+    def records(self, refs: list):
+        for ref in refs:
+            yield from iter_records(self.get(ref["sha256"]))
+
+    def load_index(self, refs: list) -> dict:
+        """
+        {id key: document hash} from a collection's index chunks
+        """
+        index = {}
+        for record in self.records(refs):
+            entry = bson.decode(record)
+            index[id_key(entry["_id"])] = bytes(entry["h"])
+        return index
+
+    def documents(self, chain: list, name: str):
+        """
+        Yield (raw document, hash) for collection `name` as of the last restore
+        point in `chain`, checking every document against that point's index
+        """
+        entry = chain[-1]["collections"][name]
+        remaining = self.load_index(entry["index"])
+        # Newest first: the first version of a document found is its latest
+        for manifest in reversed(chain):
+            part = manifest["collections"].get(name)
+            if part is None:
+                continue
+            for record in self.records(part["docs"]):
+                key = id_key(RawBSONDocument(record)["_id"])
+                expected = remaining.pop(key, None)
+                if expected is None:
+                    continue  # superseded by a newer version, or deleted later
+                h = doc_hash(record)
+                if h != expected:
+                    raise BackupIntegrityError(f"{name}: document does not match its recorded hash")
+                yield record, h
+            if not remaining:
+                return
+        if remaining:
+            raise BackupIntegrityError(f"{name}: {len(remaining)} documents missing from the backup chain")
+
+    # ---------------- Manifests ----------------
+    def save_manifest(self, manifest: dict):
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        path = os.path.join(self.manifests_dir, f"{manifest['id']}.json")
+        with open(path + ".tmp", "w") as f:
+            f.write(json_util.dumps(manifest, indent=2))
+        os.replace(path + ".tmp", path)
+
+    def load_manifest(self, manifest_id: str) -> dict:
+        with open(os.path.join(self.manifests_dir, f"{manifest_id}.json")) as f:
+            return json_util.loads(f.read())
+
+    def manifests(self) -> list:
+        """
+        Every restore point, oldest first
+        """
+        if not os.path.isdir(self.manifests_dir):
+            return []
+        ids = sorted(name[:-5] for name in os.listdir(self.manifests_dir) if name.endswith(".json"))
+        return [self.load_manifest(manifest_id) for manifest_id in ids]
+
+    def chain(self, manifest_id: str) -> list:
+        """
+        The full base and each incremental leading to `manifest_id`, oldest first
+        """
+        chain = [self.load_manifest(manifest_id)]
+        while chain[0]["parent"]:
+            chain.insert(0, self.load_manifest(chain[0]["parent"]))
+        return chain
+
+    # ---------------- Retention ----------------
+    def prune(self, keep_hourly: int, keep_daily: int, keep_weekly: int, dry_run: bool = False) -> dict:
+        """
+        Keep the newest restore point in each of the last `keep_hourly` hours,
+        `keep_daily` days and `keep_weekly` weeks that have one (plus the chains
+        they need), then delete unreferenced manifests and chunks
+        """
+        manifests = self.manifests()
+        if not manifests:
+            return {"kept": [], "removed": [], "chunks_removed": 0}
+        by_id = {m["id"]: m for m in manifests}
+
+        keep = {manifests[-1]["id"]}
+        for count, bucket in (
+            (keep_hourly, lambda t: t.strftime("%Y%m%d%H")),
+            (keep_daily, lambda t: t.strftime("%Y%m%d")),
+            (keep_weekly, lambda t: t.strftime("%G%V")),
+        ):
+            seen = []
+            for m in reversed(manifests):
+                b = bucket(m["created_at"])
+                if b not in seen:
+                    if len(seen) == count:
+                        break
+                    seen.append(b)
+                    keep.add(m["id"])
+
+        # A restore point needs its base and every incremental before it
+        for manifest_id in list(keep):
+            while by_id[manifest_id]["parent"]:
+                manifest_id = by_id[manifest_id]["parent"]
+                keep.add(manifest_id)
+
+        removed = [m["id"] for m in manifests if m["id"] not in keep]
+        referenced = {
+            ref["sha256"]
+            for manifest_id in keep
+            for entry in by_id[manifest_id]["collections"].values()
+            for part in ("docs", "index", "deletes")
+            for ref in entry.get(part, [])
+        }
+        chunks_removed = 0
+        if not dry_run:
+            for manifest_id in removed:
+                os.remove(os.path.join(self.manifests_dir, f"{manifest_id}.json"))
+        for dirpath, _, filenames in os.walk(self.chunks_dir):
+            for name in filenames:
+                if name.endswith(".z") and name[:-2] not in referenced:
+                    chunks_removed += 1
+                    if not dry_run:
+                        os.remove(os.path.join(dirpath, name))
+        return {"kept": sorted(keep), "removed": removed, "chunks_removed": chunks_removed}
+
+
+def new_manifest_id(kind: str, now: datetime | None = None) -> str:
+    return f"{(now or datetime.utcnow()):%Y%m%dT%H%M%S%fZ}-{kind}"
+
+
+def latest_full_age(manifests: list, now: datetime) -> timedelta | None:
+    fulls = [m for m in manifests if m["type"] == "full"]
+    return now - fulls[-1]["created_at"] if fulls else None
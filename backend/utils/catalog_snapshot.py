@@ -0,0 +1,217 @@
+"""
+Catalog Snapshots
+Debounced background builds of a compact, content-addressed, precompressed
+snapshot of the public catalog (notes, papers and syllabus metadata)
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from config import (
+    CATALOG_SNAPSHOT_DIR,
+    CATALOG_SNAPSHOT_DEBOUNCE_SECONDS,
+    CATALOG_SNAPSHOT_MAX_DELAY_SECONDS,
+    CATALOG_SNAPSHOT_KEEP,
+)
+from database import db
+
+try:
+    import brotli
+except ImportError:  # optional - gzip variant only without it
+    brotli = None
+
+logger = logging.getLogger("app.catalog")
+
+COLLECTIONS = ("notes", "papers", "syllabus")
+
+# Metadata only: internal fields, full note bodies and fast-moving counters stay
+# out of the snapshot so it only changes when the catalog does
+SNAPSHOT_PROJECTION = {"uploaded_by": 0, "content": 0, "download_count": 0}
+
+MANIFEST_ID = "current"
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class CatalogSnapshots:
+    """
+    Builds `catalog.<hash>.json` (+ .gz/.br) when content changes.
+
+    - `mark_dirty()` is called after catalog writes; builds are debounced by
+      `debounce` seconds so bursts of admin edits coalesce, but never delayed
+      more than `max_delay` seconds after the first edit
+    - The current version is recorded in the `catalog_snapshots` collection so
+      every worker serves the same manifest
+    """
+
+    def __init__(self, directory: str, debounce: float = 5.0, max_delay: float = 60.0, keep: int = 3):
+        self.directory = directory
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.keep = keep
+
+        self._timer = None
+        self._first_dirty = None
+        self._task = None
+        self._rerun = False
+        self._manifest = None
+        self._manifest_read_at = 0.0
+
+    # ---------------- Scheduling ----------------
+    def mark_dirty(self):
+        """
+        Schedule a rebuild on the running event loop (debounced)
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._first_dirty is None:
+            self._first_dirty = now
+        if self._timer is not None:
+            self._timer.cancel()
+        deadline = min(now + self.debounce, self._first_dirty + self.max_delay)
+        self._timer = loop.call_at(deadline, self._start_build)
+
+    def _start_build(self):
+        self._timer = None
+        self._first_dirty = None
+        if self._task is not None and not self._task.done():
+            # Edits landed mid-build; build again once it finishes
+            self._rerun = True
+            return
+        self._task = asyncio.ensure_future(self._build_in_executor())
+
+    async def _build_in_executor(self):
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.build)
+        except Exception:
+            logger.exception("Catalog snapshot build failed")
+        if self._rerun:
+            self._rerun = False
+            self._start_build()
+
+    async def ensure_current(self):
+        """
+        Schedule a build only if there is no manifest yet or this host lacks its
+        file (used on worker start; later rebuilds come from catalog writes)
+        """
+        manifest = await asyncio.get_running_loop().run_in_executor(None, self.manifest, 0)
+        if manifest is None or self.path_for(manifest["file"]) is None:
+            self.mark_dirty()
+
+    async def flush(self):
+        """
+        Run any pending build now and wait for it (used on shutdown)
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._start_build()
+        if self._task is not None:
+            await self._task
+
+    # ---------------- Building ----------------
+    def build(self) -> dict:
+        """
+        Build the snapshot from the primary and publish it; returns the manifest
+        """
+        started = time.perf_counter()
+        catalog = {}
+        for name in COLLECTIONS:
+            docs = []
+            for doc in db[name].find({}, SNAPSHOT_PROJECTION).sort("_id", 1):
+                doc["id"] = doc.pop("_id")
+                docs.append(doc)
+            catalog[name] = docs
+
+        body = json.dumps(catalog, separators=(",", ":"), sort_keys=True, default=_json_default).encode()
+        version = hashlib.sha256(body).hexdigest()[:16]
+        filename = f"catalog.{version}.json"
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, filename)
+        if not os.path.exists(path):
+            self._write_atomic(path + ".gz", gzip.compress(body, compresslevel=9, mtime=0))
+            if brotli is not None:
+                self._write_atomic(path + ".br", brotli.compress(body, quality=11))
+            # Plain file last: its presence means every variant is complete
+            self._write_atomic(path, body)
+
+        manifest = {
+            "version": version,
+            "file": filename,
+            "bytes": len(body),
+            "counts": {name: len(docs) for name, docs in catalog.items()},
+            "generated_at": datetime.utcnow(),
+        }
+        db.catalog_snapshots.replace_one({"_id": MANIFEST_ID}, manifest, upsert=True)
+        self._manifest = manifest
+        self._manifest_read_at = time.monotonic()
+        self._prune(keep_file=filename)
+
+        logger.info(
+            f"Catalog snapshot {version} built: {len(body)} bytes in {(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+        return manifest
+
+    def _write_atomic(self, path: str, data: bytes):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _prune(self, keep_file: str):
+        """
+        Delete all but the newest `keep` snapshots (old versions may still be cached by clients)
+        """
+        snapshots = sorted(
+            (f for f in os.listdir(self.directory) if f.startswith("catalog.") and f.endswith(".json")),
+            key=lambda f: os.path.getmtime(os.path.join(self.directory, f)),
+            reverse=True,
+        )
+        for stale in snapshots[self.keep:]:
+            if stale == keep_file:
+                continue
+            for suffix in ("", ".gz", ".br"):
+                try:
+                    os.remove(os.path.join(self.directory, stale + suffix))
+                except FileNotFoundError:
+                    pass
+
+    # ---------------- Serving ----------------
+    def manifest(self, max_age: float = 2.0) -> dict | None:
+        """
+        Current manifest, re-read from Mongo at most every `max_age` seconds
+        """
+        if self._manifest is None or time.monotonic() - self._manifest_read_at > max_age:
+            doc = db.catalog_snapshots.find_one({"_id": MANIFEST_ID})
+            if doc is not None:
+                doc.pop("_id", None)
+            self._manifest = doc
+            self._manifest_read_at = time.monotonic()
+        return self._manifest
+
+    def path_for(self, filename: str) -> str | None:
+        """
+        Local path of a published snapshot file, or None
+        """
+        if not (filename.startswith("catalog.") and filename.endswith(".json")) or "/" in filename or ".." in filename:
+            return None
+        path = os.path.join(self.directory, filename)
+        return path if os.path.exists(path) else None
+
+
+catalog_snapshots = CatalogSnapshots(
+    CATALOG_SNAPSHOT_DIR,
+    debounce=CATALOG_SNAPSHOT_DEBOUNCE_SECONDS,
+    max_delay=CATALOG_SNAPSHOT_MAX_DELAY_SECONDS,
+    keep=CATALOG_SNAPSHOT_KEEP,
+)
@@ -0,0 +1,460 @@
+"""
+Database Monitoring
+PyMongo event listeners that expose connection pool health to the metrics registry
+and record slow commands with their explain plans
+"""
+
+import hashlib
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid
+
+from config import (
+    SLOW_QUERY_LOG_ENABLED,
+    SLOW_QUERY_THRESHOLD_MS,
+    SLOW_QUERY_LOG_MAX_BYTES,
+    SLOW_QUERY_LOG_MAX_DOCS,
+)
+from utils.request_context import current_route
+
+logger = logging.getLogger("app.db")
+
+
+def _percentiles(samples) -> dict:
+    ordered = sorted(samples)
+    if not ordered:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+
+    def pick(pct):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000, 2)
+
+    return {"p50_ms": pick(50), "p95_ms": pick(95), "p99_ms": pick(99)}
+
+
+class _PoolStats:
+    __slots__ = (
+        "open", "checked_out", "max_checked_out", "waiting", "max_waiting",
+        "checkouts", "checkout_failures", "clears", "last_cleared_at", "wait_times",
+    )
+
+    def __init__(self, window: int):
+        self.open = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.checkouts = 0
+        self.checkout_failures = {}
+        self.clears = 0
+        self.last_cleared_at = None
+        self.wait_times = deque(maxlen=window)
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """
+    CMAP listener tracking, per server address:
+    - open and checked-out connections (current and peak)
+    - threads waiting for a connection (current and peak)
+    - checkout wait times (p50/p95/p99 over the last `window` checkouts)
+    - checkout failures by reason and pool clears
+    """
+
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self._lock = threading.Lock()
+        self._pools: dict[str, _PoolStats] = {}
+        self.max_pool_size = None
+
+    def _pool(self, address) -> _PoolStats:
+        key = f"{address[0]}:{address[1]}"
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = _PoolStats(self.window)
+        return pool
+
+    def reset(self):
+        """
+        Forget all counters (used in forked children, so the lock is replaced too)
+        """
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    # ---------------- Pool events ----------------
+    def pool_created(self, event):
+        self.max_pool_size = event.options.get("maxPoolSize", self.max_pool_size)
+        with self._lock:
+            self._pool(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.clears += 1
+            pool.last_cleared_at = time.time()
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    # ---------------- Connection events ----------------
+    def connection_created(self, event):
+        with self._lock:
+            self._pool(event.address).open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.open = max(0, pool.open - 1)
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.waiting += 1
+            pool.max_waiting = max(pool.max_waiting, pool.waiting)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.waiting = max(0, pool.waiting - 1)
+            pool.checkout_failures[event.reason] = pool.checkout_failures.get(event.reason, 0) + 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.waiting = max(0, pool.waiting - 1)
+            pool.checked_out += 1
+            pool.max_checked_out = max(pool.max_checked_out, pool.checked_out)
+            pool.checkouts += 1
+            if event.duration is not None:
+                pool.wait_times.append(event.duration)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool.checked_out = max(0, pool.checked_out - 1)
+
+    # ---------------- Reporting ----------------
+    def snapshot(self) -> dict:
+        with self._lock:
+            pools = {
+                address: {
+                    "open": pool.open,
+                    "checked_out": pool.checked_out,
+                    "max_checked_out": pool.max_checked_out,
+                    "waiting": pool.waiting,
+                    "max_waiting": pool.max_waiting,
+                    "checkouts": pool.checkouts,
+                    "checkout_failures": dict(pool.checkout_failures),
+                    "clears": pool.clears,
+                    "last_cleared_at": pool.last_cleared_at,
+                    "wait": _percentiles(pool.wait_times),
+                }
+                for address, pool in self._pools.items()
+            }
+        return {"max_pool_size": self.max_pool_size, "pools": pools}
+
+
+# ============================================================
+# Slow query log
+# ============================================================
+# getMore is left out: it continues a cursor already attributed to its find/aggregate
+TRACKED_COMMANDS = frozenset({"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify", "insert"})
+EXPLAINABLE_COMMANDS = TRACKED_COMMANDS - {"insert"}
+
+SLOW_QUERY_COLLECTION = "slow_queries"
+SLOW_QUERY_PLANS_COLLECTION = "slow_query_plans"
+
+# Driver and session fields that are not part of the query itself
+_COMMAND_ENVELOPE = frozenset({
+    "lsid", "$db", "$clusterTime", "txnNumber", "$readPreference", "readConcern", "writeConcern",
+    "autocommit", "startTransaction", "apiVersion", "apiStrict", "apiDeprecationErrors",
+})
+
+
+def redact(value):
+    """
+    Replace every value in a filter with "?", keeping field names and operators.
+    Lists of sub-documents ($and, $or, pipelines) keep their structure; value lists collapse.
+    """
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        documents = [redact(item) for item in value if isinstance(item, dict)]
+        return documents or ["?"]
+    return "?"
+
+
+def query_shape(command_name: str, command: dict) -> dict:
+    if command_name == "find":
+        return {"filter": redact(command.get("filter", {})), "sort": command.get("sort")}
+    if command_name == "aggregate":
+        return {"pipeline": [stage if "$sort" in stage else redact(stage) for stage in command.get("pipeline", [])]}
+    if command_name in ("count", "findAndModify"):
+        return {"query": redact(command.get("query", {})), "sort": command.get("sort")}
+    if command_name == "distinct":
+        return {"key": command.get("key"), "query": redact(command.get("query", {}))}
+    if command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or [{}]
+        return {"q": redact(statements[0].get("q", {}))}
+    return {}
+
+
+def returned_count(command_name: str, reply: dict) -> int | None:
+    if command_name in ("find", "aggregate"):
+        return len(reply.get("cursor", {}).get("firstBatch", []))
+    if command_name == "distinct":
+        return len(reply.get("values", []))
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") is not None else 0
+    if command_name == "update":
+        return reply.get("nModified", reply.get("n"))
+    return reply.get("n")
+
+
+def _plan_stages(plan: dict) -> list:
+    stages = []
+    while plan:
+        stage = plan.get("stage", "?")
+        if plan.get("indexName"):
+            stage = f"{stage}({plan['indexName']})"
+        stages.append(stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return stages
+
+
+# Plan fields kept as they are: stage and index names, key patterns, flags
+_PLAN_FIELDS = frozenset({
+    "stage", "indexName", "keyPattern", "direction", "isMultiKey", "isUnique", "isSparse", "isPartial",
+    "sortPattern", "limitAmount", "skipAmount",
+})
+
+
+def redact_plan(plan: dict) -> dict:
+    """
+    A winning plan without the literal values in its filters and index bounds
+    """
+    redacted = {key: value for key, value in plan.items() if key in _PLAN_FIELDS}
+    if "filter" in plan:
+        redacted["filter"] = redact(plan["filter"])
+    if "indexBounds" in plan:
+        redacted["indexBounds"] = {field: "?" for field in plan["indexBounds"]}
+    if plan.get("inputStage"):
+        redacted["inputStage"] = redact_plan(plan["inputStage"])
+    if plan.get("inputStages"):
+        redacted["inputStages"] = [redact_plan(stage) for stage in plan["inputStages"]]
+    return redacted
+
+
+def plan_summary(explain: dict) -> dict:
+    """
+    Winning plan and execution counters from an executionStats explain
+    """
+    planner = explain.get("queryPlanner", {})
+    stats = explain.get("executionStats", {})
+    # Aggregations nest the query part under their first ($cursor) stage
+    if "stages" in explain:
+        cursor = explain["stages"][0].get("$cursor", {})
+        planner = cursor.get("queryPlanner", planner)
+        stats = cursor.get("executionStats", stats)
+    winning = planner.get("winningPlan", {})
+    winning = winning.get("queryPlan", winning)
+    return {
+        "plan": " > ".join(_plan_stages(winning)),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "returned": stats.get("nReturned"),
+        "execution_ms": stats.get("executionTimeMillis"),
+        "winning_plan": redact_plan(winning),
+    }
+
+
+class SlowQueryMonitor(monitoring.CommandListener):
+    """
+    Command listener recording commands slower than `threshold_ms` with their
+    route, redacted filter shape, duration and documents returned.
+
+    - Records are written to a capped collection by a background thread, so the
+      request path only pays a dict insert and pop per command
+    - The first time a shape is seen, its explain plan is captured with
+      executionStats on the same background thread, giving documents
+      examined versus returned for the shape (command replies carry no
+      examined counts, so individual records only have `returned`)
+    - Records are dropped, not queued without bound, if the writer falls behind
+    """
+
+    def __init__(self, threshold_ms: float, enabled: bool = True, max_bytes: int = 16 * 1024 * 1024,
+                 max_docs: int = 50_000, queue_size: int = 1000):
+        self.threshold_ms = threshold_ms
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.max_docs = max_docs
+        self.queue_size = queue_size
+        self._client_factory = None
+        self._database_name = None
+        self.reset()
+
+    def bind(self, client_factory, database_name: str):
+        """
+        Where records are written (set by database.py, which owns the client)
+        """
+        self._client_factory = client_factory
+        self._database_name = database_name
+
+    def reset(self):
+        """
+        Drop per-process state (used in forked children; the writer thread is not inherited)
+        """
+        # Plain dict operations are atomic, so no lock on the per-command path
+        self._pending = {}
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._explained = set()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._capped_ready = False
+        self.recorded = 0
+        self.dropped = 0
+
+    # ---------------- Command events ----------------
+    def started(self, event):
+        if not self.enabled or event.command_name not in TRACKED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        if collection in (SLOW_QUERY_COLLECTION, SLOW_QUERY_PLANS_COLLECTION):
+            return
+        self._pending[(event.connection_id, event.request_id)] = event.command
+
+    def succeeded(self, event):
+        command = self._pending.pop((event.connection_id, event.request_id), None)
+        if command is not None and event.duration_micros >= self.threshold_ms * 1000:
+            self._record(event, command, returned_count(event.command_name, event.reply), None)
+
+    def failed(self, event):
+        command = self._pending.pop((event.connection_id, event.request_id), None)
+        if command is not None and event.duration_micros >= self.threshold_ms * 1000:
+            self._record(event, command, None, event.failure.get("codeName") or event.failure.get("errmsg"))
+
+    def _record(self, event, command: dict, returned: int | None, error: str | None):
+        name = event.command_name
+        collection = str(command.get(name))
+        shape = query_shape(name, command)
+        shape_hash = hashlib.sha1(
+            json.dumps([event.database_name, collection, name, shape], sort_keys=True, default=str).encode()
+        ).hexdigest()[:16]
+
+        self._enqueue(("record", {
+            "ts": datetime.utcnow(),
+            "route": current_route() or "background",
+            "command": name,
+            "database": event.database_name,
+            "collection": collection,
+            "shape": shape,
+            "shape_hash": shape_hash,
+            "duration_ms": round(event.duration_micros / 1000, 2),
+            "returned": returned,
+            "error": error,
+        }))
+
+        if name in EXPLAINABLE_COMMANDS and shape_hash not in self._explained:
+            self._explained.add(shape_hash)
+            explain = {key: value for key, value in command.items() if key not in _COMMAND_ENVELOPE}
+            self._enqueue(("explain", shape_hash, event.database_name, explain))
+
+    def _enqueue(self, item):
+        if self._client_factory is None:
+            return
+        if self._writer is None or not self._writer.is_alive():
+            with self._writer_lock:
+                if self._writer is None or not self._writer.is_alive():
+                    self._writer = threading.Thread(target=self._write_loop, name="slow-query-log", daemon=True)
+                    self._writer.start()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    # ---------------- Background writer ----------------
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            records = []
+            try:
+                while True:
+                    if item[0] == "record":
+                        records.append(item[1])
+                    else:
+                        self._explain(*item[1:])
+                    if len(records) >= 100:
+                        break
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            if records:
+                self._insert(records)
+
+    def _database(self):
+        return self._client_factory()[self._database_name]
+
+    def _insert(self, records: list):
+        try:
+            database = self._database()
+            if not self._capped_ready:
+                try:
+                    database.create_collection(
+                        SLOW_QUERY_COLLECTION, capped=True, size=self.max_bytes, max=self.max_docs
+                    )
+                except CollectionInvalid:
+                    pass  # already exists
+                self._capped_ready = True
+            database[SLOW_QUERY_COLLECTION].insert_many(records, ordered=False)
+            self.recorded += len(records)
+        except Exception as e:
+            self.dropped += len(records)
+            logger.warning(f"Could not write slow query records: {e}")
+
+    def _explain(self, shape_hash: str, database_name: str, command: dict):
+        try:
+            plans = self._database()[SLOW_QUERY_PLANS_COLLECTION]
+            if plans.find_one({"_id": shape_hash}, {"_id": 1}) is not None:
+                return  # explained by another worker
+            explain = self._client_factory()[database_name].command(
+                {"explain": command, "verbosity": "executionStats"}
+            )
+            plans.replace_one(
+                {"_id": shape_hash},
+                {**plan_summary(explain), "captured_at": datetime.utcnow()},
+                upsert=True,
+            )
+        except Exception as e:
+            logger.warning(f"Could not explain slow query {shape_hash}: {e}")
+
+    # ---------------- Reporting ----------------
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold_ms,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "shapes_explained": len(self._explained),
+        }
+
+
+pool_monitor = PoolMonitor()
+slow_query_monitor = SlowQueryMonitor(
+    threshold_ms=SLOW_QUERY_THRESHOLD_MS,
+    enabled=SLOW_QUERY_LOG_ENABLED,
+    max_bytes=SLOW_QUERY_LOG_MAX_BYTES,
+    max_docs=SLOW_QUERY_LOG_MAX_DOCS,
+)
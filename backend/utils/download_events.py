@@ -0,0 +1,300 @@
+"""
+Download Events
+Write-behind buffer for download events: events are batched per worker and
+flushed with unordered insert_many plus $inc bulk_writes on per-resource counters
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config import (
+    DOWNLOAD_FLUSH_INTERVAL_MS,
+    DOWNLOAD_FLUSH_MAX_EVENTS,
+    DOWNLOAD_BUFFER_MAX_EVENTS,
+    DOWNLOAD_BUFFER_MAX_WAIT_SECONDS,
+    DOWNLOAD_SPOOL_DIR,
+)
+from database import db
+
+logger = logging.getLogger("app.downloads")
+
+DUPLICATE_KEY = 11000
+
+
+class DownloadEventBuffer:
+    """
+    Per-worker buffer of download events.
+
+    - `record()` appends to memory; a background task flushes every
+      `flush_interval` seconds or as soon as `flush_max` events are waiting
+    - Events get their ObjectId when recorded, so a retried insert_many only
+      skips the duplicates; counter increments are retried separately
+    - At `max_events` buffered, `record()` waits for a flush (backpressure) and
+      drops the event only if none frees space within `max_wait` seconds
+    - `close()` drains the buffer; whatever cannot be written is spooled to
+      `spool_dir` and replayed by the next `start()`
+    """
+
+    def __init__(self, flush_interval: float = 1.0, flush_max: int = 500, max_events: int = 10_000,
+                 max_wait: float = 2.0, spool_dir: str = "spool/downloads"):
+        self.flush_interval = flush_interval
+        self.flush_max = flush_max
+        self.max_events = max_events
+        self.max_wait = max_wait
+        self.spool_dir = spool_dir
+
+        self._events = []
+        self._counts = Counter()
+        self._task = None
+        self._wake = None
+        self._stop = None
+        self._space = None
+        self._subscribers = []
+        self._indexed = False
+
+        self.flushed = 0
+        self.dropped = 0
+        self.failures = 0
+        self.last_flush_ms = None
+
+    def subscribe(self, callback):
+        """
+        Call `callback(events)` with every batch successfully written
+        """
+        self._subscribers.append(callback)
+
+    # ---------------- Lifecycle ----------------
+    async def start(self):
+        self._wake = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._replay_spool()
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """
+        Stop the flusher and drain the buffer (spooling what cannot be written)
+        """
+        if self._task is None:
+            return
+        # Not cancelled: a flush in progress finishes, so its batch is neither lost nor unseen
+        self._stop.set()
+        self._wake.set()
+        await self._task
+        self._task = None
+        if self._events or self._counts:
+            await self._flush()
+        if self._events or self._counts:
+            self._spool()
+
+    # ---------------- Recording ----------------
+    async def record(self, resource_type: str, resource: dict, user: str | None, action: str = "download"):
+        event = self._event(resource_type, resource, user, action)
+        counts = Counter({(resource_type, resource["_id"]): 1}) if action == "download" else Counter()
+
+        if self._task is None:
+            # Not started (scripts, tests): write through
+            await asyncio.get_running_loop().run_in_executor(None, self._write, [event], counts)
+            return
+
+        # Every waiter re-checks after a wake: a flush frees room for some, not all
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(self._events) >= self.max_events:
+            self._space.clear()
+            self._wake.set()
+            try:
+                await asyncio.wait_for(self._space.wait(), max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                logger.warning("Download event buffer full, dropping event")
+                return
+
+        self._events.append(event)
+        self._counts.update(counts)
+        if len(self._events) >= self.flush_max:
+            self._wake.set()
+
+    def _event(self, resource_type: str, resource: dict, user: str | None, action: str) -> dict:
+        return {
+            "_id": ObjectId(),
+            "resource_type": resource_type,
+            "resource_id": resource["_id"],
+            "subject": resource.get("subject"),
+            "semester": resource.get("semester"),
+            "action": action,
+            "user": user,
+            "ts": datetime.utcnow(),
+        }
+
+    # ---------------- Flushing ----------------
+    async def _run(self):
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            if self._events or self._counts:
+                await self._flush()
+                if len(self._events) < self.max_events:
+                    self._space.set()
+                if self.failures:
+                    # Writes are failing: back off rather than retrying in a tight loop
+                    try:
+                        await asyncio.wait_for(self._stop.wait(), min(self.flush_interval * 2 ** self.failures, 30))
+                    except asyncio.TimeoutError:
+                        pass
+
+    async def _flush(self):
+        """
+        Swap the buffer out (on the event loop) and write it in the executor
+        """
+        events, counts = self._events, self._counts
+        self._events, self._counts = [], Counter()
+        started = time.perf_counter()
+
+        events_written, counts_written = await asyncio.get_running_loop().run_in_executor(
+            None, self._write_batch, events, counts
+        )
+        if not counts_written:
+            self._counts.update(counts)
+        if not events_written:
+            # Back in front of newer events; already inserted ones are skipped on retry
+            self._events[:0] = events
+            self.failures += 1
+            return
+
+        self.failures = 0 if counts_written else self.failures + 1
+        self.flushed += len(events)
+        self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+        for callback in self._subscribers:
+            try:
+                callback(events)
+            except Exception:
+                logger.exception("Download event subscriber failed")
+
+    def _write_batch(self, events: list, counts: Counter) -> tuple[bool, bool]:
+        try:
+            self._write(events, Counter())
+        except Exception as e:
+            logger.warning(f"Download event insert failed, will retry: {e}")
+            return False, False
+        try:
+            self._write([], counts)
+        except Exception as e:
+            logger.warning(f"Download counter update failed, will retry: {e}")
+            return True, False
+        return True, True
+
+    def _write(self, events: list, counts: Counter):
+        if not self._indexed:
+            db.downloads.create_index([("resource_id", 1), ("ts", -1)])
+            db.downloads.create_index("ts")
+            self._indexed = True
+
+        if events:
+            try:
+                db.downloads.insert_many(events, ordered=False)
+            except BulkWriteError as e:
+                # Events already written by an earlier, partially failed attempt
+                if any(err["code"] != DUPLICATE_KEY for err in e.details.get("writeErrors", [])):
+                    raise
+
+        by_collection = {}
+        for (resource_type, resource_id), n in counts.items():
+            by_collection.setdefault(resource_type, []).append(
+                UpdateOne({"_id": resource_id}, {"$inc": {"download_count": n}})
+            )
+        for resource_type, updates in by_collection.items():
+            db[resource_type].bulk_write(updates, ordered=False)
+
+    # ---------------- Spool ----------------
+    def _spool(self):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f"downloads-{os.getpid()}-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.jsonl")
+        with open(path + ".tmp", "w") as f:
+            for event in self._events:
+                f.write(json.dumps({"event": {**event, "_id": str(event["_id"]), "ts": event["ts"].isoformat()}}) + "\n")
+            for (resource_type, resource_id), n in self._counts.items():
+                f.write(json.dumps({"count": [resource_type, resource_id, n]}) + "\n")
+        os.replace(path + ".tmp", path)
+        logger.warning(f"Spooled {len(self._events)} download events and {len(self._counts)} counters to {path}")
+        self._events, self._counts = [], Counter()
+
+    def _claimable(self) -> list:
+        """
+        Spool files nobody is replaying, plus claims left by workers that have died
+        """
+        paths = glob.glob(os.path.join(self.spool_dir, "downloads-*.jsonl"))
+        for path in glob.glob(os.path.join(self.spool_dir, "downloads-*.jsonl.replaying-*")):
+            pid = int(path.rsplit("-", 1)[1])
+            if pid != os.getpid() and not _alive(pid):
+                paths.append(path)
+        return sorted(paths)
+
+    def _replay_spool(self):
+        for path in self._claimable():
+            # Claim the file first: the rename succeeds for exactly one worker
+            claimed = f"{path.split('.replaying-')[0]}.replaying-{os.getpid()}"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue  # claimed by another worker
+            with open(claimed) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if "event" in entry:
+                        event = entry["event"]
+                        event["_id"] = ObjectId(event["_id"])
+                        event["ts"] = datetime.fromisoformat(event["ts"])
+                        self._events.append(event)
+                    else:
+                        resource_type, resource_id, n = entry["count"]
+                        self._counts[(resource_type, resource_id)] += n
+            os.remove(claimed)
+            logger.info(f"Replaying spooled download events from {path}")
+
+    # ---------------- Reporting ----------------
+    def snapshot(self) -> dict:
+        return {
+            "buffered": len(self._events),
+            "pending_counters": len(self._counts),
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "consecutive_failures": self.failures,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+download_events = DownloadEventBuffer(
+    flush_interval=DOWNLOAD_FLUSH_INTERVAL_MS / 1000,
+    flush_max=DOWNLOAD_FLUSH_MAX_EVENTS,
+    max_events=DOWNLOAD_BUFFER_MAX_EVENTS,
+    max_wait=DOWNLOAD_BUFFER_MAX_WAIT_SECONDS,
+    spool_dir=DOWNLOAD_SPOOL_DIR,
+)
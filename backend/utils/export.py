@@ -0,0 +1,101 @@
+"""
+Export Formatting
+Streaming JSONL / CSV serialization of Mongo documents for manage_db.py and admin exports
+"""
+
+import csv
+import io
+import zlib
+from datetime import datetime
+
+from bson import json_util
+from bson.json_util import RELAXED_JSON_OPTIONS
+from bson.objectid import ObjectId
+
+# Never leave the database through an export
+SECRET_FIELDS = ("password", "password_hash", "token_hash")
+FORMATS = ("jsonl", "csv")
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def export_projection(fields: list | None = None) -> dict:
+    """
+    Projection for an export: the requested fields, or everything but secrets
+    """
+    if fields:
+        return {f: 1 for f in fields if f not in SECRET_FIELDS}
+    return {f: 0 for f in SECRET_FIELDS}
+
+
+def jsonl_line(doc: dict) -> str:
+    return json_util.dumps(doc, json_options=RELAXED_JSON_OPTIONS) + "\n"
+
+
+def csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (dict, list)):
+        return json_util.dumps(value, json_options=RELAXED_JSON_OPTIONS)
+    return value
+
+
+def csv_fields(docs: list) -> list:
+    """
+    Column names for a CSV export: every top-level field in `docs`, in first-seen order
+    """
+    fields = {}
+    for doc in docs:
+        fields.update(dict.fromkeys(doc))
+    return list(fields)
+
+
+def csv_lines(fields: list, docs):
+    """
+    Yield the header and one CSV line per document; fields not in `fields` are dropped
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take():
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    writer.writerow(fields)
+    yield take()
+    for doc in docs:
+        writer.writerow([csv_value(doc.get(f)) for f in fields])
+        yield take()
+
+
+def encode_stream(docs, fmt: str, fields: list | None = None, compress: bool = False,
+                  chunk_bytes: int = STREAM_CHUNK_BYTES, level: int = 6):
+    """
+    Encode documents as JSONL or CSV (optionally gzipped) and yield the bytes in
+    chunks of about `chunk_bytes`, so memory stays bounded however many there are
+    """
+    lines = csv_lines(fields, docs) if fmt == "csv" else (jsonl_line(doc) for doc in docs)
+    # wbits=31: a gzip container, written incrementally
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31) if compress else None
+    pending, size = [], 0
+    for line in lines:
+        data = line.encode()
+        pending.append(data)
+        size += len(data)
+        if size >= chunk_bytes:
+            out = b"".join(pending)
+            pending, size = [], 0
+            if compressor is not None:
+                out = compressor.compress(out)
+            if out:
+                yield out
+    out = b"".join(pending)
+    if compressor is not None:
+        out = compressor.compress(out) + compressor.flush()
+    if out:
+        yield out
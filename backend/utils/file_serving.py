@@ -0,0 +1,122 @@
+"""
+File Serving
+Download and inline view responses for papers, notes and syllabus files,
+plus storing and removing the uploaded files behind them (see utils/storage.py)
+"""
+
+import asyncio
+import logging
+import os
+import re
+
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse, RedirectResponse
+from jose import JWTError, jwt
+
+from config import JWT_SECRET_KEY, JWT_ALGORITHM
+from utils.download_events import download_events
+from utils.jobs import job_queue
+from utils.storage import key_from_url, new_key, storage, url_for_key
+
+logger = logging.getLogger("app.files")
+
+# What the download handlers read from the resource document
+FILE_PROJECTION = {"file_url": 1, "title": 1, "subject": 1, "semester": 1}
+
+# Uploads are stored as "<uuid4>_<original name>"
+_STORED_NAME = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}_(.+)$")
+
+
+def optional_user(request: Request) -> str | None:
+    """
+    Email of the signed-in user (Bearer header or access_token cookie), if any
+    """
+    token = None
+    auth_header = request.headers.get("Authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        token = auth_header.split(" ")[1]
+    token = token or request.cookies.get("access_token")
+    if not token:
+        return None
+    try:
+        return jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+
+async def serve_resource_file(request: Request, resource_type: str, resource: dict | None, attachment: bool):
+    """
+    Serve a resource's file and record the download (or view) event
+    """
+    if not resource:
+        raise HTTPException(status_code=404, detail="Resource not found")
+    file_url = resource.get("file_url")
+    if not file_url:
+        raise HTTPException(status_code=404, detail="No file attached")
+
+    action = "download" if attachment else "view"
+    if file_url.startswith(("http://", "https://")):
+        await download_events.record(resource_type, resource, optional_user(request), action)
+        return RedirectResponse(file_url, status_code=307)
+
+    # Stored as "/uploads/<key>"
+    key = key_from_url(file_url)
+    if key is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    stored_name = key.rsplit("/", 1)[-1]
+    match = _STORED_NAME.match(stored_name)
+    filename = match.group(1) if match else stored_name
+
+    # Object storage: send the client straight to the store
+    url = storage.download_url(key, filename, attachment)
+    if url is not None:
+        await download_events.record(resource_type, resource, optional_user(request), action)
+        return RedirectResponse(url, status_code=307)
+
+    try:
+        path = storage.path(key)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    await download_events.record(resource_type, resource, optional_user(request), action)
+    return FileResponse(
+        path,
+        filename=filename,
+        content_disposition_type="attachment" if attachment else "inline",
+        headers={"Cache-Control": "private, max-age=3600"},
+    )
+
+
+async def save_upload(upload: UploadFile, directory: str) -> str:
+    """
+    Store an uploaded file under "<directory>/<uuid4>_<original name>" and return its file URL.
+    The copy runs in the executor so large uploads do not block the event loop.
+    """
+    key = new_key(directory, upload.filename)
+    await asyncio.get_running_loop().run_in_executor(None, storage.save, key, upload.file, upload.content_type)
+    return url_for_key(key)
+
+
+def discard_resource_file(resource: dict):
+    """
+    Queue removal of a deleted resource's uploaded file (external URLs have nothing to remove)
+    """
+    if key_from_url(resource.get("file_url")) is not None:
+        job_queue.enqueue("delete_upload", {"file_url": resource["file_url"]})
+
+
+@job_queue.job("delete_upload", executor="thread", concurrency=2)
+def delete_upload(file_url: str):
+    """
+    Remove a deleted resource's file (queued by the delete handlers)
+    """
+    key = key_from_url(file_url)
+    if key is None:
+        logger.warning(f"Not deleting {file_url}: not an uploaded file")
+        return
+    try:
+        storage.delete(key)
+    except ValueError as e:
+        logger.warning(f"Not deleting {file_url}: {e}")
@@ -0,0 +1,343 @@
+"""
+Background Jobs
+Durable jobs in Mongo, leased by API workers with heartbeats and retried with backoff
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import uuid
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable
+
+from pymongo import ReturnDocument
+
+from config import (
+    JOBS_ENABLED,
+    JOBS_POLL_INTERVAL_SECONDS,
+    JOBS_LEASE_SECONDS,
+    JOBS_MAX_ATTEMPTS,
+    JOBS_RETRY_BASE_SECONDS,
+    JOBS_RETRY_MAX_SECONDS,
+    JOBS_PROCESS_WORKERS,
+    JOBS_RETENTION_HOURS,
+    JOBS_SHUTDOWN_TIMEOUT_SECONDS,
+)
+from database import db
+
+logger = logging.getLogger("app.jobs")
+
+EXECUTORS = ("async", "thread", "process")
+
+
+@dataclass
+class JobType:
+    name: str
+    handler: Callable
+    executor: str
+    concurrency: int
+    max_attempts: int
+
+
+class JobQueue:
+    """
+    Jobs live in the `jobs` collection; every API worker polls it.
+
+    - `enqueue()` inserts a queued job and returns at once
+    - A worker claims a job with one find_one_and_update, which sets a lease;
+      while the job runs the lease is renewed every `lease_seconds / 3`, so no
+      other worker takes it. A lease that lapses (worker killed) makes the job
+      claimable again - handlers must tolerate running twice
+    - Failures are retried with exponential backoff and jitter until
+      `max_attempts`, then the job is left in state "failed" for inspection
+    - `concurrency` caps how many jobs of a type run at once in each worker
+    - Handlers run on the event loop ("async"), the default thread pool
+      ("thread") or a per-worker process pool ("process", for CPU-bound work;
+      the handler must be a module-level function)
+    """
+
+    def __init__(self, enabled: bool = True, poll_interval: float = 1.0, lease_seconds: float = 30,
+                 max_attempts: int = 5, retry_base: float = 5, retry_max: float = 600,
+                 process_workers: int = 2, retention_hours: int = 72, shutdown_timeout: float = 10):
+        self.enabled = enabled
+        self.poll_interval = poll_interval
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.process_workers = process_workers
+        self.retention_hours = retention_hours
+        self.shutdown_timeout = shutdown_timeout
+
+        self._types = {}
+        self._running = {}  # job id -> (type name, task)
+        self._worker_id = None
+        self._loop = None
+        self._wake = None
+        self._task = None
+        self._pool = None
+        self._indexed = False
+
+        self.outcomes = Counter()
+
+    @property
+    def collection(self):
+        if not self._indexed:
+            db.jobs.create_index([("state", 1), ("type", 1), ("run_at", 1)])
+            db.jobs.create_index("finished_at", expireAfterSeconds=self.retention_hours * 3600)
+            self._indexed = True
+        return db.jobs
+
+    # ---------------- Registration ----------------
+    def job(self, name: str, executor: str = "async", concurrency: int = 1, max_attempts: int | None = None):
+        """
+        Register the decorated function as the handler for jobs of type `name`.
+        It is called with the job's payload as keyword arguments.
+        """
+        if executor not in EXECUTORS:
+            raise ValueError(f"executor must be one of {EXECUTORS}")
+
+        def register(handler):
+            self._types[name] = JobType(name, handler, executor, concurrency, max_attempts or self.max_attempts)
+            return handler
+
+        return register
+
+    # ---------------- Enqueueing ----------------
+    def enqueue(self, name: str, payload: dict | None = None, delay: float = 0) -> str:
+        if name not in self._types:
+            raise ValueError(f"Unknown job type: {name}")
+        now = datetime.utcnow()
+        job_id = str(uuid.uuid4())
+        self.collection.insert_one({
+            "_id": job_id,
+            "type": name,
+            "payload": payload or {},
+            "state": "queued",
+            "attempts": 0,
+            "max_attempts": self._types[name].max_attempts,
+            "run_at": now + timedelta(seconds=delay),
+            "created_at": now,
+        })
+        if self._loop is not None and delay == 0:
+            # May be called from a thread (e.g. a "thread" job enqueueing a follow-up)
+            self._loop.call_soon_threadsafe(self._wake.set)
+        return job_id
+
+    # ---------------- Lifecycle ----------------
+    async def start(self):
+        if not self.enabled:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """
+        Stop claiming, give running jobs `shutdown_timeout` seconds, then hand the rest back
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        tasks = [task for _, task in self._running.values()]
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=self.shutdown_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self._loop = None
+
+    # ---------------- Claiming ----------------
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wake.clear()
+            busy = Counter(name for name, _ in self._running.values())
+            free = {name: jt.concurrency - busy[name] for name, jt in self._types.items() if jt.concurrency > busy[name]}
+            if free:
+                try:
+                    claimed = await loop.run_in_executor(None, self._claim, free)
+                except Exception as e:
+                    logger.warning(f"Job claim failed: {e}")
+                    claimed = []
+                for job in claimed:
+                    task = asyncio.create_task(self._execute(job))
+                    self._running[job["_id"]] = (job["type"], task)
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _claim(self, free: dict) -> list:
+        """
+        Claim due jobs (or ones whose lease lapsed) up to each type's free slots
+        """
+        claimed = []
+        while free:
+            now = datetime.utcnow()
+            job = self.collection.find_one_and_update(
+                {
+                    "type": {"$in": list(free)},
+                    "$or": [
+                        {"state": "queued", "run_at": {"$lte": now}},
+                        {"state": "running", "lease_expires_at": {"$lt": now}},
+                    ],
+                },
+                {
+                    "$set": {
+                        "state": "running",
+                        "lease_owner": self._worker_id,
+                        "lease_expires_at": now + self.lease,
+                        "started_at": now,
+                    },
+                    "$inc": {"attempts": 1},
+                },
+                sort=[("run_at", 1)],
+                return_document=ReturnDocument.AFTER,
+            )
+            if job is None:
+                break
+            claimed.append(job)
+            free[job["type"]] -= 1
+            if free[job["type"]] == 0:
+                del free[job["type"]]
+        return claimed
+
+    # ---------------- Running ----------------
+    async def _execute(self, job: dict):
+        loop = asyncio.get_running_loop()
+        jt = self._types[job["type"]]
+        heartbeat = asyncio.create_task(self._heartbeat(job["_id"]))
+        try:
+            if job["attempts"] > job["max_attempts"]:
+                # Reclaimed after its worker died on the last attempt
+                raise RuntimeError("lease lapsed on final attempt")
+            call = functools.partial(jt.handler, **job["payload"])
+            if jt.executor == "async":
+                await call()
+            elif jt.executor == "thread":
+                await loop.run_in_executor(None, call)
+            else:
+                await loop.run_in_executor(self._process_pool(), call)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back without spending an attempt
+            await asyncio.shield(loop.run_in_executor(None, self._finish, job, {
+                "$set": {"state": "queued", "run_at": datetime.utcnow()},
+                "$inc": {"attempts": -1},
+            }))
+            raise
+        except Exception as e:
+            await loop.run_in_executor(None, self._fail, job, e)
+        else:
+            self.outcomes["completed"] += 1
+            await loop.run_in_executor(None, self._finish, job, {
+                "$set": {"state": "done", "finished_at": datetime.utcnow()},
+            })
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job["_id"], None)
+            if self._wake is not None:
+                self._wake.set()
+
+    async def _heartbeat(self, job_id: str):
+        loop = asyncio.get_running_loop()
+        interval = self.lease.total_seconds() / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                result = await loop.run_in_executor(None, functools.partial(
+                    self.collection.update_one,
+                    {"_id": job_id, "lease_owner": self._worker_id},
+                    {"$set": {"lease_expires_at": datetime.utcnow() + self.lease}},
+                ))
+            except Exception as e:
+                logger.warning(f"Job {job_id} heartbeat failed: {e}")
+                continue
+            if result.matched_count == 0:
+                logger.warning(f"Job {job_id} lease lost; another worker may run it again")
+                return
+
+    def _fail(self, job: dict, error: Exception):
+        now = datetime.utcnow()
+        if job["attempts"] >= job["max_attempts"]:
+            self.outcomes["failed"] += 1
+            logger.error(f"❌ Job {job['type']} {job['_id']} failed after {job['attempts']} attempts: {error}")
+            update = {"$set": {"state": "failed", "last_error": str(error), "finished_at": now}}
+        else:
+            self.outcomes["retried"] += 1
+            delay = min(self.retry_max, self.retry_base * 2 ** (job["attempts"] - 1)) * random.uniform(0.8, 1.2)
+            logger.warning(f"Job {job['type']} {job['_id']} attempt {job['attempts']} failed, retrying in {delay:.0f}s: {error}")
+            update = {"$set": {"state": "queued", "last_error": str(error), "run_at": now + timedelta(seconds=delay)}}
+        self._finish(job, update)
+
+    def _finish(self, job: dict, update: dict):
+        # Only the lease holder may settle the job
+        update.setdefault("$unset", {}).update({"lease_owner": "", "lease_expires_at": ""})
+        try:
+            self.collection.update_one({"_id": job["_id"], "lease_owner": self._worker_id}, update)
+        except Exception as e:
+            logger.warning(f"Could not record outcome of job {job['_id']}; it will be retried when its lease lapses: {e}")
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn, not fork: workers hold Mongo clients and threads that must not be copied
+            self._pool = ProcessPoolExecutor(self.process_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    # ---------------- Admin ----------------
+    def list(self, state: str | None = None, job_type: str | None = None, limit: int = 50) -> list:
+        query = {}
+        if state:
+            query["state"] = state
+        if job_type:
+            query["type"] = job_type
+        return list(self.collection.find(query).sort("created_at", -1).limit(limit))
+
+    def retry(self, job_id: str) -> bool:
+        """
+        Requeue a failed job with a fresh set of attempts
+        """
+        result = self.collection.update_one(
+            {"_id": job_id, "state": "failed"},
+            {"$set": {"state": "queued", "attempts": 0, "run_at": datetime.utcnow()}, "$unset": {"finished_at": ""}},
+        )
+        if result.modified_count and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        return bool(result.modified_count)
+
+    def snapshot(self) -> dict:
+        return {
+            "running": dict(Counter(name for name, _ in self._running.values())),
+            "types": {name: {"executor": jt.executor, "concurrency": jt.concurrency} for name, jt in self._types.items()},
+            **self.outcomes,
+        }
+
+
+job_queue = JobQueue(
+    enabled=JOBS_ENABLED,
+    poll_interval=JOBS_POLL_INTERVAL_SECONDS,
+    lease_seconds=JOBS_LEASE_SECONDS,
+    max_attempts=JOBS_MAX_ATTEMPTS,
+    retry_base=JOBS_RETRY_BASE_SECONDS,
+    retry_max=JOBS_RETRY_MAX_SECONDS,
+    process_workers=JOBS_PROCESS_WORKERS,
+    retention_hours=JOBS_RETENTION_HOURS,
+    shutdown_timeout=JOBS_SHUTDOWN_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,35 @@
+"""
+Metrics Registry
+Process-local registry of named metric providers, read by the admin metrics endpoint
+"""
+
+import os
+import threading
+from typing import Callable
+
+_providers: dict[str, Callable[[], dict]] = {}
+_lock = threading.Lock()
+
+
+def register(name: str, provider: Callable[[], dict]):
+    """
+    Register a zero-argument callable returning a JSON-serializable dict
+    """
+    with _lock:
+        _providers[name] = provider
+
+
+def snapshot() -> dict:
+    """
+    Collect every provider's current values for this worker process
+    """
+    with _lock:
+        providers = dict(_providers)
+
+    metrics = {"pid": os.getpid()}
+    for name, provider in providers.items():
+        try:
+            metrics[name] = provider()
+        except Exception as e:
+            metrics[name] = {"error": f"{type(e).__name__}: {e}"}
+    return metrics
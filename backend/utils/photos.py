@@ -0,0 +1,169 @@
+"""
+Profile Photos
+Uploaded photos are decoded, cropped square and re-encoded at a few fixed
+sizes on a process pool. Variants are stored under content-hash names, so a
+URL always means the same bytes and can be cached forever.
+"""
+
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import re
+import time
+import warnings
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+from config import (
+    PHOTO_SIZES,
+    PHOTO_FORMAT,
+    PHOTO_QUALITY,
+    PHOTO_MAX_PIXELS,
+    PHOTO_PROCESS_WORKERS,
+)
+from database import db
+from utils.jobs import job_queue
+from utils.storage import storage
+
+PHOTO_DIR = "profile_photos"
+PHOTO_URL_PREFIX = "/api/photos/"
+MEDIA_TYPES = {"webp": "image/webp", "avif": "image/avif"}
+_PHOTO_NAME = re.compile(r"^[0-9a-f]{32}\.(webp|avif)$")
+
+
+def photo_key(name: str) -> str | None:
+    """
+    Storage key for a variant name from a photo URL, or None if it is not one
+    """
+    return f"{PHOTO_DIR}/{name}" if _PHOTO_NAME.match(name) else None
+
+
+def media_type(name: str) -> str:
+    return MEDIA_TYPES[name.rsplit(".", 1)[-1]]
+
+
+def render_variants(data: bytes, sizes: tuple, fmt: str, quality: int, max_pixels: int) -> list:
+    """
+    [(size, encoded bytes)] for an uploaded image, largest first. Runs in a
+    pool process: module-level, and takes and returns only plain data.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with warnings.catch_warnings():
+        # Past max_pixels Pillow only warns; refuse instead
+        warnings.simplefilter("error", Image.DecompressionBombWarning)
+        try:
+            image = Image.open(io.BytesIO(data))
+            largest = max(sizes)
+            # JPEG decodes straight to a reduced scale (1/2 .. 1/8) when asked first
+            image.draft("RGB", (largest, largest))
+            image = ImageOps.exif_transpose(image)
+            image.load()
+        except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+            raise ValueError(f"Images are limited to {max_pixels:,} pixels")
+        except (OSError, SyntaxError):
+            raise ValueError("Not a supported image")
+
+    image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+    # Never upscale: a small photo gets fewer, smaller variants
+    edge = min(image.size)
+    targets = sorted({min(size, edge) for size in sizes}, reverse=True)
+    image = ImageOps.fit(image, (targets[0], targets[0]), Image.Resampling.LANCZOS)
+
+    variants = []
+    for size in targets:
+        if image.width != size:
+            # Each variant is resized from the previous one, so the cost falls with the size
+            image = image.resize((size, size), Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        # Metadata (EXIF, including any GPS position) is not carried over
+        image.save(out, fmt.upper(), quality=quality)
+        variants.append((size, out.getvalue()))
+    return variants
+
+
+class PhotoProcessor:
+    """
+    Renders and stores profile photo variants.
+
+    - `process()` renders on a per-worker process pool (spawned on first
+      use), so decoding a phone photo never blocks the event loop or holds
+      the GIL against other requests
+    - Variants are stored as "profile_photos/<sha256[:32]>.<format>" and
+      described as [{"size", "url", "bytes"}], largest first
+    """
+
+    def __init__(self, sizes: tuple = (64, 256, 512), fmt: str = "webp", quality: int = 80,
+                 max_pixels: int = 50_000_000, workers: int = 2):
+        if fmt not in MEDIA_TYPES:
+            raise ValueError(f"PHOTO_FORMAT must be one of {tuple(MEDIA_TYPES)}")
+        self.sizes = sizes
+        self.fmt = fmt
+        self.quality = quality
+        self.max_pixels = max_pixels
+        self.workers = workers
+        self._pool = None
+        self.stats = Counter()
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that holds Mongo clients and threads is unsafe
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def process(self, data: bytes) -> list:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            rendered = await loop.run_in_executor(
+                self._process_pool(), render_variants, data, self.sizes, self.fmt, self.quality, self.max_pixels
+            )
+        except ValueError:
+            self.stats["rejected"] += 1
+            raise
+        self.stats["processed"] += 1
+        self.stats["render_ms"] += int((time.perf_counter() - started) * 1000)
+        self.stats["bytes_in"] += len(data)
+
+        variants = []
+        for size, encoded in rendered:
+            name = f"{hashlib.sha256(encoded).hexdigest()[:32]}.{self.fmt}"
+            await loop.run_in_executor(
+                None, storage.save, f"{PHOTO_DIR}/{name}", io.BytesIO(encoded), MEDIA_TYPES[self.fmt]
+            )
+            variants.append({"size": size, "url": PHOTO_URL_PREFIX + name, "bytes": len(encoded)})
+            self.stats["bytes_out"] += len(encoded)
+        return variants
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def snapshot(self) -> dict:
+        return dict(self.stats)
+
+
+@job_queue.job("delete_profile_photos", executor="thread", concurrency=2)
+def delete_profile_photos(urls: list):
+    """
+    Remove replaced photo variants, unless another user has the same bytes
+    """
+    for url in urls:
+        key = photo_key(url[len(PHOTO_URL_PREFIX):]) if url.startswith(PHOTO_URL_PREFIX) else None
+        if key is None:
+            continue
+        if db.users.find_one({"profile_photo_variants.url": url}, {"_id": 1}):
+            continue
+        storage.delete(key)
+
+
+photo_processor = PhotoProcessor(
+    sizes=PHOTO_SIZES,
+    fmt=PHOTO_FORMAT,
+    quality=PHOTO_QUALITY,
+    max_pixels=PHOTO_MAX_PIXELS,
+    workers=PHOTO_PROCESS_WORKERS,
+)
@@ -0,0 +1,188 @@
+"""
+Request Profiling
+On-demand pyinstrument profiles of single requests, triggered by a signed header
+or a time-boxed sampling window, stored for admins to retrieve
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from jose import JWTError, jwt
+
+from config import (
+    JWT_SECRET_KEY,
+    JWT_ALGORITHM,
+    PROFILING_ENABLED,
+    PROFILING_INTERVAL_MS,
+    PROFILING_RETENTION_DAYS,
+)
+from database import db
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:  # optional - profiling is unavailable without it
+    Profiler = None
+
+logger = logging.getLogger("app.profiling")
+
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+SETTINGS_ID = "sampling"
+
+# Listings never include the (large) rendered profiles
+PROFILE_SUMMARY_PROJECTION = {"text": 0, "speedscope": 0}
+
+
+def _epoch(utc: datetime) -> float:
+    # Stored datetimes are naive UTC; timestamp() would take them for local time
+    return utc.replace(tzinfo=timezone.utc).timestamp()
+
+
+class RequestProfiler:
+    """
+    Decides which requests to profile and stores the results.
+
+    - A request carrying a valid `X-Profile-Token` (minted by an admin, short-lived)
+      is always profiled
+    - While a sampling window is open, `fraction` of all requests are profiled;
+      the window lives in Mongo and a background task re-reads it every
+      `settings_ttl` seconds, so the per-request check never touches the database
+    - Profiles are kept `retention_days` as a call tree (text) and speedscope JSON,
+      which flamegraph viewers such as speedscope.app open directly
+    """
+
+    def __init__(self, enabled: bool = True, interval: float = 0.001, retention_days: int = 7, settings_ttl: float = 5.0):
+        self.enabled = enabled and Profiler is not None
+        self.interval = interval
+        self.retention_days = retention_days
+        self.settings_ttl = settings_ttl
+
+        self._fraction = 0.0
+        self._until = 0.0
+        self._task = None
+        self._indexed = False
+
+    @property
+    def collection(self):
+        return db.request_profiles
+
+    # ---------------- Triggers ----------------
+    def mint_token(self, admin_email: str, minutes: int = 10) -> str:
+        expire = datetime.utcnow() + timedelta(minutes=minutes)
+        return jwt.encode({"sub": admin_email, "scope": "profile", "exp": expire}, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+    def token_subject(self, token: str) -> str | None:
+        """
+        Admin email from a valid profile token, else None
+        """
+        try:
+            payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        except JWTError:
+            return None
+        if payload.get("scope") != "profile":
+            return None
+        return payload.get("sub")
+
+    def sample(self) -> bool:
+        """
+        True if this request falls in the open sampling window's fraction (in memory only)
+        """
+        return self._fraction > 0 and time.time() < self._until and random.random() < self._fraction
+
+    # ---------------- Lifecycle ----------------
+    async def start(self):
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await loop.run_in_executor(None, self._load_sampling)
+            await asyncio.sleep(self.settings_ttl)
+
+    def _load_sampling(self):
+        try:
+            doc = db.profiling_settings.find_one({"_id": SETTINGS_ID})
+        except Exception as e:
+            logger.warning(f"Could not read profiling settings: {e}")
+            return
+        if doc is None:
+            self._fraction, self._until = 0.0, 0.0
+        else:
+            self._fraction, self._until = doc["fraction"], _epoch(doc["until"])
+
+    def start_sampling(self, fraction: float, minutes: int, admin_email: str) -> dict:
+        until = datetime.utcnow() + timedelta(minutes=minutes)
+        doc = {"fraction": fraction, "until": until, "started_by": admin_email, "started_at": datetime.utcnow()}
+        db.profiling_settings.replace_one({"_id": SETTINGS_ID}, doc, upsert=True)
+        # This worker follows at once; the others on their next refresh
+        self._fraction, self._until = fraction, _epoch(until)
+        return doc
+
+    def stop_sampling(self):
+        db.profiling_settings.delete_one({"_id": SETTINGS_ID})
+        self._fraction, self._until = 0.0, 0.0
+
+    def sampling_status(self) -> dict | None:
+        doc = db.profiling_settings.find_one({"_id": SETTINGS_ID}, {"_id": 0})
+        if doc is None or doc["until"] < datetime.utcnow():
+            return None
+        return doc
+
+    # ---------------- Capture ----------------
+    def start_profiler(self):
+        profiler = Profiler(interval=self.interval, async_mode="enabled")
+        profiler.start()
+        return profiler
+
+    def save(self, profiler, meta: dict):
+        """
+        Render and store a stopped profiler (runs in the executor, off the request path)
+        """
+        try:
+            if not self._indexed:
+                self.collection.create_index("created_at", expireAfterSeconds=self.retention_days * 86400)
+                self.collection.create_index([("route", 1), ("created_at", -1)])
+                self._indexed = True
+            self.collection.insert_one({
+                **meta,
+                "pid": os.getpid(),
+                "created_at": datetime.utcnow(),
+                "text": profiler.output_text(unicode=True),
+                "speedscope": profiler.output(renderer=SpeedscopeRenderer()),
+            })
+        except Exception:
+            logger.exception(f"Failed to store profile {meta.get('_id')}")
+
+    def new_id(self) -> str:
+        return str(uuid.uuid4())
+
+    # ---------------- Retrieval ----------------
+    def list(self, route: str | None = None, limit: int = 50) -> list:
+        query = {"route": route} if route else {}
+        return list(self.collection.find(query, PROFILE_SUMMARY_PROJECTION).sort("created_at", -1).limit(limit))
+
+    def get(self, profile_id: str) -> dict | None:
+        return self.collection.find_one({"_id": profile_id})
+
+
+request_profiler = RequestProfiler(
+    enabled=PROFILING_ENABLED,
+    interval=PROFILING_INTERVAL_MS / 1000,
+    retention_days=PROFILING_RETENTION_DAYS,
+)
@@ -0,0 +1,42 @@
+"""
+Projections
+Translate `fields=` query parameters into MongoDB projections
+"""
+
+from fastapi import HTTPException
+
+# Never returned, whatever a client asks for
+FORBIDDEN_FIELDS = frozenset({"password", "password_hash"})
+
+
+def build_projection(fields: str | None, allowed: set, default: dict | None = None) -> dict | None:
+    """
+    Build a projection for a comma-separated `fields` list.
+
+    - `id` maps to Mongo's `_id`, which is always returned
+    - Unknown or forbidden fields are rejected with 400
+    - Without `fields`, the endpoint's lean `default` projection is used
+    """
+    if not fields:
+        return default
+
+    projection = {}
+    for name in (f.strip() for f in fields.split(",")):
+        if not name or name == "id":
+            continue
+        if name in FORBIDDEN_FIELDS or name not in allowed:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {name}")
+        projection[name] = 1
+
+    # Only an id was requested
+    return projection or {"_id": 1}
+
+
+def rename_ids(docs: list) -> list:
+    """
+    Expose Mongo's `_id` as `id` on each document, in place
+    """
+    for doc in docs:
+        if "_id" in doc:
+            doc["id"] = doc.pop("_id")
+    return docs
@@ -0,0 +1,288 @@
+"""
+Rate Limiting
+Token-bucket / sliding-window limiter with lock-sharded in-memory state
+and a pluggable shared store for multi-worker deployments
+"""
+
+import math
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request
+
+
+PERIODS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+}
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """
+    A named limit of `limit` hits per `period` seconds.
+
+    algorithm:
+    - "token_bucket": allows bursts of up to `limit`, refilling continuously
+    - "sliding_window": strict count over the trailing `period` seconds
+    """
+    name: str
+    limit: int
+    period: float
+    algorithm: str = "token_bucket"
+
+    @classmethod
+    def parse(cls, name: str, spec: str, algorithm: str = "token_bucket") -> "RateLimitPolicy":
+        """
+        Parse a "5/minute" or "20/60" style spec
+        """
+        count, _, per = spec.strip().partition("/")
+        per = per.strip().lower().rstrip("s") or "minute"
+        period = PERIODS[per] if per in PERIODS else float(per)
+        return cls(name=name, limit=int(count), period=period, algorithm=algorithm)
+
+
+# ============================================================
+# Stores
+# ============================================================
+
+class RateLimitStore:
+    """
+    Interface for limiter state. Implementations must make `hit` atomic per key.
+    """
+
+    def hit(self, key: str, policy: RateLimitPolicy, now: float) -> float:
+        """
+        Record one hit for `key` under `policy`.
+
+        Returns 0 if the hit is allowed, otherwise the seconds until it would be.
+        """
+        raise NotImplementedError
+
+    def reset(self, key: str):
+        raise NotImplementedError
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class _Window:
+    __slots__ = ("start", "current", "previous", "updated")
+
+    def __init__(self, start: float, updated: float):
+        self.start = start
+        self.current = 0
+        self.previous = 0
+        self.updated = updated
+
+
+class ShardedMemoryStore(RateLimitStore):
+    """
+    Per-process store. Keys are spread over `shards` independently locked
+    dicts so concurrent threads rarely contend on the same lock. Idle keys
+    are swept from a shard once it grows past `max_keys_per_shard`.
+    """
+
+    def __init__(self, shards: int = 64, max_keys_per_shard: int = 4096, idle_seconds: float = 3600):
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self.max_keys_per_shard = max_keys_per_shard
+        self.idle_seconds = idle_seconds
+
+    def _shard(self, key: str):
+        return self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+
+    def hit(self, key: str, policy: RateLimitPolicy, now: float) -> float:
+        entries, lock = self._shard(key)
+        with lock:
+            if policy.algorithm == "sliding_window":
+                return self._hit_window(entries, key, policy, now)
+            return self._hit_bucket(entries, key, policy, now)
+
+    def _hit_bucket(self, entries: dict, key: str, policy: RateLimitPolicy, now: float) -> float:
+        bucket = entries.get(key)
+        if bucket is None:
+            self._maybe_sweep(entries, now)
+            bucket = entries[key] = _Bucket(float(policy.limit), now)
+
+        rate = policy.limit / policy.period
+        bucket.tokens = min(float(policy.limit), bucket.tokens + (now - bucket.updated) * rate)
+        bucket.updated = now
+        if bucket.tokens >= 1.0:
+            bucket.tokens -= 1.0
+            return 0.0
+        return (1.0 - bucket.tokens) / rate
+
+    def _hit_window(self, entries: dict, key: str, policy: RateLimitPolicy, now: float) -> float:
+        window = entries.get(key)
+        start = now - (now % policy.period)
+        if window is None:
+            self._maybe_sweep(entries, now)
+            window = entries[key] = _Window(start, now)
+
+        if start != window.start:
+            # Roll forward; anything older than one full window no longer counts
+            window.previous = window.current if start - window.start == policy.period else 0
+            window.current = 0
+            window.start = start
+        window.updated = now
+
+        # Weight the previous window by how much of it still overlaps the trailing period
+        overlap = 1.0 - (now - start) / policy.period
+        estimated = window.previous * overlap + window.current
+        if estimated + 1 > policy.limit:
+            if window.previous and overlap > 0:
+                needed = (estimated + 1 - policy.limit) / window.previous * policy.period
+                return min(needed, start + policy.period - now)
+            return start + policy.period - now
+        window.current += 1
+        return 0.0
+
+    def _maybe_sweep(self, entries: dict, now: float):
+        if len(entries) < self.max_keys_per_shard:
+            return
+        cutoff = now - self.idle_seconds
+        for stale in [k for k, v in entries.items() if v.updated < cutoff]:
+            del entries[stale]
+
+    def reset(self, key: str):
+        entries, lock = self._shard(key)
+        with lock:
+            entries.pop(key, None)
+
+    def __len__(self):
+        return sum(len(entries) for entries, _ in self._shards)
+
+
+class MongoStore(RateLimitStore):
+    """
+    Shared store for multi-worker deployments. Both algorithms are served
+    as fixed windows counted with an atomic $inc, and a TTL index removes
+    expired windows.
+
+    Holds the (lazy) database rather than a collection and looks the collection
+    up on each hit, so building the store never connects and every (forked)
+    worker uses its own client.
+    """
+
+    def __init__(self, database, collection_name: str = "rate_limits"):
+        self.database = database
+        self.collection_name = collection_name
+        self._indexed = False
+
+    @property
+    def collection(self):
+        return self.database[self.collection_name]
+
+    def hit(self, key: str, policy: RateLimitPolicy, now: float) -> float:
+        from datetime import datetime, timezone
+        from pymongo import ReturnDocument
+
+        if not self._indexed:
+            self.collection.create_index("expires_at", expireAfterSeconds=0)
+            self._indexed = True
+
+        start = now - (now % policy.period)
+        doc = self.collection.find_one_and_update(
+            {"_id": f"{key}:{int(start)}"},
+            {
+                "$inc": {"count": 1},
+                "$setOnInsert": {
+                    "expires_at": datetime.fromtimestamp(start + policy.period, tz=timezone.utc)
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc["count"] > policy.limit:
+            return start + policy.period - now
+        return 0.0
+
+    def reset(self, key: str):
+        self.collection.delete_many({"_id": {"$regex": f"^{re.escape(key)}:"}})
+
+
+# ============================================================
+# Limiter
+# ============================================================
+
+class RateLimiter:
+    """
+    Applies named policies to keys and raises HTTP 429 when a limit is exceeded
+    """
+
+    def __init__(self, store: RateLimitStore | None = None, enabled: bool = True, trust_forwarded: bool = False):
+        self.store = store or ShardedMemoryStore()
+        self.enabled = enabled
+        self.trust_forwarded = trust_forwarded
+        self.policies: dict[str, RateLimitPolicy] = {}
+
+    def add_policy(self, policy: RateLimitPolicy):
+        self.policies[policy.name] = policy
+
+    def client_ip(self, request: Request) -> str:
+        if self.trust_forwarded:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    def hit(self, policy_name: str, key: str) -> float:
+        """
+        Record a hit; returns seconds to wait (0 when allowed)
+        """
+        policy = self.policies.get(policy_name)
+        if not self.enabled or policy is None:
+            return 0.0
+        return self.store.hit(f"{policy_name}:{key}", policy, time.time())
+
+    def check(self, request: Request, route: str, email: str | None = None):
+        """
+        Enforce the "<route>_ip" and "<route>_email" policies for a request
+        """
+        retry_after = self.hit(f"{route}_ip", self.client_ip(request))
+        if not retry_after and email:
+            retry_after = self.hit(f"{route}_email", email.strip().lower())
+        if retry_after:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests. Please try again later.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+
+def build_limiter() -> RateLimiter:
+    """
+    Create the application limiter from config settings
+    """
+    from config import (
+        RATE_LIMIT_ENABLED,
+        RATE_LIMIT_STORE,
+        RATE_LIMIT_TRUST_FORWARDED,
+        RATE_LIMIT_POLICIES,
+    )
+
+    if RATE_LIMIT_STORE == "mongo":
+        from database import db
+        store = MongoStore(db)
+    else:
+        store = ShardedMemoryStore()
+
+    rate_limiter = RateLimiter(store, enabled=RATE_LIMIT_ENABLED, trust_forwarded=RATE_LIMIT_TRUST_FORWARDED)
+    for name, spec in RATE_LIMIT_POLICIES.items():
+        # Per-email limits are strict; per-IP limits tolerate bursts from shared campus NATs
+        algorithm = "sliding_window" if name.endswith("_email") else "token_bucket"
+        rate_limiter.add_policy(RateLimitPolicy.parse(name, spec, algorithm))
+    return rate_limiter
+
+
+limiter = build_limiter()
@@ -0,0 +1,92 @@
+"""
+Refresh Tokens
+Rotating, single-use refresh tokens so sessions renew without a password (and bcrypt) check
+"""
+
+import hashlib
+import hmac
+import logging
+import secrets
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+from config import JWT_SECRET_KEY, REFRESH_TOKEN_EXPIRE_DAYS
+from database import db
+
+logger = logging.getLogger("app.auth")
+
+
+class RefreshTokenStore:
+    """
+    Refresh tokens in the `refresh_tokens` collection.
+
+    - Tokens are random and stored only as an HMAC-SHA256 digest, used as `_id`,
+      so validation is a single primary-key lookup
+    - Every login starts a family; each refresh consumes its token and issues
+      the next one in the same family
+    - Presenting a token that was already consumed means a copy leaked: the
+      whole family is revoked, logging out both holders
+    - Tokens expire `expire_days` after they were issued (TTL index)
+    """
+
+    def __init__(self, expire_days: int = 14):
+        self.expire = timedelta(days=expire_days)
+        self._indexed = False
+
+    @property
+    def collection(self):
+        if not self._indexed:
+            db.refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
+            db.refresh_tokens.create_index("family")
+            self._indexed = True
+        return db.refresh_tokens
+
+    def _digest(self, token: str) -> str:
+        return hmac.new(JWT_SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+    def issue(self, email: str, family: str | None = None) -> str:
+        token = secrets.token_urlsafe(32)
+        now = datetime.utcnow()
+        self.collection.insert_one({
+            "_id": self._digest(token),
+            "email": email,
+            "family": family or str(uuid.uuid4()),
+            "created_at": now,
+            "expires_at": now + self.expire,
+        })
+        return token
+
+    def rotate(self, token: str) -> tuple[str, str] | None:
+        """
+        Consume `token` and issue its successor: (email, new token), or None if invalid
+        """
+        digest = self._digest(token)
+        now = datetime.utcnow()
+        doc = self.collection.find_one_and_update(
+            {"_id": digest, "used_at": None, "revoked_at": None, "expires_at": {"$gt": now}},
+            {"$set": {"used_at": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            used = self.collection.find_one({"_id": digest, "used_at": {"$ne": None}}, {"family": 1, "email": 1})
+            if used is not None:
+                logger.warning(f"⚠️ Refresh token reuse for {used['email']}, revoking session family {used['family']}")
+                self.revoke_family(used["family"])
+            return None
+        return doc["email"], self.issue(doc["email"], doc["family"])
+
+    def revoke(self, token: str):
+        """
+        End the session `token` belongs to (logout)
+        """
+        doc = self.collection.find_one({"_id": self._digest(token)}, {"family": 1})
+        if doc is not None:
+            self.revoke_family(doc["family"])
+
+    def revoke_family(self, family: str):
+        self.collection.update_many({"family": family, "revoked_at": None}, {"$set": {"revoked_at": datetime.utcnow()}})
+
+
+refresh_tokens = RefreshTokenStore(expire_days=REFRESH_TOKEN_EXPIRE_DAYS)
@@ -0,0 +1,20 @@
+"""
+Request Context
+The ASGI scope of the request being handled, for code without access to the request
+(e.g. PyMongo event listeners attributing queries to routes)
+"""
+
+from contextvars import ContextVar
+
+current_scope: ContextVar[dict | None] = ContextVar("current_scope", default=None)
+
+
+def current_route() -> str | None:
+    """
+    "METHOD /route/{template}" of the current request, or None outside a request
+    """
+    scope = current_scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', None) or scope['path']}"
@@ -0,0 +1,271 @@
+"""
+File Storage
+Where uploaded files live: a local directory or an S3-compatible bucket.
+
+Resources keep backend-neutral "/uploads/<key>" URLs, so files can move
+between backends (or buckets) without touching the database.
+"""
+
+import math
+import os
+import re
+import shutil
+import uuid
+from urllib.parse import quote
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
+    from botocore.exceptions import ClientError
+except ImportError:  # optional - local storage only without it
+    boto3 = None
+
+from config import (
+    STORAGE_BACKEND,
+    UPLOAD_ROOT,
+    S3_BUCKET,
+    S3_REGION,
+    S3_ENDPOINT_URL,
+    S3_PUBLIC_ENDPOINT_URL,
+    S3_ACCESS_KEY_ID,
+    S3_SECRET_ACCESS_KEY,
+    STORAGE_PRESIGN_EXPIRE_SECONDS,
+    STORAGE_MULTIPART_THRESHOLD_MB,
+    STORAGE_MULTIPART_PART_MB,
+)
+
+UPLOAD_URL_PREFIX = "/uploads/"
+# S3 allows at most 10,000 parts per upload
+MAX_PARTS = 10_000
+
+_UNSAFE_NAME_CHARS = re.compile(r"[^\w.\- ]")
+_NEW_KEY_NAME = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}_[\w.\- ]+$")
+
+
+def new_key(directory: str, filename: str) -> str:
+    """
+    Key for a new upload: "<directory>/<uuid4>_<original name>"
+    """
+    name = _UNSAFE_NAME_CHARS.sub("_", os.path.basename(filename or "")).strip() or "file"
+    return f"{directory}/{uuid.uuid4()}_{name}"
+
+
+def is_new_key(key: str, directory: str) -> bool:
+    """
+    Whether `key` has the shape new_key() gives uploads in `directory`
+    """
+    prefix, _, name = key.partition("/")
+    return prefix == directory and bool(_NEW_KEY_NAME.match(name))
+
+
+def key_from_url(file_url: str | None) -> str | None:
+    """
+    The storage key behind a "/uploads/<key>" file URL, or None for anything else
+    """
+    if not file_url or not file_url.startswith(UPLOAD_URL_PREFIX):
+        return None
+    key = file_url[len(UPLOAD_URL_PREFIX):]
+    if not key or ".." in key.split("/"):
+        return None
+    return key
+
+
+def url_for_key(key: str) -> str:
+    return UPLOAD_URL_PREFIX + key
+
+
+def content_disposition(filename: str, attachment: bool) -> str:
+    kind = "attachment" if attachment else "inline"
+    return f"{kind}; filename*=UTF-8''{quote(filename)}"
+
+
+class LocalStorage:
+    """
+    Files under a local directory, served by the API itself
+    """
+
+    supports_direct_upload = False
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        root = os.path.realpath(self.root)
+        path = os.path.realpath(os.path.join(root, key))
+        if not path.startswith(root + os.sep):
+            raise ValueError(f"{key} is outside {self.root}/")
+        return path
+
+    def save(self, key: str, fileobj, content_type: str | None = None):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(fileobj, f, 1024 * 1024)
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def size(self, key: str) -> int | None:
+        try:
+            return os.path.getsize(self.path(key))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def read(self, key: str) -> bytes | None:
+        try:
+            with open(self.path(key), "rb") as f:
+                return f.read()
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def download_url(self, key: str, filename: str, attachment: bool) -> str | None:
+        # No redirect: the API streams the file from disk
+        return None
+
+
+class S3Storage:
+    """
+    Files in an S3-compatible bucket. Clients download (and may upload)
+    through presigned URLs, so file bytes never pass through API workers.
+    """
+
+    supports_direct_upload = True
+
+    def __init__(self, bucket: str, region: str, endpoint_url: str | None = None,
+                 public_endpoint_url: str | None = None, access_key_id: str | None = None,
+                 secret_access_key: str | None = None, presign_expire: int = 900,
+                 multipart_threshold: int = 16 * 1024 * 1024, part_size: int = 16 * 1024 * 1024):
+        if boto3 is None:
+            raise RuntimeError("STORAGE_BACKEND=s3 needs boto3 (pip install boto3)")
+        if not bucket:
+            raise RuntimeError("STORAGE_BACKEND=s3 needs S3_BUCKET")
+        self.bucket = bucket
+        self.presign_expire = presign_expire
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+
+        session = boto3.session.Session(
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            region_name=region,
+        )
+        config = Config(
+            signature_version="s3v4",
+            # Stand-ins like MinIO are addressed by path, not bucket subdomain
+            s3={"addressing_style": "path"} if endpoint_url else {},
+            retries={"max_attempts": 5, "mode": "standard"},
+        )
+        self.client = session.client("s3", endpoint_url=endpoint_url, config=config)
+        # URLs are signed for the host clients use, which may differ from ours
+        self.presigner = (
+            session.client("s3", endpoint_url=public_endpoint_url, config=config)
+            if public_endpoint_url != endpoint_url else self.client
+        )
+        self.transfer = TransferConfig(multipart_threshold=multipart_threshold, multipart_chunksize=part_size)
+
+    # ---------------- Through the API ----------------
+    def save(self, key: str, fileobj, content_type: str | None = None):
+        # upload_fileobj switches to a parallel multipart upload past the threshold
+        extra = {"ContentType": content_type} if content_type else None
+        self.client.upload_fileobj(fileobj, self.bucket, key, ExtraArgs=extra, Config=self.transfer)
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def size(self, key: str) -> int | None:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def read(self, key: str) -> bytes | None:
+        """
+        A whole (small) object, or None if there is none
+        """
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    # ---------------- Direct to the store ----------------
+    def download_url(self, key: str, filename: str, attachment: bool) -> str:
+        return self.presigner.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key, "ResponseContentDisposition": content_disposition(filename, attachment)},
+            ExpiresIn=self.presign_expire,
+        )
+
+    def presign_upload(self, key: str, content_type: str, size: int) -> dict:
+        """
+        How a client should upload `size` bytes to `key`: one presigned PUT, or
+        presigned part URLs for a multipart upload finished by `complete_upload`
+        """
+        if size < self.multipart_threshold:
+            url = self.presigner.generate_presigned_url(
+                "put_object",
+                # The signature covers the length, so the PUT cannot send more (or less)
+                Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type, "ContentLength": size},
+                ExpiresIn=self.presign_expire,
+            )
+            return {"method": "PUT", "url": url, "headers": {"Content-Type": content_type, "Content-Length": str(size)}}
+
+        part_size = max(self.part_size, math.ceil(size / MAX_PARTS))
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key, ContentType=content_type)["UploadId"]
+        parts = [
+            {
+                "part_number": n,
+                "url": self.presigner.generate_presigned_url(
+                    "upload_part",
+                    Params={"Bucket": self.bucket, "Key": key, "UploadId": upload_id, "PartNumber": n},
+                    ExpiresIn=self.presign_expire,
+                ),
+            }
+            for n in range(1, math.ceil(size / part_size) + 1)
+        ]
+        return {"method": "multipart", "upload_id": upload_id, "part_size": part_size, "parts": parts}
+
+    def complete_upload(self, key: str, upload_id: str, parts: list):
+        """
+        Assemble a multipart upload from [{"part_number", "etag"}] reported by the client
+        """
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": [
+                {"PartNumber": p["part_number"], "ETag": p["etag"]}
+                for p in sorted(parts, key=lambda p: p["part_number"])
+            ]},
+        )
+
+    def abort_upload(self, key: str, upload_id: str):
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+
+
+def create_storage():
+    if STORAGE_BACKEND == "s3":
+        return S3Storage(
+            bucket=S3_BUCKET,
+            region=S3_REGION,
+            endpoint_url=S3_ENDPOINT_URL,
+            public_endpoint_url=S3_PUBLIC_ENDPOINT_URL,
+            access_key_id=S3_ACCESS_KEY_ID,
+            secret_access_key=S3_SECRET_ACCESS_KEY,
+            presign_expire=STORAGE_PRESIGN_EXPIRE_SECONDS,
+            multipart_threshold=STORAGE_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+            part_size=STORAGE_MULTIPART_PART_MB * 1024 * 1024,
+        )
+    if STORAGE_BACKEND != "local":
+        raise RuntimeError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return LocalStorage(UPLOAD_ROOT)
+
+
+storage = create_storage()
@@ -0,0 +1,234 @@
+"""
+Trending Resources
+Hourly download buckets maintained incrementally from download events, ranked
+with exponential decay into a top-K per (subject, semester) held in memory
+"""
+
+import asyncio
+import heapq
+import logging
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+from config import (
+    TRENDING_WINDOW_HOURS,
+    TRENDING_HALF_LIFE_HOURS,
+    TRENDING_TOP_K,
+    TRENDING_REFRESH_SECONDS,
+)
+from database import db
+
+logger = logging.getLogger("app.trending")
+
+# What a trending entry shows about its resource
+TRENDING_PROJECTION = {"title": 1, "subject": 1, "semester": 1, "year": 1, "download_count": 1}
+
+
+def _hour(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+class TrendingResources:
+    """
+    Rolling download counts and the rankings built from them.
+
+    - Download events (via `DownloadEventBuffer.subscribe`) are folded into
+      per-hour counters and `$inc`ed into `download_buckets`, one document per
+      resource and hour, so every worker contributes to the same counts
+    - Each refresh pulls only the buckets updated since the previous one into
+      memory, drops hours that left the window and re-ranks; a bucket's weight
+      halves every `half_life` hours
+    - Rankings are kept per (subject, semester), per subject, per semester and
+      overall, `top_k` deep, and read without touching Mongo
+    """
+
+    def __init__(self, window_hours: int = 168, half_life: float = 48, top_k: int = 20, refresh_interval: float = 60):
+        self.window = timedelta(hours=window_hours)
+        self.half_life = half_life
+        self.top_k = top_k
+        self.refresh_interval = refresh_interval
+
+        self._pending = Counter()
+        self._buckets = defaultdict(dict)  # (type, id) -> {hour: count}
+        self._groups = {}                   # (type, id) -> (subject, semester)
+        self._since = None
+        self._rankings = {}
+        self._task = None
+        self._indexed = False
+
+        self.refreshed_at = None
+        self.last_refresh_ms = None
+
+    @property
+    def collection(self):
+        return db.download_buckets
+
+    # ---------------- Lifecycle ----------------
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._pending:
+            pending, self._pending = self._pending, Counter()
+            await asyncio.get_running_loop().run_in_executor(None, self._write_buckets, pending)
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+    # ---------------- Counting ----------------
+    def record(self, events: list):
+        """
+        Download event subscriber: count written events into hourly buckets
+        """
+        for event in events:
+            if event["action"] != "download":
+                continue
+            key = (event["resource_type"], event["resource_id"], event["subject"], event["semester"], _hour(event["ts"]))
+            self._pending[key] += 1
+
+    def _write_buckets(self, pending: Counter) -> bool:
+        if not self._indexed:
+            # Buckets outlive the window by an hour, then Mongo removes them
+            self.collection.create_index("hour", expireAfterSeconds=int(self.window.total_seconds()) + 3600)
+            self.collection.create_index("updated_at")
+            self._indexed = True
+
+        now = datetime.utcnow()
+        updates = [
+            UpdateOne(
+                {"_id": f"{resource_type}:{resource_id}:{hour:%Y%m%d%H}"},
+                {
+                    "$inc": {"count": n},
+                    "$set": {"updated_at": now},
+                    "$setOnInsert": {
+                        "resource_type": resource_type,
+                        "resource_id": resource_id,
+                        "subject": subject,
+                        "semester": semester,
+                        "hour": hour,
+                    },
+                },
+                upsert=True,
+            )
+            for (resource_type, resource_id, subject, semester, hour), n in pending.items()
+        ]
+        try:
+            self.collection.bulk_write(updates, ordered=False)
+        except Exception as e:
+            logger.warning(f"Trending bucket update failed, will retry: {e}")
+            return False
+        return True
+
+    # ---------------- Ranking ----------------
+    async def refresh(self):
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        if self._pending:
+            pending, self._pending = self._pending, Counter()
+            if not await loop.run_in_executor(None, self._write_buckets, pending):
+                self._pending.update(pending)
+        try:
+            rankings = await loop.run_in_executor(None, self._rank)
+        except Exception as e:
+            logger.warning(f"Trending refresh failed: {e}")
+            return
+        self._rankings = rankings
+        self.refreshed_at = datetime.utcnow()
+        self.last_refresh_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    def _load_buckets(self, now: datetime):
+        window_start = _hour(now) - self.window
+        query = {"hour": {"$gt": window_start}}
+        if self._since is not None:
+            # Overlap by one interval for clock skew between workers; reloading a bucket is idempotent
+            query["updated_at"] = {"$gte": self._since - timedelta(seconds=self.refresh_interval)}
+
+        for doc in self.collection.find(query, {"updated_at": 0}):
+            key = (doc["resource_type"], doc["resource_id"])
+            self._buckets[key][doc["hour"]] = doc["count"]
+            self._groups[key] = (doc.get("subject"), doc.get("semester"))
+        self._since = now
+
+        for key in list(self._buckets):
+            hours = self._buckets[key]
+            for hour in [h for h in hours if h <= window_start]:
+                del hours[hour]
+            if not hours:
+                del self._buckets[key]
+                del self._groups[key]
+
+    def _rank(self) -> dict:
+        """
+        Runs in the executor: sync buckets, score, and resolve the top entries
+        """
+        now = datetime.utcnow()
+        self._load_buckets(now)
+
+        current = _hour(now)
+        candidates = defaultdict(list)
+        for key, hours in self._buckets.items():
+            score = sum(
+                count * 0.5 ** ((current - hour).total_seconds() / 3600 / self.half_life)
+                for hour, count in hours.items()
+            )
+            entry = (score, sum(hours.values()), key[1])
+            subject, semester = self._groups[key]
+            resource_type = key[0]
+            for group in {(subject, semester), (subject, None), (None, semester), (None, None)}:
+                candidates[(resource_type, *group)].append(entry)
+
+        top = {group: heapq.nlargest(self.top_k, entries) for group, entries in candidates.items()}
+
+        # Titles etc. for everything that made a list, one query per resource type
+        ids = defaultdict(set)
+        for (resource_type, _, _), entries in top.items():
+            ids[resource_type].update(resource_id for _, _, resource_id in entries)
+        docs = {}
+        for resource_type, resource_ids in ids.items():
+            for doc in db[resource_type].find({"_id": {"$in": list(resource_ids)}}, TRENDING_PROJECTION):
+                docs[(resource_type, doc.pop("_id"))] = doc
+
+        rankings = {}
+        for group, entries in top.items():
+            resource_type = group[0]
+            rankings[group] = [
+                {"id": resource_id, **docs[(resource_type, resource_id)], "score": round(score, 3), "recent_downloads": recent}
+                for score, recent, resource_id in entries
+                if (resource_type, resource_id) in docs  # deleted since
+            ]
+        return rankings
+
+    def top(self, resource_type: str, subject: str | None = None, semester: str | None = None, limit: int | None = None) -> list:
+        entries = self._rankings.get((resource_type, subject, semester), [])
+        return entries[:limit] if limit else entries
+
+    # ---------------- Reporting ----------------
+    def snapshot(self) -> dict:
+        return {
+            "tracked_resources": len(self._buckets),
+            "pending_buckets": len(self._pending),
+            "rankings": len(self._rankings),
+            "refreshed_at": self.refreshed_at.isoformat() if self.refreshed_at else None,
+            "last_refresh_ms": self.last_refresh_ms,
+        }
+
+
+trending = TrendingResources(
+    window_hours=TRENDING_WINDOW_HOURS,
+    half_life=TRENDING_HALF_LIFE_HOURS,
+    top_k=TRENDING_TOP_K,
+    refresh_interval=TRENDING_REFRESH_SECONDS,
+)
@@ -0,0 +1,378 @@
+"""
+Upload Sessions
+Resumable chunked uploads: chunks are staged on disk as they arrive, each
+with its own checksum, and streamed into storage once the last one is in
+"""
+
+import asyncio
+import base64
+import binascii
+import glob
+import hashlib
+import logging
+import os
+import shutil
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from config import (
+    UPLOAD_STAGING_DIR,
+    UPLOAD_MAX_MB,
+    UPLOAD_CHUNK_MAX_MB,
+    UPLOAD_CHUNK_MIN_KB,
+    UPLOAD_SESSION_TTL_HOURS,
+    UPLOAD_SESSION_GC_INTERVAL_SECONDS,
+)
+from database import db
+from utils.storage import storage
+
+logger = logging.getLogger("app.uploads")
+
+WRITE_BUFFER_BYTES = 1024 * 1024
+READ_BLOCK_BYTES = 1024 * 1024
+# Half-written chunks (the request died mid-body) are removed after this long
+STALE_TEMP_SECONDS = 3600
+
+
+def parse_checksum(header: str | None) -> bytes | None:
+    """
+    Digest from an `Upload-Checksum: sha256 <base64>` header
+    """
+    if not header:
+        return None
+    algorithm, _, value = header.strip().partition(" ")
+    if algorithm.lower() != "sha256":
+        raise HTTPException(status_code=400, detail="Upload-Checksum must use sha256")
+    try:
+        return base64.b64decode(value.strip(), validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Upload-Checksum is not valid base64")
+
+
+class StagedChunks:
+    """
+    File-like reader over a session's staged chunks, in order. Checks each
+    chunk against the digest recorded when it arrived, and hashes the whole.
+    """
+
+    def __init__(self, directory: str, chunks: list):
+        self.directory = directory
+        self._chunks = iter(sorted(chunks, key=lambda c: c["offset"]))
+        self._current = None
+        self._file = None
+        self._chunk_hash = None
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        # Fill the request across chunk boundaries: boto3 takes a short read for the end
+        if size is None or size < 0:
+            size = READ_BLOCK_BYTES
+        out = bytearray()
+        while len(out) < size:
+            data = self._read_chunk(size - len(out))
+            if not data:
+                break
+            out += data
+        return bytes(out)
+
+    def _read_chunk(self, size: int) -> bytes:
+        while True:
+            if self._file is None:
+                self._current = next(self._chunks, None)
+                if self._current is None:
+                    return b""
+                self._file = open(os.path.join(self.directory, chunk_name(self._current)), "rb")
+                self._chunk_hash = hashlib.sha256()
+            data = self._file.read(size)
+            if data:
+                self._chunk_hash.update(data)
+                self.sha256.update(data)
+                self.size += len(data)
+                return data
+            self._file.close()
+            self._file = None
+            if self._chunk_hash.hexdigest() != self._current["sha256"]:
+                raise ValueError(f"staged chunk at offset {self._current['offset']} is corrupt")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def chunk_name(chunk: dict) -> str:
+    # The digest is part of the name so two racing PATCHes never share a file
+    return f"{chunk['offset']:012d}-{chunk['sha256'][:16]}.part"
+
+
+class UploadSessions:
+    """
+    Upload sessions in the `upload_sessions` collection, chunks under `staging_dir`.
+
+    - `create()` opens a session for a file of known size
+    - `append()` stages one chunk, which must start at the session's current
+      offset (a client that lost a response asks for the offset and resumes);
+      the body is streamed to disk and hashed, never held in memory
+    - `assemble()` streams the staged chunks, in order, into the storage
+      backend (a multipart upload on S3) and verifies every chunk on the way
+    - Sessions expire `ttl_hours` after their last chunk; a sweep every
+      `gc_interval` seconds removes expired sessions and orphaned chunks
+    """
+
+    def __init__(self, staging_dir: str = "spool/uploads", max_size: int = 512 * 1024 * 1024,
+                 chunk_max: int = 32 * 1024 * 1024, chunk_min: int = 256 * 1024,
+                 ttl_hours: float = 24, gc_interval: float = 600):
+        self.staging_dir = staging_dir
+        self.max_size = max_size
+        self.chunk_max = chunk_max
+        self.chunk_min = chunk_min
+        self.ttl = timedelta(hours=ttl_hours)
+        self.gc_interval = gc_interval
+        self._task = None
+        self._indexed = False
+        self.stats = Counter()
+
+    @property
+    def collection(self):
+        if not self._indexed:
+            db.upload_sessions.create_index("expires_at", expireAfterSeconds=0)
+            self._indexed = True
+        return db.upload_sessions
+
+    def _dir(self, session_id: str) -> str:
+        return os.path.join(self.staging_dir, session_id)
+
+    # ---------------- Lifecycle ----------------
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.sweep)
+            except Exception as e:
+                logger.warning(f"Upload session sweep failed: {e}")
+            await asyncio.sleep(self.gc_interval)
+
+    # ---------------- Sessions ----------------
+    def create(self, filename: str, content_type: str, size: int, sha256: str | None, created_by: str | None) -> dict:
+        if size <= 0:
+            raise HTTPException(status_code=400, detail="size must be positive")
+        if size > self.max_size:
+            raise HTTPException(status_code=413, detail=f"Files are limited to {self.max_size // (1024 * 1024)} MB")
+        now = datetime.utcnow()
+        doc = {
+            "_id": uuid.uuid4().hex,
+            "filename": filename,
+            "content_type": content_type,
+            "size": size,
+            "sha256": sha256.lower() if sha256 else None,
+            "offset": 0,
+            "chunks": [],
+            "state": "open",
+            "created_by": created_by,
+            "created_at": now,
+            "updated_at": now,
+            "expires_at": now + self.ttl,
+        }
+        self.collection.insert_one(doc)
+        self.stats["created"] += 1
+        return doc
+
+    def get(self, session_id: str) -> dict:
+        doc = self.collection.find_one({"_id": session_id}, {"chunks": 0})
+        if doc is None or doc["expires_at"] <= datetime.utcnow():
+            raise HTTPException(status_code=404, detail="Upload session not found or expired")
+        return doc
+
+    def describe(self, doc: dict) -> dict:
+        return {
+            "id": doc["_id"],
+            "filename": doc["filename"],
+            "size": doc["size"],
+            "offset": doc["offset"],
+            "state": doc["state"],
+            "chunk_min": self.chunk_min,
+            "chunk_max": self.chunk_max,
+            "expires_at": doc["expires_at"],
+        }
+
+    async def append(self, session_id: str, offset: int, body, checksum: bytes | None = None) -> dict:
+        """
+        Stage the chunk streamed by `body` (an async iterator of bytes) at `offset`
+        """
+        loop = asyncio.get_running_loop()
+        doc = await loop.run_in_executor(None, self.get, session_id)
+        if doc["state"] != "open":
+            raise HTTPException(status_code=409, detail="Upload session is being finalized")
+        if offset != doc["offset"]:
+            raise HTTPException(status_code=409, detail={"message": "Offset mismatch", "offset": doc["offset"]})
+        limit = min(self.chunk_max, doc["size"] - offset)
+
+        directory = self._dir(session_id)
+        os.makedirs(directory, exist_ok=True)
+        tmp = os.path.join(directory, f"{uuid.uuid4().hex}.tmp")
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            with open(tmp, "wb") as f:
+                buffer = bytearray()
+                async for piece in body:
+                    written += len(piece)
+                    if written > limit:
+                        raise HTTPException(status_code=413, detail=f"Chunk larger than {limit} bytes")
+                    digest.update(piece)
+                    buffer += piece
+                    if len(buffer) >= WRITE_BUFFER_BYTES:
+                        await loop.run_in_executor(None, f.write, bytes(buffer))
+                        buffer.clear()
+                if buffer:
+                    await loop.run_in_executor(None, f.write, bytes(buffer))
+
+            if written == 0:
+                raise HTTPException(status_code=400, detail="Empty chunk")
+            if written < self.chunk_min and offset + written != doc["size"]:
+                raise HTTPException(status_code=400, detail=f"Chunks before the last must be at least {self.chunk_min} bytes")
+            if checksum is not None and digest.digest() != checksum:
+                self.stats["checksum_mismatches"] += 1
+                raise HTTPException(status_code=400, detail="Chunk checksum mismatch")
+
+            chunk = {"offset": offset, "size": written, "sha256": digest.hexdigest()}
+            path = os.path.join(directory, chunk_name(chunk))
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        now = datetime.utcnow()
+        updated = await loop.run_in_executor(None, lambda: self.collection.find_one_and_update(
+            {"_id": session_id, "state": "open", "offset": offset},
+            {
+                "$set": {"offset": offset + written, "updated_at": now, "expires_at": now + self.ttl},
+                "$push": {"chunks": chunk},
+            },
+            projection={"chunks": 0},
+            return_document=ReturnDocument.AFTER,
+        ))
+        if updated is None:
+            # Another request for the same offset won; keep its file if it is this one
+            current = await loop.run_in_executor(None, lambda: self.collection.find_one({"_id": session_id}))
+            if current is None or chunk not in current.get("chunks", []):
+                os.remove(path)
+            offset_now = current["offset"] if current else None
+            raise HTTPException(status_code=409, detail={"message": "Offset mismatch", "offset": offset_now})
+        self.stats["chunks"] += 1
+        self.stats["bytes"] += written
+        return updated
+
+    async def assemble(self, session_id: str, key: str) -> dict:
+        """
+        Stream the complete upload into storage at `key`; returns {"size", "sha256"}
+        """
+        loop = asyncio.get_running_loop()
+        doc = await loop.run_in_executor(None, self.get, session_id)
+        if doc["offset"] != doc["size"]:
+            raise HTTPException(status_code=409, detail={"message": "Upload incomplete", "offset": doc["offset"]})
+        # Claim the session so a repeated request cannot assemble it twice
+        claimed = await loop.run_in_executor(None, lambda: self.collection.find_one_and_update(
+            {"_id": session_id, "state": "open", "offset": doc["size"]},
+            {"$set": {"state": "assembling", "updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        ))
+        if claimed is None:
+            raise HTTPException(status_code=409, detail="Upload session is already being finalized")
+
+        reader = StagedChunks(self._dir(session_id), claimed["chunks"])
+        try:
+            await loop.run_in_executor(None, storage.save, key, reader, claimed["content_type"])
+            if reader.size != claimed["size"]:
+                raise ValueError(f"assembled {reader.size} bytes, expected {claimed['size']}")
+            if claimed["sha256"] and reader.sha256.hexdigest() != claimed["sha256"]:
+                raise HTTPException(status_code=400, detail="File checksum mismatch")
+        except BaseException:
+            reader.close()
+            # Never leave a partial or unverified file behind
+            await loop.run_in_executor(None, storage.delete, key)
+            await loop.run_in_executor(None, self.reopen, session_id)
+            raise
+        reader.close()
+        self.stats["completed"] += 1
+        return {"size": reader.size, "sha256": reader.sha256.hexdigest()}
+
+    def reopen(self, session_id: str):
+        """
+        Let an assembled session be completed again (registering its file failed)
+        """
+        self.collection.update_one({"_id": session_id, "state": "assembling"}, {"$set": {"state": "open"}})
+
+    def discard(self, session_id: str):
+        """
+        Remove a session and its staged chunks (after assembly, or when the client gives up)
+        """
+        self.collection.delete_one({"_id": session_id})
+        shutil.rmtree(self._dir(session_id), ignore_errors=True)
+
+    # ---------------- Garbage collection ----------------
+    def sweep(self) -> int:
+        """
+        Remove expired sessions, staged chunks with no session and stale partial chunks
+        """
+        removed = 0
+        expired = [doc["_id"] for doc in self.collection.find({"expires_at": {"$lte": datetime.utcnow()}}, {"_id": 1})]
+        for session_id in expired:
+            self.discard(session_id)
+            removed += 1
+
+        if os.path.isdir(self.staging_dir):
+            ids = os.listdir(self.staging_dir)
+            live = {doc["_id"] for doc in self.collection.find({"_id": {"$in": ids}}, {"_id": 1})}
+            for session_id in ids:
+                if session_id not in live:
+                    shutil.rmtree(self._dir(session_id), ignore_errors=True)
+                    removed += 1
+            cutoff = time.time() - STALE_TEMP_SECONDS
+            for tmp in glob.glob(os.path.join(self.staging_dir, "*", "*.tmp")):
+                try:
+                    if os.path.getmtime(tmp) < cutoff:
+                        os.remove(tmp)
+                except FileNotFoundError:
+                    pass
+
+        if removed:
+            logger.info(f"🧹 Removed {removed} expired upload sessions")
+        self.stats["expired"] += removed
+        return removed
+
+    def snapshot(self) -> dict:
+        return dict(self.stats)
+
+
+upload_sessions = UploadSessions(
+    staging_dir=UPLOAD_STAGING_DIR,
+    max_size=UPLOAD_MAX_MB * 1024 * 1024,
+    chunk_max=UPLOAD_CHUNK_MAX_MB * 1024 * 1024,
+    chunk_min=UPLOAD_CHUNK_MIN_KB * 1024,
+    ttl_hours=UPLOAD_SESSION_TTL_HOURS,
+    gc_interval=UPLOAD_SESSION_GC_INTERVAL_SECONDS,
+)
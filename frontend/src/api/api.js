@@ -143,7 +143,7 @@ export const profileAPI = {
   },
   removePhoto: () => api.delete('/api/profile/photo'),
   updatePassword: (passwordData) => api.put('/api/profile/password', passwordData),
-  getPhoto: (userId) => `${API_BASE_URL}/api/profile/photo/${userId}`,
+  getPhoto: (userId, size) => `${API_BASE_URL}/api/profile/photo/${userId}${size ? `?size=${size}` : ''}`,
   getStats: () => api.get('/api/profile/stats')  // Get user statistics
 };
 
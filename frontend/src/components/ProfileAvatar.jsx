@@ -4,6 +4,7 @@ import { Camera, User, Sparkles } from 'lucide-react';
 import { Avatar, AvatarFallback, AvatarImage } from './ui/avatar';
 import { Button } from './ui/button';
 import { useToast } from './ui/advanced-toast';
+import { profileAPI } from '../api/api';
 
 const ProfileAvatar = ({ user, size = "lg", editable = false, showStatus = false }) => {
   const [isHovering, setIsHovering] = useState(false);
@@ -17,6 +18,9 @@ const ProfileAvatar = ({ user, size = "lg", editable = false, showStatus = false
     "2xl": "h-32 w-32"
   };
 
+  // Rendered width in px, doubled for high-DPI screens when picking a photo variant
+  const photoSizes = { sm: 64, md: 96, lg: 128, xl: 192, "2xl": 256 };
+
   const generateGradientAvatar = (name) => {
     const colors = [
       'from-blue-400 to-blue-600',
@@ -60,7 +64,7 @@ const ProfileAvatar = ({ user, size = "lg", editable = false, showStatus = false
       >
         <Avatar className={`${sizeClasses[size]} ring-2 ring-white dark:ring-gray-800 shadow-lg relative`}>
           <AvatarImage 
-            src={user?.profile_photo} 
+            src={user?.profile_photo ? profileAPI.getPhoto(user.id, photoSizes[size]) : undefined} 
             alt={user?.name || 'User avatar'} 
             className="object-cover"
           />
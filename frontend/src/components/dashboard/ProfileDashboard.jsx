@@ -214,7 +214,8 @@ const ProfileDashboard = () => {
     try {
       const response = await profileAPI.uploadPhoto(file);
       
-      // Update user context with new photo path
+      // Update user context with new photo path (an API path - components
+      // display it through profileAPI.getPhoto, which adds the API origin)
       const updatedUser = {
         ...currentUser,
         profile_photo: response.data.file_path
@@ -1,31 +1,20 @@
 #!/bin/bash
 # Automatic Database Backup Script
-# Backs up the database every hour and keeps last 24 backups
+# Run hourly: takes a full base once a day and incremental restore points
+# otherwise, then prunes to the retention in BACKUP_KEEP_* (see backend/backup.py)
 
-BACKUP_DIR="/app/backups"
-DATABASE_NAME="academic_resources_db"
-TIMESTAMP=$(date +"%Y%m%d_%H%M%S")
-BACKUP_PATH="$BACKUP_DIR/backup_$TIMESTAMP"
-
-# Create backup directory if it doesn't exist
-mkdir -p "$BACKUP_DIR"
+BACKEND_DIR="${BACKEND_DIR:-/app/backend}"
+DATABASE_NAME="${DATABASE_NAME:-academic_resources_db}"
 
 # Check if database has any data before backing up
 RECORD_COUNT=$(mongosh --quiet --eval "db.users.countDocuments({})" "$DATABASE_NAME" 2>/dev/null || echo "0")
 
 if [ "$RECORD_COUNT" -gt "0" ]; then
-    # Perform backup
-    mongodump --db "$DATABASE_NAME" --out "$BACKUP_PATH" --quiet 2>/dev/null
-    
-    if [ $? -eq 0 ]; then
-        echo "$(date): ✅ Backup created: $BACKUP_PATH"
-        
-        # Keep only the last 24 backups (24 hours worth)
-        cd "$BACKUP_DIR"
-        ls -t | grep "backup_" | tail -n +25 | xargs -r rm -rf
-        
-        echo "$(date): 🧹 Old backups cleaned up"
+    cd "$BACKEND_DIR"
+    if OUTPUT=$(python backup.py run 2>&1); then
+        echo "$OUTPUT" | sed "s/^/$(date): /"
     else
+        echo "$OUTPUT" | sed "s/^/$(date): /"
         echo "$(date): ⚠️  Backup failed"
     fi
 else
@@ -1,38 +1,30 @@
 #!/bin/bash
 # Emergency Database Protection and Restore Script
-# This script restores the database from the most recent backup
+# This script restores the database from the most recent restore point
+# (pass a restore point ID from `python backup.py list` to pick another).
+# Before backup.py has written a restore point, restore.py falls back to
+# the newest legacy mongodump (backup_*/) with mongorestore.
 
 set -e
 
 BACKUP_DIR="/app/backups"
-DATABASE_NAME="academic_resources_db"
+BACKEND_DIR="${BACKEND_DIR:-/app/backend}"
 
 echo "🔄 Emergency Database Restore"
 echo "=============================="
 
 # Check if backup directory exists
-if [ ! -d "$BACKUP_DIR" ]; then
-    echo "❌ Backup directory not found: $BACKUP_DIR"
-    exit 1
-fi
-
-# Find the most recent backup
-LATEST_BACKUP=$(ls -t "$BACKUP_DIR"/backup_* 2>/dev/null | head -1)
-
-if [ -z "$LATEST_BACKUP" ]; then
+if [ ! -d "$BACKUP_DIR/manifests" ] && ! ls -d "$BACKUP_DIR"/backup_* >/dev/null 2>&1; then
     echo "❌ No backups found in $BACKUP_DIR"
     exit 1
 fi
 
-echo "📦 Found backup: $LATEST_BACKUP"
-echo "🔄 Restoring database..."
-
-# Restore using mongorestore
-mongorestore --drop --db "$DATABASE_NAME" "$LATEST_BACKUP/$DATABASE_NAME" 2>/dev/null
+cd "$BACKEND_DIR"
 
-if [ $? -eq 0 ]; then
+# Loads every collection in parallel and verifies counts and checksums
+# before replacing anything; collections that fail are left untouched
+if python restore.py --dir "$BACKUP_DIR" "$@"; then
     echo "✅ Database restored successfully from backup!"
-    echo "📊 Restored from: $LATEST_BACKUP"
 else
     echo "❌ Failed to restore database"
     exit 1
@@ -69,11 +69,11 @@ echo ""
 
 # Check Backups
 echo "6️⃣  Backup Status:"
-BACKUP_COUNT=$(ls -1 /app/backups 2>/dev/null | grep "backup_" | wc -l)
+BACKUP_COUNT=$(ls -1 /app/backups/manifests 2>/dev/null | grep ".json$" | wc -l)
 if [ "$BACKUP_COUNT" -gt "0" ]; then
-    LATEST_BACKUP=$(ls -t /app/backups/backup_* 2>/dev/null | head -1)
-    echo "   ✅ $BACKUP_COUNT backup(s) available"
-    echo "   📦 Latest: $(basename "$LATEST_BACKUP")"
+    LATEST_BACKUP=$(ls /app/backups/manifests/*.json 2>/dev/null | sort | tail -1)
+    echo "   ✅ $BACKUP_COUNT restore point(s) available ($(du -sh /app/backups/chunks 2>/dev/null | cut -f1) stored)"
+    echo "   📦 Latest: $(basename "$LATEST_BACKUP" .json)"
 else
     echo "   ⚠️  No backups found"
 fi
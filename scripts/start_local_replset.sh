@@ -0,0 +1,47 @@
+#!/bin/bash
+# Start a local single-host replica set for testing read-preference routing
+#
+# Usage: ./scripts/start_local_replset.sh [port] [dbpath]
+# Then run the backend with the printed MONGO_URL.
+
+PORT="${1:-27018}"
+DBPATH="${2:-/tmp/eduresources-rs0}"
+REPLSET="rs0"
+
+echo "======================================"
+echo "🧪 LOCAL REPLICA SET ($REPLSET)"
+echo "======================================"
+
+mkdir -p "$DBPATH"
+
+if ! mongosh --quiet --port "$PORT" --eval "db.adminCommand('ping')" >/dev/null 2>&1; then
+    echo "⏳ Starting mongod on port $PORT..."
+    mongod --replSet "$REPLSET" --port "$PORT" --bind_ip 127.0.0.1 \
+        --dbpath "$DBPATH" --logpath "$DBPATH/mongod.log" --fork >/dev/null
+    if [ $? -ne 0 ]; then
+        echo "❌ mongod failed to start - see $DBPATH/mongod.log"
+        exit 1
+    fi
+fi
+
+# Initiate once; a single member becomes primary and serves secondaryPreferred reads too
+mongosh --quiet --port "$PORT" --eval "
+try { rs.status() } catch (e) {
+    rs.initiate({_id: '$REPLSET', members: [{_id: 0, host: '127.0.0.1:$PORT'}]})
+}
+" >/dev/null
+
+for i in {1..30}; do
+    if mongosh --quiet --port "$PORT" --eval "db.hello().isWritablePrimary" 2>/dev/null | grep -q true; then
+        echo "✅ Replica set is ready"
+        echo ""
+        echo "   MONGO_URL=mongodb://127.0.0.1:$PORT/?replicaSet=$REPLSET"
+        echo ""
+        echo "   Add members with: mongosh --port $PORT --eval \"rs.add('127.0.0.1:<port>')\""
+        exit 0
+    fi
+    sleep 1
+done
+
+echo "❌ Replica set did not elect a primary"
+exit 1